@@ -0,0 +1,270 @@
+"""Scaling benchmark of the load, aggregation and dashboard paths.
+
+For every requested size a synthetic export is generated once (see
+``synthetic_data.py``) and measured in a fresh subprocess, so peak RSS is the
+size's own:
+
+- ``load_cold``: parse the CSV and build the columnar cache;
+- ``load_warm``: memory-map the cached columns;
+- the aggregation stages: cube build, regional / category / segment tables,
+  monthly rollup, exact distinct orders per segment and the correlation matrix;
+- the same analysis tables from the SQLite star schema (``load_sql``,
+  ``sql.analysis``);
+- every dashboard callback over a fixed set of filter combinations, with the
+  figure cache cleared before each call (``*_cold``) and warm (``*_cached``);
+  ``dashboard_sql_*`` is the KPI / chart callback on the SQL backend.
+
+Stage timings come from the instrumentation spans, so nested spans (CSV parse,
+date parsing, cube rollups, filter selections, figure builds) are reported
+too. Results are written as JSON; ``--baseline`` compares a run against an
+earlier one and exits non-zero when a timing regressed beyond ``--tolerance``::
+
+    python benchmark.py --sizes 10k,1m
+    python benchmark.py --sizes 10k,1m --baseline results/benchmarks/bench-20240101-120000.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+DEFAULT_SIZES = "10k,1m,10m,100m"
+BENCH_DIR = os.path.join("cache", "bench")
+RESULTS_DIR = os.path.join("results", "benchmarks")
+DEFAULT_REPEAT = 5
+DEFAULT_TOLERANCE = 0.25
+# Filter combinations replayed against the dashboard callbacks
+CALLBACK_FILTERS = [
+    ("All", "All", None, None),
+    ("West", "Furniture", None, None),
+    ("East", "All", "2016-01-01", "2016-12-31"),
+    ("All", "Technology", "2015-03-15", "2017-06-20"),
+]
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    for suffix, factor in (("k", 1_000), ("m", 1_000_000)):
+        if text.endswith(suffix):
+            return int(float(text[:-1]) * factor)
+    return int(text)
+
+
+def dataset_path(n_rows):
+    return os.path.join(BENCH_DIR, f"superstore_{n_rows}.csv")
+
+
+def ensure_dataset(n_rows, seed=0):
+    path = dataset_path(n_rows)
+    if not os.path.exists(path):
+        from synthetic_data import write_csv
+
+        print(f"Generating {n_rows:,} synthetic rows...")
+        write_csv(path, n_rows, seed)
+    return path
+
+
+def _timings(func, args, repeat, before=None):
+    samples = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def measure(path, repeat=DEFAULT_REPEAT):
+    """Run every stage on ``path`` in this process; returns the result dict."""
+    from instrumentation import configure, peak_rss_mb, span, summarize, tracer
+
+    from customer_analytics import CustomerTable
+    from data_loader import load_superstore
+    from distinct_count import distinct_by
+    from olap_cube import SalesCube
+    from parallel_aggregation import category_table, regional_table, segment_table
+
+    configure()
+    with span("load_cold"):
+        df = load_superstore(path, rebuild=True)
+    with span("load_warm"):
+        df = load_superstore(path)
+    with span("aggregate.cube"):
+        cube = SalesCube.from_frame(df)
+    regional_table(cube)
+    category_table(cube)
+    segment_table(cube)
+    with span("aggregate.monthly"):
+        cube.rollup(["Month"])
+    with span("aggregate.distinct_orders"):
+        distinct_by(df, "Segment", "Order ID")
+    # RFM scores and cohort retention in one sorted pass (span "customers.build")
+    CustomerTable.from_frame(df)
+    with span("aggregate.correlation"):
+        df.select_dtypes(include=[np.number]).corr()
+    # The same analysis tables pushed down to the SQLite star schema
+    import sql_store
+
+    with span("load_sql"):
+        database = sql_store.load_or_build(path, rebuild=True)
+    with span("sql.analysis"):
+        for by in (["Region"], ["Category"], ["Segment"], ["Month"]):
+            database.rollup(by)
+        database.correlation("Discount", "Profit")
+    database.close()
+    stages = summarize()
+
+    # Dashboard callbacks against this dataset (importing it loads the default one)
+    import dashboard
+
+    tracer.records.clear()
+    callbacks = {}
+    for backend, renders in (
+        ("arrays", (("dashboard", dashboard.render_dashboard),
+                    ("discount", dashboard.render_discount),
+                    ("shipping", dashboard.render_shipping),
+                    ("leaderboard", lambda *filters: dashboard.render_leaderboard(
+                        *filters, "Customer", "Profit", "top", 20)),
+                    ("discount_impact", lambda region, category, *_: dashboard.render_discount_impact(
+                        region, category)),
+                    ("customers", lambda *_: dashboard.render_customers("Quarter")),
+                    ("state_map", lambda *filters: dashboard.render_state_map(*filters, "Sales")),
+                    ("cities", lambda *filters: dashboard.render_cities("California", *filters, "Sales")))),
+        ("sql", (("dashboard_sql", dashboard.render_dashboard),)),
+    ):
+        dashboard.AGGREGATE_BACKEND = backend
+        dashboard.reload_data(path)
+        for name, func in renders:
+            cold, cached = [], []
+            for filters in CALLBACK_FILTERS:
+                cold += _timings(func, filters, repeat, before=dashboard.figure_cache.invalidate)
+                func(*filters)
+                cached += _timings(func, filters, repeat)
+            for label, samples in ((f"{name}_cold", cold), (f"{name}_cached", cached)):
+                callbacks[label] = {
+                    "median_ms": float(np.median(samples)),
+                    "p95_ms": float(np.percentile(samples, 95)),
+                    "calls": len(samples),
+                }
+    callback_spans = summarize()
+
+    return {
+        "rows": len(df),
+        "csv_mb": os.path.getsize(path) / (1 << 20),
+        "stages": stages,
+        "callbacks": callbacks,
+        "callback_spans": callback_spans,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_size(n_rows, repeat, seed=0):
+    """Measure one size in a subprocess and return its result dict."""
+    path = ensure_dataset(n_rows, seed)
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        result_path = f.name
+    try:
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--measure", path,
+             "--repeat", str(repeat), "--result", result_path],
+            check=True,
+        )
+        with open(result_path) as f:
+            return json.load(f)
+    finally:
+        os.remove(result_path)
+
+
+def environment():
+    import pandas as pd
+
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def comparable_timings(result):
+    """Flat ``{(size, metric): ms}`` view of a benchmark result."""
+    timings = {}
+    for size, entry in result["sizes"].items():
+        for name, stage in entry["stages"].items():
+            timings[(size, f"stage:{name}")] = stage["wall_ms"]
+        for name, callback in entry["callbacks"].items():
+            timings[(size, f"callback:{name}")] = callback["median_ms"]
+        timings[(size, "peak_rss_mb")] = entry["peak_rss_mb"]
+    return timings
+
+
+def compare(result, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Metrics present in both runs, with the ratio current / baseline."""
+    current, previous = comparable_timings(result), comparable_timings(baseline)
+    rows = []
+    for key in sorted(set(current) & set(previous)):
+        if previous[key]:
+            ratio = current[key] / previous[key]
+            rows.append((key[0], key[1], previous[key], current[key], ratio, ratio > 1 + tolerance))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Superstore pipeline at several scales")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated row counts, e.g. 10k,1m")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="result JSON path (default: results/benchmarks/bench-<time>.json)")
+    parser.add_argument("--baseline", help="earlier result JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        # Subprocess entry point: one dataset, results to --result
+        with open(args.result, "w") as f:
+            json.dump(measure(args.measure, args.repeat), f)
+        return
+
+    result = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "environment": environment(), "sizes": {}}
+    for size in args.sizes.split(","):
+        n_rows = parse_size(size)
+        print(f"Benchmarking {n_rows:,} rows...")
+        entry = run_size(n_rows, args.repeat, args.seed)
+        result["sizes"][str(n_rows)] = entry
+        print(
+            f"  load cold {entry['stages']['load_cold']['wall_ms']:,.0f} ms, "
+            f"warm {entry['stages']['load_warm']['wall_ms']:,.0f} ms, "
+            f"dashboard callback {entry['callbacks']['dashboard_cold']['median_ms']:,.1f} ms, "
+            f"peak RSS {entry['peak_rss_mb']:,.0f} MiB"
+        )
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = 0
+        print(f"\n{'rows':>10}  {'metric':<40}  {'baseline':>10}  {'current':>10}  {'ratio':>6}")
+        for size, metric, before, after, ratio, regressed in compare(result, baseline, args.tolerance):
+            regressions += regressed
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{int(size):>10,}  {metric:<40}  {before:>10.1f}  {after:>10.1f}  {ratio:>6.2f}{flag}")
+        if regressions:
+            sys.exit(f"{regressions} metrics regressed by more than {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
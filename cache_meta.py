@@ -0,0 +1,73 @@
+"""Cache locations and freshness checks that need neither pandas nor NumPy.
+
+Shared by :mod:`data_loader` and :mod:`olap_cube` (which re-export them) and by
+the ``superstore`` command line, whose ``summary`` subcommand must start
+without importing pandas.
+"""
+import hashlib
+import json
+import os
+
+DEFAULT_SOURCE = "Superstore.csv"
+CACHE_ROOT = "cache"
+CACHE_VERSION = 2
+
+
+def file_sha1(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_dir_for(source, cache_root=CACHE_ROOT):
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(cache_root, stem)
+
+
+def cube_path_for(source=DEFAULT_SOURCE):
+    """The cube file kept for ``source``, in its columnar cache directory."""
+    return os.path.join(cache_dir_for(source), "cube.npz")
+
+
+def source_stamp(source):
+    stat = os.stat(source)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def stamp_matches(source, stamp):
+    """True when ``stamp`` (a :func:`source_stamp`) still describes ``source``."""
+    return stamp is not None and os.path.exists(source) and source_stamp(source) == stamp
+
+
+def read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, "meta.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_meta(cache_dir, meta):
+    tmp_path = os.path.join(cache_dir, "meta.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(cache_dir, "meta.json"))
+
+
+def cached_version(source, cache_dir=None):
+    """``dataset_version`` of ``source`` when its columnar cache is current by stamp, else None.
+
+    Current means built by this ``CACHE_VERSION`` from a file of the export's
+    size and mtime (or the export is gone). A touched but unchanged export is
+    left to the content hash check of ``data_loader.is_fresh``.
+    """
+    meta = read_meta(cache_dir or cache_dir_for(source))
+    if meta is None or meta.get("version") != CACHE_VERSION:
+        return None
+    if os.path.exists(source):
+        stamp = source_stamp(source)
+        if (meta["source"]["size"], meta["source"]["mtime"]) != (stamp["size"], stamp["mtime"]):
+            return None
+    return meta["source"]["sha1"][:16]
@@ -0,0 +1,168 @@
+"""Bounded, cancellable execution of dashboard callbacks.
+
+Callbacks run on named lanes, each a fixed-size thread pool with a bounded
+queue, so cheap work (KPI cards, bar charts) never waits behind expensive work
+(the Discount vs Profit scatter) for a worker. Every request carries a session
+key: when a session submits new work for a callback, its older work for that
+callback on that lane is superseded, while other callbacks of the session (the
+panels of one page load) run side by side. Queued superseded work is cancelled
+before it starts and results of superseded work that was already running are
+discarded.
+
+The caller waits at most ``timeout`` seconds. A timed-out job keeps running
+(threads cannot be interrupted) so its result still lands in the figure cache
+for the next request.
+
+``metrics()`` reports per lane the queue depth, running jobs, outcome counters
+and queue-wait / run-time percentiles over the most recent jobs.
+"""
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import numpy as np
+
+DEFAULT_LANES = {"fast": 4, "heavy": 2}
+DEFAULT_MAX_QUEUE = 32
+DEFAULT_TIMEOUT = 10.0
+LATENCY_WINDOW = 1000
+
+
+class Superseded(Exception):
+    """A newer request from the same session replaced this one."""
+
+
+class Overloaded(Exception):
+    """The lane's queue is full."""
+
+
+class CallbackTimeout(Exception):
+    """The job did not finish within its timeout."""
+
+
+class Lane:
+    def __init__(self, name, workers, max_queue):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"lane-{name}")
+        self.queued = 0
+        self.running = 0
+        self.counts = dict.fromkeys(
+            ["completed", "failed", "cancelled", "superseded", "timeouts", "rejected"], 0
+        )
+        self.wait_ms = deque(maxlen=LATENCY_WINDOW)
+        self.run_ms = deque(maxlen=LATENCY_WINDOW)
+
+
+class CallbackPool:
+    def __init__(self, lanes=None, max_queue=DEFAULT_MAX_QUEUE, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self.lanes = {
+            name: Lane(name, workers, max_queue) for name, workers in (lanes or DEFAULT_LANES).items()
+        }
+        self._lock = threading.Lock()
+        self._tokens = itertools.count()
+        # (lane, session, callback) -> (token, future) of the latest job
+        self._latest = {}
+
+    def _is_current(self, key, token):
+        latest = self._latest.get(key)
+        return latest is not None and latest[0] == token
+
+    def run(self, lane_name, session, func, *args, timeout=None, key=None):
+        """Run ``func(*args)`` on a lane and wait for its result.
+
+        Within a session, only jobs of the same ``key`` (by default the
+        function's name) supersede each other. Raises :class:`Superseded`,
+        :class:`Overloaded` or :class:`CallbackTimeout` instead of returning a
+        result the caller should not use.
+        """
+        lane = self.lanes[lane_name]
+        key = (lane_name, session, getattr(func, "__name__", None) if key is None else key)
+        token = next(self._tokens)
+        submitted = time.perf_counter()
+
+        def job():
+            with self._lock:
+                lane.queued -= 1
+                if session is not None and not self._is_current(key, token):
+                    lane.counts["superseded"] += 1
+                    raise Superseded()
+                lane.running += 1
+                lane.wait_ms.append((time.perf_counter() - submitted) * 1000)
+            started = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    lane.running -= 1
+                    lane.run_ms.append((time.perf_counter() - started) * 1000)
+
+        with self._lock:
+            if lane.queued >= lane.max_queue:
+                lane.counts["rejected"] += 1
+                raise Overloaded(f"lane {lane_name!r} has {lane.queued} queued jobs")
+            lane.queued += 1
+            future = lane.executor.submit(job)
+            if session is not None:
+                previous = self._latest.get(key)
+                self._latest[key] = (token, future)
+                if previous is not None and previous[1].cancel():
+                    # Never started, so the job never took itself off the queue
+                    lane.queued -= 1
+                    lane.counts["cancelled"] += 1
+
+        try:
+            result = future.result(timeout=self.timeout if timeout is None else timeout)
+        except FutureTimeout:
+            with self._lock:
+                lane.counts["timeouts"] += 1
+            raise CallbackTimeout(f"lane {lane_name!r} job exceeded its timeout") from None
+        except Superseded:
+            raise
+        except Exception:
+            if future.cancelled():
+                raise Superseded() from None
+            with self._lock:
+                lane.counts["failed"] += 1
+            raise
+        finally:
+            with self._lock:
+                latest = self._latest.get(key)
+                stale = latest is not None and latest[0] != token
+                if latest is not None and not stale:
+                    del self._latest[key]
+
+        with self._lock:
+            lane.counts["superseded" if stale else "completed"] += 1
+        if stale:
+            # Finished, but a newer request from the session has replaced it
+            raise Superseded()
+        return result
+
+    def metrics(self):
+        with self._lock:
+            report = {}
+            for name, lane in self.lanes.items():
+                entry = {
+                    "workers": lane.workers,
+                    "queued": lane.queued,
+                    "running": lane.running,
+                    **lane.counts,
+                }
+                for label, samples in (("wait_ms", lane.wait_ms), ("run_ms", lane.run_ms)):
+                    if samples:
+                        p50, p95, p99 = np.percentile(np.fromiter(samples, float), [50, 95, 99])
+                        entry[label] = {
+                            "p50": float(p50), "p95": float(p95), "p99": float(p99), "max": max(samples)
+                        }
+                report[name] = entry
+            return report
+
+    def shutdown(self):
+        for lane in self.lanes.values():
+            lane.executor.shutdown(wait=False, cancel_futures=True)
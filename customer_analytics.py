@@ -0,0 +1,271 @@
+"""Customer RFM scores and acquisition-cohort retention.
+
+Both come from one pass over the line items: the lines are sorted once by
+(customer, order day, order), so every customer's lines are one run and its
+orders and active periods follow each other within it. Boundary masks mark
+where the customer, the order or the period changes, and ``np.add.reduceat``
+/ ``np.bincount`` reduce the runs. No step loops over customers or groups
+again, so the cost grows with the sort.
+
+Per customer it keeps:
+
+- first and last order day and the recency of the last order (days before
+  the day after the dataset's last order);
+- frequency (distinct orders), line items, monetary value (Sales) and Profit;
+- R, F and M scores from 1 to 5 (quintiles of the customers, ties sharing a
+  score) and the RFM segment named by ``SEGMENTS``.
+
+Per cohort (customers by the month or quarter of their first order) it keeps
+the customers active and the Sales of every later period, so retention is
+``active / cohort size``. The tables are saved next to the columnar cache
+and memory-mapped back (:func:`load_or_build`)::
+
+    python customer_analytics.py [source] --period Quarter
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DEFAULT_SOURCE, cache_dir_for, cache_lock, dataset_version, load_superstore, save_array
+from distinct_count import codes_of
+from instrumentation import instrumented
+
+TABLE_VERSION = 1
+SCORES = 5
+# Months per cohort period
+PERIODS = {"Month": 1, "Quarter": 3}
+# RFM segments as (name, R score range, F score range); the first match wins
+# and together they cover every combination
+SEGMENTS = [
+    ("Champions", (4, 5), (4, 5)),
+    ("Loyal", (3, 5), (3, 5)),
+    ("Promising", (4, 5), (1, 2)),
+    ("At Risk", (1, 2), (3, 5)),
+    ("Hibernating", (1, 2), (1, 2)),
+    ("Need Attention", (3, 3), (1, 2)),
+]
+
+
+def scores(values, n_scores=SCORES):
+    """Score from 1 to ``n_scores`` by the share of values strictly below each value."""
+    below = np.searchsorted(np.sort(values), values, side="left")
+    return (1 + below * n_scores // max(len(values), 1)).astype(np.int8)
+
+
+def segment_codes(r, f):
+    """Position in ``SEGMENTS`` of every (R, F) score pair."""
+    conditions = [
+        (r >= r_low) & (r <= r_high) & (f >= f_low) & (f <= f_high)
+        for _, (r_low, r_high), (f_low, f_high) in SEGMENTS
+    ]
+    return np.select(conditions, np.arange(len(SEGMENTS)), -1).astype(np.int8)
+
+
+def period_label(period, months):
+    """Label of a period index (months, or quarters, since 1970)."""
+    year, month = divmod(int(period) * months, 12)
+    return f"{1970 + year}Q{month // 3 + 1}" if months == 3 else f"{1970 + year}-{month + 1:02d}"
+
+
+class CustomerTable:
+    def __init__(self, arrays, meta, version=None):
+        self.arrays = arrays
+        self.meta = meta
+        self.version = version
+        self.n_customers = len(arrays["customer"])
+
+    @classmethod
+    @instrumented("customers.build", rows=lambda table: table.n_customers)
+    def from_frame(cls, df, version=None):
+        customer_codes, customers = pd.factorize(df["Customer ID"], sort=True)
+        order_codes, _ = codes_of(df["Order ID"])
+        days = df["Order Date"].to_numpy(dtype="datetime64[D]").astype(np.int64)
+
+        # The one sort: customer, then order day, then order
+        by_customer = np.lexsort((order_codes, days, customer_codes))
+        customer_codes = customer_codes[by_customer]
+        order_codes = order_codes[by_customer]
+        days = days[by_customer]
+        new_customer = np.r_[True, customer_codes[1:] != customer_codes[:-1]]
+        new_order = new_customer | np.r_[True, order_codes[1:] != order_codes[:-1]]
+        starts = np.flatnonzero(new_customer)
+        ends = np.r_[starts[1:], len(days)] - 1
+
+        sales = df["Sales"].to_numpy(dtype=np.float64)[by_customer]
+        profit = df["Profit"].to_numpy(dtype=np.float64)[by_customer]
+
+        def per_customer(values):
+            return np.add.reduceat(values, starts) if len(starts) else values[:0]
+
+        reference_day = int(days.max()) + 1 if len(days) else 0
+        arrays = {
+            "customer": np.asarray(customers, dtype=str),
+            "first_day": days[starts],
+            "last_day": days[ends],
+            "recency": reference_day - days[ends],
+            "orders": per_customer(new_order.astype(np.int64)),
+            "lines": np.diff(np.r_[starts, len(days)]),
+            "sales": per_customer(sales),
+            "profit": per_customer(profit),
+        }
+        # Recent, frequent and high-value customers score high
+        arrays["r"] = scores(-arrays["recency"])
+        arrays["f"] = scores(arrays["orders"])
+        arrays["m"] = scores(arrays["sales"])
+        arrays["segment"] = segment_codes(arrays["r"], arrays["f"])
+
+        meta = {"reference_day": reference_day, "first_period": {}}
+        month = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        for name, months in PERIODS.items():
+            # Runs of one customer and one period, in period order per customer
+            period = month // months
+            new_active = new_customer | np.r_[True, period[1:] != period[:-1]]
+            active_starts = np.flatnonzero(new_active)
+            first = int(period.min()) if len(period) else 0
+            n_periods = int(period.max()) - first + 1 if len(period) else 0
+            cohort = np.repeat(period[starts] - first, np.diff(np.r_[starts, len(days)]))[active_starts]
+            cell = cohort * n_periods + (period[active_starts] - first - cohort)
+            size = n_periods * n_periods
+            arrays[f"cohort_{name}_active"] = np.bincount(cell, minlength=size).reshape(n_periods, n_periods)
+            arrays[f"cohort_{name}_sales"] = np.bincount(
+                cell, weights=np.add.reduceat(sales, active_starts) if len(active_starts) else None, minlength=size
+            ).reshape(n_periods, n_periods)
+            meta["first_period"][name] = first
+        return cls(arrays, meta, version)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        files = {}
+        for i, name in enumerate(self.arrays):
+            files[name] = f"arr{i:02d}.npy"
+            save_array(os.path.join(directory, files[name]), self.arrays[name])
+        meta = dict(self.meta, table_version=TABLE_VERSION, dataset_version=self.version, files=files)
+        tmp_path = os.path.join(directory, "meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, os.path.join(directory, "meta.json"))
+
+    @classmethod
+    def load(cls, directory, version=None):
+        """Memory-map a table saved by :meth:`save`; None when it is missing or stale."""
+        try:
+            with open(os.path.join(directory, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("table_version") != TABLE_VERSION or meta["dataset_version"] != version:
+            return None
+        arrays = {
+            name: np.load(os.path.join(directory, file), mmap_mode="r")
+            for name, file in meta.pop("files").items()
+        }
+        return cls(arrays, meta, version)
+
+    def rfm_segments(self):
+        """Customers, recency, frequency and value per RFM segment, in ``SEGMENTS`` order."""
+        segment = self.arrays["segment"].astype(np.int64)
+        n_segments = len(SEGMENTS)
+
+        def total(column):
+            return np.bincount(segment, weights=self.arrays[column], minlength=n_segments)
+
+        customers = np.bincount(segment, minlength=n_segments)
+        sales = total("sales")
+        with np.errstate(invalid="ignore", divide="ignore"):
+            table = pd.DataFrame({
+                "Customers": customers,
+                "Customer Share": customers / max(self.n_customers, 1),
+                "Avg Recency Days": total("recency") / customers,
+                "Avg Orders": total("orders") / customers,
+                "Avg Sales": sales / customers,
+                "Sales": sales,
+                "Sales Share": sales / sales.sum(),
+                "Profit": total("profit"),
+            }, index=pd.Index([name for name, _, _ in SEGMENTS], name="Segment"))
+        return table
+
+    def customers(self, segment=None, n=10):
+        """The ``n`` customers with the highest Sales, optionally within one RFM segment."""
+        rows = np.arange(self.n_customers)
+        if segment is not None:
+            names = [name for name, _, _ in SEGMENTS]
+            code = names.index(segment) if segment in names else -1
+            rows = rows[self.arrays["segment"] == code]
+        sales = self.arrays["sales"][rows]
+        top = rows[np.argsort(-sales, kind="stable")[:n]] if len(rows) else rows
+        return pd.DataFrame({
+            "Customer ID": self.arrays["customer"][top],
+            "Recency Days": self.arrays["recency"][top],
+            "Orders": self.arrays["orders"][top],
+            "Sales": self.arrays["sales"][top],
+            "Profit": self.arrays["profit"][top],
+            "RFM": [f"{r}{f}{m}" for r, f, m in zip(self.arrays["r"][top], self.arrays["f"][top], self.arrays["m"][top])],
+            "Segment": [SEGMENTS[code][0] for code in self.arrays["segment"][top]],
+        })
+
+    def retention(self, period="Month", metric="customers"):
+        """Cohort sizes and retention by periods since the first order.
+
+        Rows are cohorts (first-order period), columns the periods since then;
+        ``metric="sales"`` gives each period's Sales as a share of the cohort's
+        first-period Sales. Periods after the data ends are NaN.
+        """
+        active = np.asarray(self.arrays[f"cohort_{period}_{'sales' if metric == 'sales' else 'active'}"])
+        n_periods = len(active)
+        first = self.meta["first_period"][period]
+        size = np.asarray(self.arrays[f"cohort_{period}_active"])[:, 0]
+        keep = size > 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rates = active / active[:, :1]
+        # Cohort c can only be observed for n_periods - c periods
+        observed = np.arange(n_periods)[:, None] + np.arange(n_periods)[None, :] < n_periods
+        rates = np.where(observed, rates, np.nan)
+        table = pd.DataFrame(
+            rates[keep],
+            index=pd.Index([period_label(first + c, PERIODS[period]) for c in np.flatnonzero(keep)], name="Cohort"),
+            columns=np.arange(n_periods),
+        )
+        table.insert(0, "Customers", size[keep])
+        return table
+
+
+def table_dir_for(source=DEFAULT_SOURCE):
+    return os.path.join(cache_dir_for(source), "customer_analytics")
+
+
+def load_or_build(df, directory, version=None):
+    """Memory-map the customer table saved in ``directory``, building it first when stale."""
+    table = CustomerTable.load(directory, version)
+    if table is None:
+        with cache_lock(directory):
+            table = CustomerTable.load(directory, version)
+            if table is None:
+                CustomerTable.from_frame(df, version).save(directory)
+                table = CustomerTable.load(directory, version)
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Customer RFM segments and cohort retention")
+    parser.add_argument("source", nargs="?", default=DEFAULT_SOURCE)
+    parser.add_argument("--period", choices=list(PERIODS), default="Quarter")
+    parser.add_argument("--ages", type=int, default=8, help="periods since the first order to show")
+    args = parser.parse_args()
+
+    df = load_superstore(args.source)
+    table = load_or_build(df, table_dir_for(args.source), dataset_version(args.source))
+    print(f"{table.n_customers:,} customers from {len(df):,} line items")
+    print("\nRFM segments:")
+    print(table.rfm_segments().round(2).to_string())
+    print("\nTop customers:")
+    print(table.customers().round(2).to_string(index=False))
+    retention = table.retention(args.period)
+    print(f"\nCustomer retention by {args.period.lower()} of first order:")
+    print(retention.iloc[:, :args.ages + 1].round(2).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,214 +1,428 @@
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import uuid
+
+from flask import jsonify
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from dash import Dash, dcc, html
-from dash.dependencies import Input, Output
+from dash import Dash, Patch, ctx, dcc, html, no_update
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 
-# Read the dataset
-df = pd.read_csv('Superstore.csv', encoding='latin1')
-df['Order Date'] = pd.to_datetime(df['Order Date'])
+from callback_pool import CallbackPool, CallbackTimeout, Overloaded, Superseded
+from data_loader import DEFAULT_SOURCE, TEXT_COLUMNS, cache_dir_for, dataset_version, load_superstore
+from figure_cache import FigureCache
+import customer_analytics
+import discount_impact
+import filter_engine
+import geo_rollups
+import leaderboards
+from instrumentation import instrumented, profiled, span
+import order_metrics
+import timeseries_store
+from scatter_rendering import discount_profit_traces
+import sql_store
+
+# Discount vs Profit rendering: 'auto' switches from SVG to WebGL to a server-side
+# density grid as the selection grows; see scatter_rendering for the thresholds
+SCATTER_MODE = 'auto'
+
+# Where date-range totals, order counts and trends come from: 'arrays' (daily
+# prefix sums) or 'sql' (aggregates pushed down to the SQLite star schema)
+AGGREGATE_BACKEND = os.environ.get(sql_store.BACKEND_ENV, 'arrays')
+
+# Leaderboard dimensions as shown in the dropdown and chart titles
+LEADERBOARD_NAMES = {'Product': 'Products', 'Customer': 'Customers', 'City': 'Cities'}
+
+# State map colours per metric: (colour scale, value mapped to its midpoint)
+MAP_COLORS = {'Sales': ('Greens', None), 'Profit': ('RdBu', 0), 'Margin': ('RdBu', 0)}
+STATE_NAMES = {code: state for state, code in geo_rollups.STATE_CODES.items()}
+
+# Serialized figures and KPI strings, keyed by filters and dataset version
+figure_cache = FigureCache()
+
+# Callback execution: KPI cards and aggregate charts on the 'fast' lane, the
+# Discount vs Profit scatter on the 'heavy' lane so it never delays the cards
+callback_pool = CallbackPool({'fast': 4, 'heavy': 2})
+
+
+def reload_data(source=DEFAULT_SOURCE):
+    """(Re)load the dataset and everything derived from it."""
+    global df, engine, store, orders, boards, discounts, customers, geo
+    # Read the dataset (through the typed columnar cache)
+    df = load_superstore(source, exclude=TEXT_COLUMNS)
+    # Index the dataset once (shared by all worker processes through the cache
+    # directory); callbacks resolve filters to row positions through it
+    with span('filter.index') as s:
+        s.rows = len(df)
+        engine = filter_engine.load_or_build(
+            df, os.path.join(cache_dir_for(source), 'filter_index'), dataset_version(source)
+        )
+    if AGGREGATE_BACKEND == 'sql':
+        # Same interface, answered by SQL aggregates over pooled connections
+        store = sql_store.load_or_build(source)
+    else:
+        # Daily prefix sums answering date-range totals, orders and monthly trends
+        store = timeseries_store.load_or_build(
+            df, os.path.join(cache_dir_for(source), 'timeseries.npz'), dataset_version(source)
+        )
+    # One row per order (lead time, basket size / value), sorted by order date
+    orders = order_metrics.load_or_build(
+        df, order_metrics.table_dir_for(source), dataset_version(source)
+    )
+    # Partial per-entity aggregates behind the top / bottom-N leaderboard
+    boards = leaderboards.load_or_build(source)
+    # Discount impact per Sub-Category x Region; usually computed by the report,
+    # else here in-process (no process pool forked from the server's threads)
+    discounts = discount_impact.load_or_build(
+        df, discount_impact.table_path_for(source), dataset_version(source), workers=1
+    )
+    # One row per customer (RFM scores) and cohort retention matrices
+    customers = customer_analytics.load_or_build(
+        df, customer_analytics.table_dir_for(source), dataset_version(source)
+    )
+    # State and city totals by month behind the map
+    geo = geo_rollups.load_or_build(df, geo_rollups.table_dir_for(source), dataset_version(source))
+    figure_cache.invalidate(dataset_version(source))
+
+
+# The dataset is loaded on first use (first page view or callback), not at import
+df = engine = store = orders = boards = discounts = customers = geo = None
+_data_lock = threading.Lock()
+
+
+def ensure_data():
+    """Load the default dataset unless one is already loaded."""
+    if df is None:
+        with _data_lock:
+            if df is None:
+                reload_data()
+
+
+def region_category_sums(start_date=None, end_date=None):
+    """Sales / Profit / row counts on the Region x Category grid for a date range.
+
+    Differences of the time-series store's prefix sums, so any day range costs
+    the same two lookups per cell (one indexed GROUP BY with the SQL backend).
+    """
+    return store.cross_sums(start_date, end_date, ['Sales', 'Profit'])
+
+
+def label_mask(labels, value):
+    return labels == value if value != 'All' else np.ones(len(labels), dtype=bool)
 
 # Initialize the Dash app
 app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 
+
+@app.server.route('/_figure_cache')
+def figure_cache_stats():
+    return jsonify(figure_cache.stats())
+
+
+@app.server.route('/_serving_metrics')
+def serving_metrics():
+    return jsonify(callback_pool.metrics())
+
+
 # Define the layout
-app.layout = dbc.Container([
-    dbc.Row([
-        dbc.Col(html.H1("Superstore Sales Dashboard", className="text-center my-4"), width=12)
-    ]),
-    
-    # Filters
-    dbc.Row([
-        dbc.Col([
-            html.H5("Select Region"),
-            dcc.Dropdown(
-                id='region-filter',
-                options=[{'label': 'All Regions', 'value': 'All'}] + 
-                        [{'label': region, 'value': region} for region in df['Region'].unique()],
-                value='All'
-            )
-        ], width=3),
-        dbc.Col([
-            html.H5("Select Category"),
-            dcc.Dropdown(
-                id='category-filter',
-                options=[{'label': 'All Categories', 'value': 'All'}] + 
-                        [{'label': category, 'value': category} for category in df['Category'].unique()],
-                value='All'
-            )
-        ], width=3),
-        dbc.Col([
-            html.H5("Date Range"),
-            dcc.DatePickerRange(
-                id='date-range',
-                start_date=df['Order Date'].min(),
-                end_date=df['Order Date'].max(),
-                display_format='YYYY-MM-DD'
-            )
-        ], width=6)
-    ], className="mb-4"),
-    
-    # Key Metrics
-    dbc.Row([
-        dbc.Col([
-            dbc.Card([
-                dbc.CardBody([
-                    html.H4("Total Sales", className="card-title"),
-                    html.H2(id="total-sales", className="card-text")
-                ])
-            ], className="mb-4")
-        ], width=3),
-        dbc.Col([
-            dbc.Card([
-                dbc.CardBody([
-                    html.H4("Total Profit", className="card-title"),
-                    html.H2(id="total-profit", className="card-text")
-                ])
-            ], className="mb-4")
-        ], width=3),
-        dbc.Col([
-            dbc.Card([
-                dbc.CardBody([
-                    html.H4("Profit Margin", className="card-title"),
-                    html.H2(id="profit-margin", className="card-text")
-                ])
-            ], className="mb-4")
-        ], width=3),
-        dbc.Col([
-            dbc.Card([
-                dbc.CardBody([
-                    html.H4("Number of Orders", className="card-title"),
-                    html.H2(id="num-orders", className="card-text")
-                ])
-            ], className="mb-4")
-        ], width=3)
-    ]),
-    
-    # Charts
-    dbc.Row([
-        dbc.Col([
-            dcc.Graph(id='sales-profit-by-region')
-        ], width=6),
-        dbc.Col([
-            dcc.Graph(id='monthly-trend')
-        ], width=6)
-    ], className="mb-4"),
+def state_map_figure(states=()):
+    """The state map without values: one location per state, all states always listed."""
+    fig = go.Figure(go.Choropleth(
+        locations=[geo_rollups.STATE_CODES.get(state, '') for state in states],
+        locationmode='USA-states',
+        z=[None] * len(states),
+        text=list(states),
+        colorscale='Greens',
+        hovertemplate=(
+            '%{text}<br>Sales: $%{customdata[0]:,.2f}<br>Profit: $%{customdata[1]:,.2f}'
+            '<br>Margin: %{customdata[2]:.1f}%<br>Line items: %{customdata[3]}<extra></extra>'
+        )
+    ))
+
+    fig.update_layout(
+        title='Sales by State',
+        geo=dict(scope='usa'),
+        margin=dict(l=0, r=0, t=60, b=0),
+        template='plotly_white'
+    )
+
+    return fig
+
+
+def base_layout(regions=(), categories=(), start_date=None, end_date=None, states=()):
+    return dbc.Container([
+        dbc.Row([
+            dbc.Col(html.H1("Superstore Sales Dashboard", className="text-center my-4"), width=12)
+        ]),
     
-    dbc.Row([
-        dbc.Col([
-            dcc.Graph(id='category-performance')
-        ], width=6),
-        dbc.Col([
-            dcc.Graph(id='discount-profit')
-        ], width=6)
-    ])
-], fluid=True)
-
-# Callback for updating metrics
-@app.callback(
-    [Output('total-sales', 'children'),
-     Output('total-profit', 'children'),
-     Output('profit-margin', 'children'),
-     Output('num-orders', 'children')],
-    [Input('region-filter', 'value'),
-     Input('category-filter', 'value'),
-     Input('date-range', 'start_date'),
-     Input('date-range', 'end_date')]
-)
-def update_metrics(region, category, start_date, end_date):
-    filtered_df = df.copy()
+        # Filters
+        dbc.Row([
+            dbc.Col([
+                html.H5("Select Region"),
+                dcc.Dropdown(
+                    id='region-filter',
+                    options=[{'label': 'All Regions', 'value': 'All'}] + 
+                            [{'label': region, 'value': region} for region in regions],
+                    value='All'
+                )
+            ], width=3),
+            dbc.Col([
+                html.H5("Select Category"),
+                dcc.Dropdown(
+                    id='category-filter',
+                    options=[{'label': 'All Categories', 'value': 'All'}] + 
+                            [{'label': category, 'value': category} for category in categories],
+                    value='All'
+                )
+            ], width=3),
+            dbc.Col([
+                html.H5("Date Range"),
+                dcc.DatePickerRange(
+                    id='date-range',
+                    start_date=start_date,
+                    end_date=end_date,
+                    display_format='YYYY-MM-DD'
+                )
+            ], width=6)
+        ], className="mb-4"),
     
-    if region != 'All':
-        filtered_df = filtered_df[filtered_df['Region'] == region]
-    if category != 'All':
-        filtered_df = filtered_df[filtered_df['Category'] == category]
-    if start_date:
-        filtered_df = filtered_df[filtered_df['Order Date'] >= start_date]
-    if end_date:
-        filtered_df = filtered_df[filtered_df['Order Date'] <= end_date]
+        # Key Metrics
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.H4("Total Sales", className="card-title"),
+                        html.H2(id="total-sales", className="card-text")
+                    ])
+                ], className="mb-4")
+            ], width=3),
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.H4("Total Profit", className="card-title"),
+                        html.H2(id="total-profit", className="card-text")
+                    ])
+                ], className="mb-4")
+            ], width=3),
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.H4("Profit Margin", className="card-title"),
+                        html.H2(id="profit-margin", className="card-text")
+                    ])
+                ], className="mb-4")
+            ], width=3),
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.H4("Number of Orders", className="card-title"),
+                        html.H2(id="num-orders", className="card-text")
+                    ])
+                ], className="mb-4")
+            ], width=3)
+        ]),
     
-    total_sales = filtered_df['Sales'].sum()
-    total_profit = filtered_df['Profit'].sum()
-    profit_margin = (total_profit / total_sales * 100) if total_sales > 0 else 0
-    num_orders = len(filtered_df['Order ID'].unique())
+        # Charts
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id='sales-profit-by-region')
+            ], width=6),
+            dbc.Col([
+                dcc.Graph(id='monthly-trend')
+            ], width=6)
+        ], className="mb-4"),
     
-    return f'${total_sales:,.2f}', f'${total_profit:,.2f}', f'{profit_margin:.1f}%', f'{num_orders:,}'
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id='category-performance')
+            ], width=6),
+            dbc.Col([
+                dcc.Graph(id='discount-profit')
+            ], width=6)
+        ], className="mb-4"),
 
-# Callback for sales and profit by region
-@app.callback(
-    Output('sales-profit-by-region', 'figure'),
-    [Input('category-filter', 'value'),
-     Input('date-range', 'start_date'),
-     Input('date-range', 'end_date')]
-)
-def update_regional_chart(category, start_date, end_date):
-    filtered_df = df.copy()
-    
-    if category != 'All':
-        filtered_df = filtered_df[filtered_df['Category'] == category]
-    if start_date:
-        filtered_df = filtered_df[filtered_df['Order Date'] >= start_date]
-    if end_date:
-        filtered_df = filtered_df[filtered_df['Order Date'] <= end_date]
-    
-    regional_data = filtered_df.groupby('Region').agg({
-        'Sales': 'sum',
-        'Profit': 'sum'
-    }).reset_index()
-    
+        # Geography: states on the map, click one for its cities
+        dbc.Row([
+            dbc.Col([
+                html.H5("Map Metric"),
+                dcc.Dropdown(
+                    id='map-metric',
+                    options=[{'label': metric, 'value': metric} for metric in geo_rollups.METRICS],
+                    value='Sales',
+                    clearable=False
+                )
+            ], width=3)
+        ], className="mb-2"),
+
+        dbc.Row([
+            dbc.Col([
+                # The outline is sent once with the page; callbacks patch in values
+                dcc.Graph(id='state-map', figure=state_map_figure(states))
+            ], width=7),
+            dbc.Col([
+                dcc.Graph(id='city-drill')
+            ], width=5)
+        ], className="mb-4"),
+
+        # Orders and shipping
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id='ship-lead-time')
+            ], width=8),
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.H4("Average Basket", className="card-title"),
+                        html.H2(id="basket-value", className="card-text"),
+                        html.P(id="basket-size", className="card-text")
+                    ])
+                ], className="mb-4"),
+                dbc.Card([
+                    dbc.CardBody([
+                        html.H4("Average Lead Time", className="card-title"),
+                        html.H2(id="lead-time", className="card-text")
+                    ])
+                ], className="mb-4")
+            ], width=4)
+        ], className="mb-4"),
+
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id='discount-impact')
+            ], width=12)
+        ], className="mb-4"),
+
+        # Drill-down: top / bottom products, customers and cities
+        dbc.Row([
+            dbc.Col([
+                html.H5("Leaderboard"),
+                dcc.Dropdown(
+                    id='leaderboard-dimension',
+                    options=[{'label': name, 'value': dim} for dim, name in LEADERBOARD_NAMES.items()],
+                    value='Product',
+                    clearable=False
+                )
+            ], width=3),
+            dbc.Col([
+                html.H5("Ranked By"),
+                dcc.Dropdown(
+                    id='leaderboard-metric',
+                    options=[{'label': metric, 'value': metric} for metric in leaderboards.METRICS],
+                    value='Sales',
+                    clearable=False
+                )
+            ], width=3),
+            dbc.Col([
+                html.H5("Show"),
+                dcc.RadioItems(
+                    id='leaderboard-direction',
+                    options=[{'label': ' Top', 'value': 'top'}, {'label': ' Bottom', 'value': 'bottom'}],
+                    value='top',
+                    inline=True,
+                    inputStyle={'margin-left': '10px'}
+                )
+            ], width=3),
+            dbc.Col([
+                html.H5("Entries"),
+                dcc.Dropdown(
+                    id='leaderboard-n',
+                    options=[{'label': str(n), 'value': n} for n in (10, 20, 50)],
+                    value=10,
+                    clearable=False
+                )
+            ], width=3)
+        ], className="mb-2"),
+
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id='leaderboard')
+            ], width=12)
+        ], className="mb-4"),
+
+        # Customers: RFM segments and acquisition-cohort retention (all dates)
+        dbc.Row([
+            dbc.Col([
+                html.H5("Cohorts By"),
+                dcc.RadioItems(
+                    id='cohort-period',
+                    options=[{'label': f' {period}', 'value': period} for period in customer_analytics.PERIODS],
+                    value='Quarter',
+                    inline=True,
+                    inputStyle={'margin-left': '10px'}
+                )
+            ], width=12)
+        ], className="mb-2"),
+
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id='rfm-segments')
+            ], width=5),
+            dbc.Col([
+                dcc.Graph(id='cohort-retention')
+            ], width=7)
+        ])
+    ], fluid=True)
+
+
+def serve_layout():
+    ensure_data()
+    layout = base_layout(
+        df['Region'].unique(), df['Category'].unique(), df['Order Date'].min(), df['Order Date'].max(),
+        geo.labels['State']
+    )
+    # A fresh id per page load scopes supersession to one browser tab
+    return html.Div([layout, dcc.Store(id='session-id', data=uuid.uuid4().hex)])
+
+
+# Same components without data, so Dash validates callbacks without loading it
+app.validation_layout = html.Div([base_layout(), dcc.Store(id='session-id')])
+app.layout = serve_layout
+
+@instrumented('figure.bar')
+def bar_figure(labels, sums, title):
     fig = go.Figure()
     fig.add_trace(go.Bar(
-        x=regional_data['Region'],
-        y=regional_data['Sales'],
+        x=labels,
+        y=sums['Sales'],
         name='Sales',
         marker_color='#27ae60'
     ))
     fig.add_trace(go.Bar(
-        x=regional_data['Region'],
-        y=regional_data['Profit'],
+        x=labels,
+        y=sums['Profit'],
         name='Profit',
         marker_color='#2980b9'
     ))
     
     fig.update_layout(
-        title='Sales and Profit by Region',
+        title=title,
         barmode='group',
         template='plotly_white'
     )
     
     return fig
 
-# Callback for monthly trend
-@app.callback(
-    Output('monthly-trend', 'figure'),
-    [Input('region-filter', 'value'),
-     Input('category-filter', 'value')]
-)
-def update_monthly_trend(region, category):
-    filtered_df = df.copy()
-    
-    if region != 'All':
-        filtered_df = filtered_df[filtered_df['Region'] == region]
-    if category != 'All':
-        filtered_df = filtered_df[filtered_df['Category'] == category]
-    
-    monthly_data = filtered_df.groupby(filtered_df['Order Date'].dt.to_period('M')).agg({
-        'Sales': 'sum',
-        'Profit': 'sum'
-    }).reset_index()
-    monthly_data['Order Date'] = monthly_data['Order Date'].astype(str)
-    
+@instrumented('figure.trend')
+def trend_figure(months, sums):
     fig = go.Figure()
     fig.add_trace(go.Scatter(
-        x=monthly_data['Order Date'],
-        y=monthly_data['Sales'],
+        x=months,
+        y=sums['Sales'],
         name='Sales',
         line=dict(color='#27ae60')
     ))
     fig.add_trace(go.Scatter(
-        x=monthly_data['Order Date'],
-        y=monthly_data['Profit'],
+        x=months,
+        y=sums['Profit'],
         name='Profit',
         line=dict(color='#2980b9')
     ))
@@ -220,91 +434,539 @@ def update_monthly_trend(region, category):
     
     return fig
 
-# Callback for category performance
-@app.callback(
-    Output('category-performance', 'figure'),
-    [Input('region-filter', 'value'),
-     Input('date-range', 'start_date'),
-     Input('date-range', 'end_date')]
-)
-def update_category_chart(region, start_date, end_date):
-    filtered_df = df.copy()
-    
-    if region != 'All':
-        filtered_df = filtered_df[filtered_df['Region'] == region]
-    if start_date:
-        filtered_df = filtered_df[filtered_df['Order Date'] >= start_date]
-    if end_date:
-        filtered_df = filtered_df[filtered_df['Order Date'] <= end_date]
+@instrumented('figure.discount', rows=lambda fig: sum(len(trace.x) for trace in fig.data))
+def discount_figure(rows):
+    fig = go.Figure(discount_profit_traces(
+        engine.column('Discount', rows),
+        engine.column('Profit', rows),
+        engine.column('Sales', rows),
+        mode=SCATTER_MODE
+    ))
     
-    category_data = filtered_df.groupby('Category').agg({
-        'Sales': 'sum',
-        'Profit': 'sum'
-    }).reset_index()
+    fig.update_layout(
+        title='Discount vs Profit Relationship',
+        showlegend=False,
+        xaxis_title='Discount',
+        yaxis_title='Profit',
+        template='plotly_white'
+    )
     
+    return fig
+
+@instrumented('figure.lead_time')
+def lead_time_figure(modes, days, counts):
     fig = go.Figure()
-    fig.add_trace(go.Bar(
-        x=category_data['Category'],
-        y=category_data['Sales'],
-        name='Sales',
-        marker_color='#27ae60'
+    for mode, mode_counts in zip(modes, counts):
+        if mode_counts.any():
+            fig.add_trace(go.Bar(x=days, y=mode_counts, name=mode))
+
+    # The first and last bins collect the lead times outside the window
+    labels = [str(day) for day in days]
+    labels[0], labels[-1] = f'<{days[1]}', f'>{days[-2]}'
+    fig.update_layout(
+        title='Ship Lead Time by Ship Mode',
+        barmode='group',
+        xaxis=dict(tickmode='array', tickvals=list(days), ticktext=labels),
+        xaxis_title='Days from order to shipment',
+        yaxis_title='Orders',
+        template='plotly_white'
+    )
+
+    return fig
+
+@instrumented('figure.discount_impact')
+def discount_impact_figure(rows):
+    # Margin points lost per 10-point discount increase, with 95% intervals
+    lost = -rows['Slope'] * 10
+    fig = go.Figure(go.Bar(
+        x=rows['Sub-Category'],
+        y=lost,
+        marker_color='#c0392b',
+        error_y=dict(
+            type='data',
+            array=(-rows['Slope Low'] * 10 - lost),
+            arrayminus=(lost + rows['Slope High'] * 10)
+        ),
+        customdata=np.column_stack([
+            rows['Break-even'] * 100, rows['Break-even Low'] * 100, rows['Break-even High'] * 100,
+            rows['Binned Break-even'] * 100, rows['Lines']
+        ]),
+        hovertemplate=(
+            '%{x}: %{y:.1f} margin points per 10% discount'
+            '<br>Fitted break-even discount: %{customdata[0]:.0f}% (95% CI %{customdata[1]:.0f}-%{customdata[2]:.0f}%)'
+            '<br>Margin negative from the %{customdata[3]:.0f}% bin<br>Line items: %{customdata[4]}<extra></extra>'
+        )
     ))
-    fig.add_trace(go.Bar(
-        x=category_data['Category'],
-        y=category_data['Profit'],
-        name='Profit',
-        marker_color='#2980b9'
+
+    fig.update_layout(
+        title='Discount Impact by Sub-Category (all dates)',
+        yaxis_title='Margin points lost per 10% discount',
+        template='plotly_white'
+    )
+
+    return fig
+
+@instrumented('figure.leaderboard')
+def leaderboard_figure(table, dim, metric, bottom):
+    # Best entry on top
+    table = table.iloc[::-1]
+    values = table['Margin'] if metric == 'Margin' else table[metric]
+    fig = go.Figure(go.Bar(
+        x=values,
+        y=table[dim],
+        orientation='h',
+        marker_color=np.where(values < 0, '#c0392b', '#27ae60' if metric == 'Sales' else '#2980b9'),
+        customdata=np.column_stack([table['Sales'], table['Profit'], table['Margin'], table['Line Items']]),
+        hovertemplate=(
+            '%{y}<br>Sales: $%{customdata[0]:,.2f}<br>Profit: $%{customdata[1]:,.2f}'
+            '<br>Margin: %{customdata[2]:.1f}%<br>Line items: %{customdata[3]}<extra></extra>'
+        )
     ))
-    
+
     fig.update_layout(
-        title='Category Performance',
-        barmode='group',
+        title=f"{'Bottom' if bottom else 'Top'} {len(table)} {LEADERBOARD_NAMES[dim]} by {metric}",
+        xaxis_title='Profit margin (%)' if metric == 'Margin' else f'{metric} ($)',
+        height=max(400, 24 * len(table) + 120),
         template='plotly_white'
     )
-    
+
     return fig
 
-# Callback for discount vs profit
-@app.callback(
-    Output('discount-profit', 'figure'),
-    [Input('region-filter', 'value'),
-     Input('category-filter', 'value'),
-     Input('date-range', 'start_date'),
-     Input('date-range', 'end_date')]
-)
-def update_discount_chart(region, category, start_date, end_date):
-    filtered_df = df.copy()
-    
-    if region != 'All':
-        filtered_df = filtered_df[filtered_df['Region'] == region]
-    if category != 'All':
-        filtered_df = filtered_df[filtered_df['Category'] == category]
-    if start_date:
-        filtered_df = filtered_df[filtered_df['Order Date'] >= start_date]
-    if end_date:
-        filtered_df = filtered_df[filtered_df['Order Date'] <= end_date]
-    
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=filtered_df['Discount'],
-        y=filtered_df['Profit'],
-        mode='markers',
-        marker=dict(
-            size=8,
-            color=filtered_df['Sales'],
-            colorscale='Viridis',
-            showscale=True
+@instrumented('figure.rfm')
+def rfm_figure(segments):
+    fig = go.Figure(go.Bar(
+        x=segments.index,
+        y=segments['Customers'],
+        marker_color='#8e44ad',
+        customdata=np.column_stack([
+            segments['Sales Share'] * 100, segments['Avg Recency Days'], segments['Avg Orders'], segments['Avg Sales']
+        ]),
+        hovertemplate=(
+            '%{x}: %{y} customers<br>Share of Sales: %{customdata[0]:.1f}%'
+            '<br>Days since last order: %{customdata[1]:.0f}<br>Orders per customer: %{customdata[2]:.1f}'
+            '<br>Sales per customer: $%{customdata[3]:,.2f}<extra></extra>'
         )
     ))
-    
+
     fig.update_layout(
-        title='Discount vs Profit Relationship',
-        xaxis_title='Discount',
-        yaxis_title='Profit',
+        title='Customers by RFM Segment',
+        yaxis_title='Customers',
         template='plotly_white'
     )
-    
+
+    return fig
+
+@instrumented('figure.retention')
+def retention_figure(table, period):
+    rates = table.drop(columns='Customers')
+    fig = go.Figure(go.Heatmap(
+        z=rates.to_numpy() * 100,
+        x=rates.columns,
+        y=rates.index,
+        customdata=np.repeat(table['Customers'].to_numpy()[:, None], rates.shape[1], axis=1),
+        colorscale='Blues',
+        zmin=0,
+        zmax=100,
+        colorbar=dict(title='Active %'),
+        hovertemplate=(
+            f'Cohort %{{y}}, {period.lower()} %{{x}}: %{{z:.0f}}% active'
+            '<br>Cohort size: %{customdata} customers<extra></extra>'
+        )
+    ))
+
+    fig.update_layout(
+        title=f'Customer Retention by {period} of First Order',
+        xaxis_title=f'{period}s since first order',
+        yaxis=dict(autorange='reversed', type='category'),
+        template='plotly_white'
+    )
+
+    return fig
+
+@instrumented('figure.cities')
+def city_figure(table, state, metric, period):
+    # Best city on top
+    table = table.iloc[::-1]
+    values = table[metric]
+    fig = go.Figure(go.Bar(
+        x=values,
+        y=table['City'],
+        orientation='h',
+        marker_color=np.where(values < 0, '#c0392b', '#27ae60' if metric == 'Sales' else '#2980b9'),
+        customdata=np.column_stack([
+            table['Sales'], table['Profit'], table['Margin'], table['Line Items'], table['Postal Codes']
+        ]),
+        hovertemplate=(
+            '%{y}<br>Sales: $%{customdata[0]:,.2f}<br>Profit: $%{customdata[1]:,.2f}'
+            '<br>Margin: %{customdata[2]:.1f}%<br>Line items: %{customdata[3]}'
+            '<br>Postal codes: %{customdata[4]}<extra></extra>'
+        )
+    ))
+
+    fig.update_layout(
+        title=f'Cities of {state} by {metric} ({period})' if state else 'Click a state on the map to see its cities',
+        xaxis_title='Profit margin (%)' if metric == 'Margin' else f'{metric} ($)',
+        height=max(450, 24 * len(table) + 120),
+        template='plotly_white'
+    )
+
     return fig
 
+@instrumented('callback.dashboard')
+@figure_cache.cached('dashboard', ('region', 'category', 'start_date', 'end_date'))
+@profiled('render_dashboard')
+def render_dashboard(region, category, start_date, end_date):
+    """KPI strings and the three aggregate figures for one filter combination.
+
+    Each chart keeps the filters it has always honoured: the regional chart
+    ignores the region filter, the category chart ignores the category filter
+    and the monthly trend ignores the date range. All of them are sliced from
+    one Region x Category aggregate of the date range. The Discount vs Profit
+    scatter is built separately by ``render_discount``.
+    """
+    regions, categories, sums, counts = region_category_sums(start_date, end_date)
+    in_region = label_mask(regions, region)
+    in_category = label_mask(categories, category)
+
+    # KPI cards: the cells inside both filters
+    total_sales = sums['Sales'][np.ix_(in_region, in_category)].sum()
+    total_profit = sums['Profit'][np.ix_(in_region, in_category)].sum()
+    profit_margin = (total_profit / total_sales * 100) if total_sales > 0 else 0
+    if store.exact_orders:
+        num_orders = store.distinct_orders(region, category, start_date, end_date)
+    else:
+        # Orders spanning several dates cannot be counted from daily totals
+        rows = engine.select(region, category, start_date, end_date)
+        num_orders = engine.distinct_count('Order ID', rows)
+
+    # Regional chart: all regions within the category filter, empty groups dropped
+    region_counts = counts[:, in_category].sum(axis=1)
+    regional = {m: sums[m][:, in_category].sum(axis=1)[region_counts > 0] for m in sums}
+
+    # Category chart: all categories within the region filter
+    category_counts = counts[in_region].sum(axis=0)
+    by_category = {m: sums[m][in_region].sum(axis=0)[category_counts > 0] for m in sums}
+
+    months, monthly = store.series('M', region, category)
+
+    return [
+        f'${total_sales:,.2f}', f'${total_profit:,.2f}', f'{profit_margin:.1f}%', f'{num_orders:,}',
+        bar_figure(regions[region_counts > 0], regional, 'Sales and Profit by Region'),
+        trend_figure(months, monthly),
+        bar_figure(categories[category_counts > 0], by_category, 'Category Performance'),
+    ]
+
+
+@instrumented('callback.discount')
+@figure_cache.cached('discount', ('region', 'category', 'start_date', 'end_date'))
+@profiled('render_discount')
+def render_discount(region, category, start_date, end_date):
+    return discount_figure(engine.select(region, category, start_date, end_date))
+
+
+@instrumented('callback.shipping')
+@figure_cache.cached('shipping', ('region', 'category', 'start_date', 'end_date'))
+@profiled('render_shipping')
+def render_shipping(region, category, start_date, end_date):
+    """Basket and lead time cards plus the lead time histogram per Ship Mode.
+
+    Read from the precomputed order table; a category filter keeps the orders
+    containing that category, with their whole basket.
+    """
+    rows = orders.select(region, category, start_date, end_date)
+    basket = orders.basket(rows)
+    return [
+        f"${basket['value']:,.2f}",
+        f"{basket['lines']:.2f} lines, {basket['units']:.2f} units per order",
+        f"{basket['lead_days']:.1f} days",
+        lead_time_figure(*orders.lead_time_histogram(rows)),
+    ]
+
+
+@instrumented('callback.discount_impact')
+@figure_cache.cached('discount_impact', ('region', 'category'))
+@profiled('render_discount_impact')
+def render_discount_impact(region, category):
+    """Discount elasticity per Sub-Category for the region and category filters.
+
+    Read from the precomputed bootstrap table, which covers the whole date range.
+    """
+    return discount_impact_figure(discount_impact.sub_category_view(discounts, region, category))
+
+
+@instrumented('callback.state_map')
+@figure_cache.cached('state_map', ('region', 'category', 'start_date', 'end_date', 'metric'))
+@profiled('render_state_map')
+def render_state_map(region, category, start_date, end_date, metric):
+    """Per-state values for the map, in the order of its locations.
+
+    Only the values travel: the outline and the state locations are part of
+    the page, and the callback patches these into it. Read from the monthly
+    geo rollups; the date range is widened to whole months.
+    """
+    states = geo.states(region, category, start_date, end_date)
+    sold = states['Line Items'].to_numpy() > 0
+    values = states[metric].round(2).to_numpy()
+    colorscale, midpoint = MAP_COLORS[metric]
+    return {
+        'z': [value if keep and not np.isnan(value) else None for value, keep in zip(values.tolist(), sold)],
+        'customdata': states[['Sales', 'Profit', 'Margin', 'Line Items']].round(2).to_numpy().tolist(),
+        'colorscale': colorscale,
+        'zmid': midpoint,
+        'title': f'{metric} by State ({geo.period(start_date, end_date)})',
+    }
+
+
+@instrumented('callback.cities')
+@figure_cache.cached('cities', ('state', 'region', 'category', 'start_date', 'end_date', 'metric'))
+@profiled('render_cities')
+def render_cities(state, region, category, start_date, end_date, metric):
+    """Top cities of the clicked state within the filters, from the monthly geo rollups.
+
+    Without a clicked state the chart is empty and asks for one.
+    """
+    table = geo.cities(state, region, category, start_date, end_date, metric)
+    return city_figure(table, state, metric, geo.period(start_date, end_date))
+
+
+@instrumented('callback.leaderboard')
+@figure_cache.cached('leaderboard', ('region', 'category', 'start_date', 'end_date',
+                                     'dimension', 'metric', 'direction', 'n'))
+@profiled('render_leaderboard')
+def render_leaderboard(region, category, start_date, end_date, dimension, metric, direction, n):
+    """Top or bottom ``n`` products / customers / cities within the filters."""
+    bottom = direction == 'bottom'
+    table = boards.top(dimension, metric, int(n), region, category, start_date, end_date, bottom)
+    return leaderboard_figure(table, dimension, metric, bottom)
+
+
+@instrumented('callback.customers')
+@figure_cache.cached('customers', ('period',))
+@profiled('render_customers')
+def render_customers(period):
+    """RFM segment sizes and the cohort retention heat map.
+
+    Read from the precomputed customer table, which covers the whole date range.
+    """
+    return [
+        rfm_figure(customers.rfm_segments()),
+        retention_figure(customers.retention(period), period),
+    ]
+
+
+def run_callback(lane, session, func, *args):
+    """Run a render function on the callback pool; skip the update if it cannot finish."""
+    ensure_data()
+    try:
+        return callback_pool.run(lane, session, func, *args)
+    except (Superseded, Overloaded, CallbackTimeout):
+        # Superseded: the browser is waiting on a newer request anyway.
+        # Overloaded / timed out: keep what is on screen; a timed-out render
+        # still completes in the background and fills the figure cache.
+        raise PreventUpdate
+
+# Inputs each figure depends on; a figure is only re-sent when one of them changed
+FIGURE_INPUTS = [
+    {'category-filter.value', 'date-range.start_date', 'date-range.end_date'},
+    {'region-filter.value', 'category-filter.value'},
+    {'region-filter.value', 'date-range.start_date', 'date-range.end_date'},
+]
+
+# The cards and aggregate charts share one selection per interaction, the
+# scatter is rendered independently on the heavy lane, the order / shipping,
+# map, discount impact, leaderboard and customer panels read precomputed tables
+# on the fast lane
+@app.callback(
+    [Output('total-sales', 'children'),
+     Output('total-profit', 'children'),
+     Output('profit-margin', 'children'),
+     Output('num-orders', 'children'),
+     Output('sales-profit-by-region', 'figure'),
+     Output('monthly-trend', 'figure'),
+     Output('category-performance', 'figure')],
+    [Input('region-filter', 'value'),
+     Input('category-filter', 'value'),
+     Input('date-range', 'start_date'),
+     Input('date-range', 'end_date')],
+    [State('session-id', 'data')]
+)
+def update_dashboard(region, category, start_date, end_date, session):
+    outputs = list(run_callback('fast', session, render_dashboard, region, category, start_date, end_date))
+    triggered = set(ctx.triggered_prop_ids) if ctx.triggered_id else None
+    if triggered:
+        for i, inputs in enumerate(FIGURE_INPUTS, start=4):
+            if not triggered & inputs:
+                outputs[i] = no_update
+    return outputs
+
+@app.callback(
+    Output('discount-profit', 'figure'),
+    [Input('region-filter', 'value'),
+     Input('category-filter', 'value'),
+     Input('date-range', 'start_date'),
+     Input('date-range', 'end_date')],
+    [State('session-id', 'data')]
+)
+def update_discount_profit(region, category, start_date, end_date, session):
+    return run_callback('heavy', session, render_discount, region, category, start_date, end_date)
+
+@app.callback(
+    [Output('basket-value', 'children'),
+     Output('basket-size', 'children'),
+     Output('lead-time', 'children'),
+     Output('ship-lead-time', 'figure')],
+    [Input('region-filter', 'value'),
+     Input('category-filter', 'value'),
+     Input('date-range', 'start_date'),
+     Input('date-range', 'end_date')],
+    [State('session-id', 'data')]
+)
+def update_shipping(region, category, start_date, end_date, session):
+    return run_callback('fast', session, render_shipping, region, category, start_date, end_date)
+
+@app.callback(
+    Output('discount-impact', 'figure'),
+    [Input('region-filter', 'value'),
+     Input('category-filter', 'value')],
+    [State('session-id', 'data')]
+)
+def update_discount_impact(region, category, session):
+    return run_callback('fast', session, render_discount_impact, region, category)
+
+@app.callback(
+    Output('state-map', 'figure'),
+    [Input('region-filter', 'value'),
+     Input('category-filter', 'value'),
+     Input('date-range', 'start_date'),
+     Input('date-range', 'end_date'),
+     Input('map-metric', 'value')],
+    [State('session-id', 'data')]
+)
+def update_state_map(region, category, start_date, end_date, metric, session):
+    values = run_callback('fast', session, render_state_map, region, category, start_date, end_date, metric)
+    patch = Patch()
+    for name in ('z', 'customdata', 'colorscale', 'zmid'):
+        patch['data'][0][name] = values[name]
+    patch['layout']['title']['text'] = values['title']
+    return patch
+
+@app.callback(
+    Output('city-drill', 'figure'),
+    [Input('state-map', 'clickData'),
+     Input('region-filter', 'value'),
+     Input('category-filter', 'value'),
+     Input('date-range', 'start_date'),
+     Input('date-range', 'end_date'),
+     Input('map-metric', 'value')],
+    [State('session-id', 'data')]
+)
+def update_cities(click, region, category, start_date, end_date, metric, session):
+    state = STATE_NAMES.get(click['points'][0].get('location')) if click else None
+    return run_callback('fast', session, render_cities, state, region, category, start_date, end_date, metric)
+
+@app.callback(
+    Output('leaderboard', 'figure'),
+    [Input('region-filter', 'value'),
+     Input('category-filter', 'value'),
+     Input('date-range', 'start_date'),
+     Input('date-range', 'end_date'),
+     Input('leaderboard-dimension', 'value'),
+     Input('leaderboard-metric', 'value'),
+     Input('leaderboard-direction', 'value'),
+     Input('leaderboard-n', 'value')],
+    [State('session-id', 'data')]
+)
+def update_leaderboard(region, category, start_date, end_date, dimension, metric, direction, n, session):
+    return run_callback('fast', session, render_leaderboard, region, category, start_date, end_date,
+                        dimension, metric, direction, n)
+
+@app.callback(
+    [Output('rfm-segments', 'figure'),
+     Output('cohort-retention', 'figure')],
+    [Input('cohort-period', 'value')],
+    [State('session-id', 'data')]
+)
+def update_customers(period, session):
+    return run_callback('fast', session, render_customers, period)
+
+
+# WSGI entry point for external servers, e.g. ``gunicorn -w 4 dashboard:server``
+server = app.server
+
+
+def serve_socket(sock, threads=16):
+    """Serve the app on an already bound, listening socket."""
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        # Werkzeug's threaded server still serves requests concurrently
+        from werkzeug.serving import make_server
+        host, port = sock.getsockname()[:2]
+        make_server(host, port, server, threaded=True, fd=sock.fileno()).serve_forever()
+    else:
+        # waitress accepts connections asynchronously and hands requests to
+        # its threads, which in turn wait on the callback pool lanes
+        waitress_serve(server, sockets=[sock], threads=threads)
+
+
+def serve(host='127.0.0.1', port=8050, threads=16, workers=1):
+    """Production server: no debugger or reloader, many concurrent requests.
+
+    With ``workers > 1`` the socket is bound once and each worker process
+    accepts connections on it. The columns and the tables derived from them
+    (filter index, time series, order table, leaderboards, discount impact,
+    customer table, geo rollups) are loaded from the cache before the workers
+    start, so they share one copy of them.
+    """
+    # Load before forking so every worker starts with the dataset mapped
+    ensure_data()
+    sock = socket.create_server((host, port))
+    if workers <= 1:
+        serve_socket(sock, threads)
+        return
+    sock.set_inheritable(True)
+    # Forked workers inherit the mapped dataset as is; spawned ones re-import
+    # this module and map the same cache files
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    processes = [
+        context.Process(target=serve_socket, args=(sock, threads), name=f'dashboard-worker-{i}')
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    # Stopping the parent stops its workers too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for process in processes:
+            process.join()
+    finally:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+def main(argv=None, prog=None):
+    global AGGREGATE_BACKEND
+    parser = argparse.ArgumentParser(prog=prog, description='Superstore sales dashboard')
+    parser.add_argument('--serve', action='store_true',
+                        help='production mode: no debug reloader, pooled callbacks')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='worker processes sharing the memory-mapped dataset (with --serve)')
+    parser.add_argument('--backend', choices=['arrays', 'sql'], default=AGGREGATE_BACKEND,
+                        help=f'aggregate backend (default: ${sql_store.BACKEND_ENV} or arrays)')
+    args = parser.parse_args(argv)
+    AGGREGATE_BACKEND = args.backend
+    if args.serve:
+        serve(args.host, args.port, args.threads, args.workers)
+    else:
+        app.run(debug=True, host=args.host, port=args.port)
+
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    main()
@@ -0,0 +1,262 @@
+"""Typed columnar cache for the Superstore CSV export.
+
+Parsing the CSV (and inferring the date format) is the slowest part of every
+entry point. ``load_superstore`` converts the export once into a directory of
+NumPy ``.npy`` files, one per column:
+
+- string columns are dictionary encoded (codes in the smallest integer type
+  that fits the dictionary + a label array) and come back as pandas
+  categoricals;
+- date columns are stored as ``datetime64[ns]``;
+- integer columns (Row ID, Postal Code, Quantity) are downcast to the smallest
+  integer type holding their range; float measures stay ``float64`` so sums
+  are unchanged.
+
+Later loads memory-map the arrays instead of parsing text, so every process
+that loads the same cache shares one copy of the columns through the page
+cache. Builds are serialized across processes by :func:`cache_lock`, and files
+are swapped in with :func:`save_array` so readers that already mapped the old
+file keep it intact. The cache records
+the source file's size, mtime and SHA-1 and is rebuilt when they change.
+Callers that never display the free-text ``TEXT_COLUMNS`` leave them out with
+``exclude=TEXT_COLUMNS`` and read them later, only if needed, through
+``load_superstore(columns=...)``. ``python data_loader.py`` prints the memory
+footprint of the raw and compact frames.
+"""
+import argparse
+import os
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from cache_meta import (
+    CACHE_ROOT, CACHE_VERSION, DEFAULT_SOURCE, cache_dir_for, cached_version, file_sha1, read_meta, source_stamp,
+    write_meta,
+)
+from instrumentation import span
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+DATE_COLUMNS = ["Order Date", "Ship Date"]
+DATE_FORMAT = "%m/%d/%Y"
+# Free-text columns that are only ever displayed, never grouped or filtered on
+TEXT_COLUMNS = ["Customer Name", "Product Name"]
+
+
+@contextmanager
+def cache_lock(cache_dir):
+    """Exclusive lock on ``cache_dir``, held while one process (re)builds files in it."""
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, ".lock"), "w") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def save_array(path, array):
+    """Write ``array`` to ``path`` (``.npy``) through a temporary file and rename."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def parse_dates(values):
+    """Parse a date column with the export's fixed format, inferring it if that fails."""
+    with span("parse_dates", column=getattr(values, "name", None)) as s:
+        s.rows = len(values)
+        try:
+            return pd.to_datetime(values, format=DATE_FORMAT)
+        except (ValueError, TypeError):
+            return pd.to_datetime(values)
+
+
+def read_csv(source=DEFAULT_SOURCE, **kwargs):
+    """Read the raw export and parse its date columns."""
+    with span("load_csv", source=str(source)) as s:
+        df = pd.read_csv(source, encoding="latin1", **kwargs)
+        s.rows = len(df)
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = parse_dates(df[col])
+    return df
+
+
+def is_fresh(source, cache_dir):
+    """True when the cache in ``cache_dir`` was built from the current ``source``."""
+    # Same size and mtime, or the source moved away and the cache is the only
+    # copy of the data left
+    if cached_version(source, cache_dir) is not None:
+        return True
+    meta = read_meta(cache_dir)
+    if meta is None or meta.get("version") != CACHE_VERSION:
+        return False
+    stamp = source_stamp(source)
+    if meta["source"]["size"] != stamp["size"]:
+        return False
+    # Touched but possibly unchanged: fall back to the content hash
+    if meta["source"]["sha1"] != file_sha1(source):
+        return False
+    meta["source"]["mtime"] = stamp["mtime"]
+    write_meta(cache_dir, meta)
+    return True
+
+
+def build_cache(source=DEFAULT_SOURCE, cache_dir=None):
+    """Parse ``source`` and write the columnar cache to ``cache_dir``."""
+    cache_dir = cache_dir or cache_dir_for(source)
+    os.makedirs(cache_dir, exist_ok=True)
+    stamp = source_stamp(source)
+    df = read_csv(source)
+
+    with span("write_cache", cache_dir=cache_dir) as s:
+        s.rows = len(df)
+        columns = _write_columns(df, cache_dir)
+
+    write_meta(
+        cache_dir,
+        {
+            "version": CACHE_VERSION,
+            "source": {**stamp, "sha1": file_sha1(source), "path": os.path.abspath(source)},
+            "rows": len(df),
+            "columns": columns,
+        },
+    )
+    return cache_dir
+
+
+def _code_dtype(n_labels):
+    """Smallest signed integer type holding codes ``-1 .. n_labels - 1``."""
+    return np.min_scalar_type(-max(n_labels, 1))
+
+
+def _write_columns(df, cache_dir):
+    columns = []
+    for i, col in enumerate(df.columns):
+        values = df[col]
+        name = f"col{i:02d}"
+        if pd.api.types.is_datetime64_any_dtype(values):
+            kind = "datetime"
+            save_array(os.path.join(cache_dir, f"{name}.npy"), values.to_numpy(dtype="datetime64[ns]"))
+        elif pd.api.types.is_numeric_dtype(values):
+            kind = "numeric"
+            if pd.api.types.is_integer_dtype(values):
+                values = pd.to_numeric(values, downcast="integer")
+            save_array(os.path.join(cache_dir, f"{name}.npy"), values.to_numpy())
+        else:
+            kind = "category"
+            codes, labels = pd.factorize(values, sort=True)
+            save_array(os.path.join(cache_dir, f"{name}.npy"), codes.astype(_code_dtype(len(labels))))
+            save_array(
+                os.path.join(cache_dir, f"{name}.labels.npy"),
+                np.asarray(labels, dtype=str),
+            )
+        columns.append({"name": col, "file": name, "kind": kind})
+    return columns
+
+
+def load_cache(cache_dir, columns=None, exclude=()):
+    """Memory-map the cached arrays back into a DataFrame."""
+    with span("load_cache", cache_dir=cache_dir) as s:
+        df = _load_columns(cache_dir, columns, exclude)
+        s.rows = len(df)
+    return df
+
+
+def _load_columns(cache_dir, columns, exclude):
+    meta = read_meta(cache_dir)
+    data = {}
+    for entry in meta["columns"]:
+        if columns is not None and entry["name"] not in columns:
+            continue
+        if entry["name"] in exclude:
+            continue
+        path = os.path.join(cache_dir, f"{entry['file']}.npy")
+        values = np.load(path, mmap_mode="r")
+        if entry["kind"] == "category":
+            labels = np.load(os.path.join(cache_dir, f"{entry['file']}.labels.npy"))
+            # Codes were validated when the cache was written; skipping the
+            # check keeps them memory-mapped instead of copied
+            data[entry["name"]] = pd.Categorical.from_codes(
+                values, categories=labels.astype(object), validate=False
+            )
+        else:
+            data[entry["name"]] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def dataset_version(source=DEFAULT_SOURCE, cache_root=CACHE_ROOT):
+    """Short content fingerprint of the cached dataset, for keying derived results."""
+    meta = read_meta(cache_dir_for(source, cache_root))
+    return meta["source"]["sha1"][:16] if meta else None
+
+
+def source_version(source=DEFAULT_SOURCE):
+    """The :func:`dataset_version` of ``source`` once cached, hashed from the file itself."""
+    return file_sha1(source)[:16]
+
+
+def load_superstore(source=DEFAULT_SOURCE, cache_root=CACHE_ROOT, columns=None, rebuild=False, exclude=()):
+    """Load the Superstore export through the columnar cache, rebuilding it when stale.
+
+    ``columns`` restricts the load to those columns; ``exclude`` leaves
+    columns out (e.g. ``TEXT_COLUMNS``).
+    """
+    cache_dir = cache_dir_for(source, cache_root)
+    if rebuild or not is_fresh(source, cache_dir):
+        with cache_lock(cache_dir):
+            # Another process may have rebuilt it while we waited for the lock
+            if rebuild or not is_fresh(source, cache_dir):
+                build_cache(source, cache_dir)
+    return load_cache(cache_dir, columns, exclude)
+
+
+def read_raw(source=DEFAULT_SOURCE):
+    """The export as the scripts used to hold it: object strings, int64 integers."""
+    try:
+        with pd.option_context("future.infer_string", False):
+            return read_csv(source)
+    except (KeyError, pd.errors.OptionError):
+        # pandas without the option already reads strings as objects
+        return read_csv(source)
+
+
+def memory_footprint(df):
+    """Bytes held by each column, counting the strings behind object and label arrays."""
+    return df.memory_usage(deep=True, index=False)
+
+
+def memory_report(source=DEFAULT_SOURCE):
+    """Per-column footprint of the raw, compact and compact-without-text frames."""
+    raw = memory_footprint(read_raw(source))
+    df = load_superstore(source)
+    compact = memory_footprint(df)
+    report = pd.DataFrame({"raw": raw, "compact": compact, "dtype": df.dtypes})
+    report.loc["Total", ["raw", "compact"]] = [raw.sum(), compact.sum()]
+    report.loc["Total without text columns", ["raw", "compact"]] = [
+        raw.sum(), compact.drop(TEXT_COLUMNS).sum()
+    ]
+    report["ratio"] = report["raw"] / report["compact"]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the columnar cache and report its memory footprint")
+    parser.add_argument("source", nargs="?", default=DEFAULT_SOURCE)
+    args = parser.parse_args()
+
+    report = memory_report(args.source)
+    formatted = report.copy()
+    for column in ("raw", "compact"):
+        formatted[column] = (report[column] / 1024).map("{:,.1f} KiB".format)
+    formatted["ratio"] = report["ratio"].map("{:.1f}x".format)
+    formatted["dtype"] = formatted["dtype"].fillna("")
+    print(formatted.to_string())
+
+
+if __name__ == "__main__":
+    main()
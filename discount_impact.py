@@ -0,0 +1,390 @@
+"""Discount impact per Sub-Category and Region, with bootstrap confidence intervals.
+
+For every Sub-Category x Region group ("All" margins included) two views of
+how discounts eat into profit:
+
+- a profit-vs-discount line: margin (Profit / Sales) regressed on Discount,
+  weighted by Sales, so the fit reproduces the group's total profit. The slope
+  is the margin lost per discount point; the fitted break-even discount is
+  where the line crosses zero margin;
+- binned break-even: discounts are binned by tens of percent and the
+  break-even discount is the lowest bin whose aggregate margin is not
+  positive (bins with fewer than ``MIN_BIN_LINES`` line items are skipped).
+
+Confidence intervals come from a nonparametric bootstrap over blocks of the
+group's line items. Every statistic is a function of a few sums, so the lines
+are reduced once to per-block sums (:func:`partial_sums`): each line goes to
+one of ``N_BLOCKS`` blocks by a hash of its ``Row ID``, which keeps the cost of
+a replicate flat as the data grows (groups of up to a few thousand lines are
+resampled almost line by line). Block sums of disjoint rows add up, so
+``eda_superstore.py --stream`` accumulates them chunk by chunk and gets the
+same table as the in-memory path. Resampling is vectorized: a batch of
+replicates is one ``(replicates, blocks)`` index matrix, turned into
+per-replicate counts and multiplied with the block sums. Groups are spread
+over a process pool; each group draws from its own seed, so results do not
+depend on the number of workers. The table is saved next to the columnar
+cache (:func:`load_or_build`)::
+
+    python discount_impact.py [source] --replicates 1000 --workers 8
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DEFAULT_SOURCE, cache_dir_for, cache_lock, dataset_version, load_superstore
+from instrumentation import instrumented
+
+ALL = "All"
+TABLE_VERSION = 2
+DEFAULT_REPLICATES = 1000
+DEFAULT_SEED = 0
+CONFIDENCE = 0.95
+# Discount bins of ten points: 0-9%, 10-19%, ..., 80% and over
+BIN_WIDTH = 0.1
+N_BINS = 9
+MIN_BIN_LINES = 5
+# Lines are hashed by Row ID into this many blocks per group (see line_blocks)
+N_BLOCKS = 4096
+# Rows per pass when accumulating block sums of an in-memory frame
+CHUNK_ROWS = 1_000_000
+# Elements per bootstrap index matrix, bounding the memory of one batch
+BATCH_ELEMENTS = 4_000_000
+STATISTICS = ["Slope", "Break-even", "Binned Break-even"]
+GROUP_COLUMNS = ["Category", "Sub-Category", "Region"]
+SUM_COLUMNS = (
+    ["Sales", "Discount", "Sales x Discount", "Profit", "Sales x Discount^2", "Discount x Profit"]
+    + [f"{name} {i}" for name in ("Sales", "Profit", "Lines") for i in range(N_BINS)]
+)
+N_BASE = 6
+
+
+def discount_bins(discount):
+    """Bin of every discount (ten points wide, the last one open-ended)."""
+    return np.minimum(np.floor(np.asarray(discount) / BIN_WIDTH + 1e-9), N_BINS - 1).astype(np.int64)
+
+
+def line_blocks(row_ids, n_blocks=N_BLOCKS):
+    """Block of every line, from a fixed hash (SplitMix64) of its ``Row ID``.
+
+    A line lands in the same block whichever chunk it arrives in, so block
+    sums can be accumulated chunk by chunk.
+    """
+    x = np.asarray(row_ids).astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    return (x % np.uint64(n_blocks)).astype(np.int64)
+
+
+def _block_sums(sales, discount, profit, blocks, n_blocks):
+    """Per-block sums of every quantity the statistics need, ``(n_blocks, len(SUM_COLUMNS))``.
+
+    Columns: Sales, Discount, Sales x Discount, Profit, Sales x Discount^2,
+    Discount x Profit, then Sales, Profit and line counts per discount bin.
+    """
+    base = [
+        np.bincount(blocks, weights=weights, minlength=n_blocks)
+        for weights in (sales, discount, sales * discount, profit, sales * discount * discount, discount * profit)
+    ]
+    cell = blocks * N_BINS + discount_bins(discount)
+    binned = [
+        np.bincount(cell, weights=weights, minlength=n_blocks * N_BINS).reshape(n_blocks, N_BINS)
+        for weights in (sales, profit, None)
+    ]
+    return np.column_stack(base + binned)
+
+
+def _line_fit(sums):
+    """Sales-weighted least squares of margin on discount, per row of ``sums``.
+
+    Margin times weight is profit, so the fit only needs sums; returns
+    ``(slope, intercept)``.
+    """
+    w, _, sx, sy, sxx, sxy = sums[:, :N_BASE].T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        denominator = w * sxx - sx * sx
+        slope = np.where(np.abs(denominator) > 1e-12 * w * w, (w * sxy - sx * sy) / denominator, np.nan)
+        intercept = (sy - slope * sx) / w
+    return slope, intercept
+
+
+def _break_even(slope, intercept):
+    """Discount where the fitted margin reaches zero; NaN when it never does in [0, 1]."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        crossing = -intercept / slope
+    return np.where(intercept <= 0, 0.0, np.where((slope < 0) & (crossing <= 1), crossing, np.nan))
+
+
+def _binned_break_even(bin_sales, bin_profit, bin_lines):
+    """Lower edge of the first bin with a non-positive margin; NaN when there is none."""
+    losing = (bin_lines >= MIN_BIN_LINES) & (bin_profit <= 0) & (bin_sales > 0)
+    first = losing.argmax(axis=-1)
+    return np.where(losing.any(axis=-1), first * BIN_WIDTH, np.nan)
+
+
+def _statistics(sums):
+    """The three statistics of each row of ``sums``, ``(len(STATISTICS), rows)``."""
+    slope, intercept = _line_fit(sums)
+    bin_sales, bin_profit, bin_lines = (
+        sums[:, N_BASE + i * N_BINS:N_BASE + (i + 1) * N_BINS] for i in range(3)
+    )
+    return np.stack([slope, _break_even(slope, intercept), _binned_break_even(bin_sales, bin_profit, bin_lines)])
+
+
+def analyze_group(sums, replicates=DEFAULT_REPLICATES, seed=None, confidence=CONFIDENCE,
+                  batch_elements=BATCH_ELEMENTS):
+    """Point estimates and bootstrap intervals of one group from its block sums.
+
+    ``sums`` has one row per non-empty block (:func:`partial_sums`). Returns
+    ``{statistic: (estimate, low, high)}`` plus the share of replicates in
+    which margins turn negative at all (``"Break-even Share"``).
+    """
+    rng = np.random.default_rng(seed)
+    n_blocks = len(sums)
+    estimate = _statistics(sums.sum(axis=0, keepdims=True))[:, 0]
+
+    # Replicates in batches: an index matrix of drawn blocks, turned into
+    # per-replicate block counts, times the block sums
+    batch = max(1, batch_elements // max(n_blocks, 1))
+    draws = []
+    for start in range(0, replicates if n_blocks else 0, batch):
+        size = min(batch, replicates - start)
+        index = rng.integers(0, n_blocks, size=(size, n_blocks))
+        index += np.arange(size)[:, None] * n_blocks
+        counts = np.bincount(index.ravel(), minlength=size * n_blocks).reshape(size, n_blocks)
+        draws.append(_statistics(counts @ sums))
+    draws = np.concatenate(draws, axis=1) if draws else np.full((len(STATISTICS), 0), np.nan)
+
+    tail = (1 - confidence) / 2 * 100
+    result = {}
+    for name, value, samples in zip(STATISTICS, estimate, draws):
+        finite = samples[~np.isnan(samples)]
+        low, high = np.percentile(finite, [tail, 100 - tail]) if len(finite) else (np.nan, np.nan)
+        result[name] = (float(value), float(low), float(high))
+    result["Break-even Share"] = float(np.mean(~np.isnan(draws[2]))) if draws.shape[1] else np.nan
+    return result
+
+
+def _analyze_task(task):
+    """Process pool entry point: ``(key, sums, replicates, seed)``."""
+    key, sums, replicates, seed = task
+    return key, analyze_group(sums, replicates, seed)
+
+
+def partial_sums(df, chunk_rows=CHUNK_ROWS):
+    """Block sums of every Sub-Category x Region group of ``df``.
+
+    A frame indexed by ``GROUP_COLUMNS`` and ``Block`` with one column per
+    sum; partial sums of disjoint rows combine with :func:`merge_sums`.
+    """
+    parts = []
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        keys = [chunk[column].astype(str).to_numpy() for column in GROUP_COLUMNS]
+        codes, labels = zip(*(pd.factorize(key) for key in keys))
+        group = np.ravel_multi_index(codes, [len(label) for label in labels])
+        cells, blocks = np.unique(
+            group * N_BLOCKS + line_blocks(chunk["Row ID"].to_numpy()), return_inverse=True
+        )
+        sums = _block_sums(
+            chunk["Sales"].to_numpy(dtype=np.float64),
+            chunk["Discount"].to_numpy(dtype=np.float64),
+            chunk["Profit"].to_numpy(dtype=np.float64),
+            blocks.ravel(), len(cells),
+        )
+        positions = np.unravel_index(cells // N_BLOCKS, [len(label) for label in labels])
+        index = pd.MultiIndex.from_arrays(
+            [label[position] for label, position in zip(labels, positions)] + [cells % N_BLOCKS],
+            names=GROUP_COLUMNS + ["Block"],
+        )
+        parts.append(pd.DataFrame(sums, index=index, columns=SUM_COLUMNS))
+    return merge_sums(*parts)
+
+
+def merge_sums(*parts):
+    """Combine partial sums of disjoint rows."""
+    parts = [part for part in parts if part is not None]
+    if not parts:
+        return pd.DataFrame(
+            columns=SUM_COLUMNS,
+            index=pd.MultiIndex.from_arrays([[]] * (len(GROUP_COLUMNS) + 1), names=GROUP_COLUMNS + ["Block"]),
+            dtype=np.float64,
+        )
+    if len(parts) == 1:
+        return parts[0].sort_index()
+    return pd.concat(parts).groupby(level=list(range(len(GROUP_COLUMNS) + 1)), sort=True).sum()
+
+
+def groups_of(sums):
+    """``(Category, Sub-Category, Region)`` keys and block sums of every group, "All" included.
+
+    The margins add up the blocks of their Sub-Category x Region groups,
+    block by block.
+    """
+    def blocks(levels):
+        return sums.groupby(level=levels, sort=True).sum()
+
+    groups = [((ALL, ALL, ALL), blocks("Block").to_numpy())]
+    for region, rows in blocks(["Region", "Block"]).groupby(level="Region", sort=True):
+        groups.append(((ALL, ALL, region), rows.to_numpy()))
+    by_region = {
+        key: rows.to_numpy() for key, rows in sums.groupby(level=GROUP_COLUMNS, sort=True)
+    }
+    for (category, sub), rows in blocks(["Category", "Sub-Category", "Block"]).groupby(
+        level=["Category", "Sub-Category"], sort=True
+    ):
+        groups.append(((category, sub, ALL), rows.to_numpy()))
+        groups.extend((key, value) for key, value in by_region.items() if key[:2] == (category, sub))
+    return groups
+
+
+@instrumented("discount.analyze", rows=len)
+def analyze_sums(sums, replicates=DEFAULT_REPLICATES, seed=DEFAULT_SEED, workers=None):
+    """The discount impact table of every Sub-Category x Region group, from :func:`partial_sums`."""
+    groups = groups_of(sums)
+    seeds = np.random.SeedSequence(seed).spawn(len(groups))
+    tasks = [(key, group_sums, replicates, group_seed) for (key, group_sums), group_seed in zip(groups, seeds)]
+    workers = os.cpu_count() if workers is None else workers
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = dict(pool.map(_analyze_task, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    else:
+        results = dict(map(_analyze_task, tasks))
+
+    rows = []
+    for key, group_sums in groups:
+        totals = dict(zip(SUM_COLUMNS, group_sums.sum(axis=0)))
+        lines = int(round(sum(totals[f"Lines {i}"] for i in range(N_BINS))))
+        row = {
+            "Category": key[0], "Sub-Category": key[1], "Region": key[2],
+            "Lines": lines, "Sales": totals["Sales"], "Profit": totals["Profit"],
+            "Margin": totals["Profit"] / totals["Sales"] if totals["Sales"] else np.nan,
+            "Mean Discount": totals["Discount"] / lines if lines else np.nan,
+        }
+        for name in STATISTICS:
+            row[name], row[f"{name} Low"], row[f"{name} High"] = results[key][name]
+        row["Break-even Share"] = results[key]["Break-even Share"]
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def analyze(df, replicates=DEFAULT_REPLICATES, seed=DEFAULT_SEED, workers=None):
+    """The discount impact table of every Sub-Category x Region group of ``df``."""
+    return analyze_sums(partial_sums(df), replicates, seed, workers)
+
+
+def save(table, path, version=None, replicates=DEFAULT_REPLICATES, seed=DEFAULT_SEED):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    payload = {
+        "table_version": TABLE_VERSION,
+        "dataset_version": version,
+        "replicates": replicates,
+        "seed": seed,
+        "columns": list(table.columns),
+        "rows": table.astype(object).where(table.notna(), None).to_numpy().tolist(),
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+def load(path, version=None, replicates=DEFAULT_REPLICATES, seed=DEFAULT_SEED):
+    """The table saved at ``path``; None when missing, stale or computed otherwise."""
+    try:
+        with open(path) as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (payload.get("table_version"), payload["dataset_version"], payload["replicates"], payload["seed"]) != (
+        TABLE_VERSION, version, replicates, seed
+    ):
+        return None
+    return pd.DataFrame(payload["rows"], columns=payload["columns"]).fillna(np.nan)
+
+
+def table_path_for(source=DEFAULT_SOURCE):
+    return os.path.join(cache_dir_for(source), "discount_impact.json")
+
+
+def load_or_build(df, path, version=None, replicates=DEFAULT_REPLICATES, seed=DEFAULT_SEED, workers=None):
+    """Load the table saved at ``path``, computing it first when stale."""
+    table = load(path, version, replicates, seed)
+    if table is None:
+        with cache_lock(os.path.dirname(path) or "."):
+            table = load(path, version, replicates, seed)
+            if table is None:
+                table = analyze(df, replicates, seed, workers)
+                save(table, path, version, replicates, seed)
+    return table
+
+
+def sub_category_view(table, region=ALL, category=ALL):
+    """Rows of one Region (or "All") per Sub-Category, within a Category filter."""
+    rows = table[(table["Region"] == (region or ALL)) & (table["Sub-Category"] != ALL)]
+    if category not in (None, ALL):
+        rows = rows[rows["Category"] == category]
+    return rows.sort_values("Slope").reset_index(drop=True)
+
+
+def _percent(value):
+    return "none" if np.isnan(value) else f"{value * 100:.0f}%"
+
+
+def insights(table, top=3):
+    """Report lines for the "Discount Analysis" section."""
+    overall = table[(table["Sub-Category"] == ALL) & (table["Region"] == ALL)].iloc[0]
+    lines = [
+        f"Each 10-point discount increase lowers profit margin by {-overall['Slope'] * 10:.1f} points "
+        f"(95% CI {-overall['Slope High'] * 10:.1f} to {-overall['Slope Low'] * 10:.1f})",
+        f"Margins turn negative from the {_percent(overall['Binned Break-even'])} discount bin; "
+        f"fitted break-even discount {_percent(overall['Break-even'])} "
+        f"(95% CI {_percent(overall['Break-even Low'])} to {_percent(overall['Break-even High'])})",
+    ]
+    subs = sub_category_view(table)
+    sensitive = subs.head(top)
+    lines.append("Most discount-sensitive sub-categories: " + ", ".join(
+        f"{row['Sub-Category']} ({-row['Slope'] * 10:.1f} pts per 10% discount)" for _, row in sensitive.iterrows()
+    ))
+    early = subs[subs["Binned Break-even"] <= 0.2].sort_values(["Binned Break-even", "Slope"])
+    if len(early):
+        lines.append("Sub-categories losing money at discounts of 20% or less: " + ", ".join(
+            f"{row['Sub-Category']} (from {_percent(row['Binned Break-even'])})" for _, row in early.iterrows()
+        ))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Discount impact per Sub-Category and Region")
+    parser.add_argument("source", nargs="?", default=DEFAULT_SOURCE)
+    parser.add_argument("--replicates", type=int, default=DEFAULT_REPLICATES)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--region", default=ALL)
+    args = parser.parse_args()
+
+    df = load_superstore(args.source, columns=["Row ID", *GROUP_COLUMNS, "Sales", "Discount", "Profit"])
+    start = time.perf_counter()
+    table = analyze(df, args.replicates, args.seed, args.workers)
+    print(f"{len(table)} groups x {args.replicates} replicates in {time.perf_counter() - start:.2f}s "
+          f"on {args.workers} workers")
+    save(table, table_path_for(args.source), dataset_version(args.source), args.replicates, args.seed)
+
+    view = sub_category_view(table, args.region)
+    columns = ["Sub-Category", "Lines", "Margin", "Slope", "Slope Low", "Slope High",
+               "Break-even", "Binned Break-even"]
+    print(view[columns].round(3).to_string(index=False))
+    print()
+    for line in insights(table):
+        print(f"- {line}")
+
+
+if __name__ == "__main__":
+    main()
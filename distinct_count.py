@@ -0,0 +1,132 @@
+"""Distinct counting over dictionary-encoded columns.
+
+``Order ID`` comes out of the columnar cache as integer codes (see
+``data_loader.py``), so counting distinct orders never has to hash strings:
+
+- :class:`BitsetCounter` gives exact counts by marking codes in a bitmap sized
+  to the dictionary, which is cheap at our order-ID cardinalities;
+- :func:`grouped_distinct` gives exact per-group counts in one ``np.unique``;
+- :class:`HyperLogLog` registers give approximate counts that stay mergeable,
+  which is what the sales cube keeps per cell so distinct orders survive a
+  rollup (a plain count per cell would double-count orders spanning cells).
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_PRECISION = 10
+
+
+def codes_of(values):
+    """Integer codes and cardinality of a categorical or plain column.
+
+    Missing values get code -1, which the counters below skip.
+    """
+    if isinstance(values, pd.Series) and isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), len(values.cat.categories)
+    codes, uniques = pd.factorize(values)
+    return codes, len(uniques)
+
+
+def hash_values(values):
+    """Stable 64-bit hashes of arbitrary values (the same across chunks and shards)."""
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+
+class BitsetCounter:
+    """Exact distinct count of codes drawn from ``range(cardinality)``.
+
+    The bitmap is allocated once and only the marked codes are cleared after
+    each count, so a call costs O(len(codes)) writes rather than a fresh
+    O(cardinality) array. Counts are serialized on a lock, as dashboard
+    callbacks share one counter across threads.
+    """
+
+    def __init__(self, cardinality):
+        self.cardinality = cardinality
+        self._seen = np.zeros(cardinality, dtype=bool)
+        self._lock = threading.Lock()
+
+    def count(self, codes):
+        codes = np.asarray(codes)
+        codes = codes[codes >= 0]
+        with self._lock:
+            self._seen[codes] = True
+            n = int(np.count_nonzero(self._seen))
+            self._seen[codes] = False
+        return n
+
+
+def grouped_distinct(group_codes, codes, n_groups, cardinality):
+    """Exact number of distinct ``codes`` within each of ``n_groups`` groups."""
+    valid = (group_codes >= 0) & (codes >= 0)
+    if not valid.all():
+        group_codes, codes = group_codes[valid], codes[valid]
+    pairs = np.unique(group_codes.astype(np.int64) * cardinality + codes)
+    return np.bincount(pairs // cardinality, minlength=n_groups)
+
+
+def distinct_by(df, group_column, value_column):
+    """Exact distinct ``value_column`` count per ``group_column`` label, as a Series."""
+    group_codes, labels = pd.factorize(df[group_column], sort=True)
+    codes, cardinality = codes_of(df[value_column])
+    counts = grouped_distinct(group_codes, codes, len(labels), cardinality)
+    return pd.Series(counts, index=pd.Index(np.asarray(labels, dtype=object), name=group_column))
+
+
+def _bit_length(values):
+    """Vectorized ``int.bit_length`` for uint64 arrays."""
+    lengths = np.zeros(values.shape, dtype=np.int64)
+    nonzero = values > 0
+    # Values near 2**64 round up to it in float64; 64 bits is the most there is
+    lengths[nonzero] = np.minimum(np.floor(np.log2(values[nonzero].astype(np.float64))).astype(np.int64) + 1, 64)
+    # float64 rounding can push values just under a power of two up by one bit
+    over = nonzero & ((np.uint64(1) << (lengths - 1).clip(0).astype(np.uint64)) > values)
+    lengths[over] -= 1
+    return lengths
+
+
+class HyperLogLog:
+    """HyperLogLog registers for many sketches at once (one row per sketch)."""
+
+    def __init__(self, registers, precision=DEFAULT_PRECISION):
+        self.registers = registers
+        self.precision = precision
+
+    @classmethod
+    def empty(cls, n_sketches, precision=DEFAULT_PRECISION):
+        return cls(np.zeros((n_sketches, 1 << precision), dtype=np.uint8), precision)
+
+    def add(self, sketch_ids, hashes):
+        """Add 64-bit ``hashes``, the i-th one to sketch ``sketch_ids[i]``."""
+        p = self.precision
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - p)) - 1)
+        rank = (64 - p) - _bit_length(rest) + 1
+        flat = self.registers.reshape(-1)
+        np.maximum.at(flat, np.asarray(sketch_ids, dtype=np.int64) * (1 << p) + index, rank.astype(np.uint8))
+        return self
+
+    def reduce(self, group_ids, n_groups):
+        """Merge sketches sharing a group id into ``n_groups`` sketches."""
+        order = np.argsort(group_ids, kind="stable")
+        sorted_ids = np.asarray(group_ids)[order]
+        merged = np.zeros((n_groups, self.registers.shape[1]), dtype=np.uint8)
+        if len(order):
+            starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+            merged[sorted_ids[starts]] = np.maximum.reduceat(self.registers[order], starts, axis=0)
+        return HyperLogLog(merged, self.precision)
+
+    def estimate(self):
+        """Approximate distinct count of every sketch."""
+        m = self.registers.shape[1]
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.exp2(-self.registers.astype(np.float64)).sum(axis=1)
+        zeros = (self.registers == 0).sum(axis=1)
+        # Linear counting is more accurate while many registers are still empty
+        small = (raw <= 2.5 * m) & (zeros > 0)
+        with np.errstate(divide="ignore"):
+            linear = m * np.log(m / np.maximum(zeros, 1))
+        return np.where(small, linear, raw)
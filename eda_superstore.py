@@ -1,19 +1,25 @@
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+"""Exploratory analysis report: results/*.txt insights and the chart PNGs.
+
+Run it as ``python eda_superstore.py [source]`` or ``superstore report``.
+Importing the module has no side effects; matplotlib (for the charts) and Dash
+(for the saved dashboard layout) are only imported once the report needs them.
+"""
+import argparse
 import os
-import plotly.express as px
-import plotly.graph_objects as go
-from dash import Dash, dcc, html
-from dash.dependencies import Input, Output
 
-# Create results directory if it doesn't exist
-if not os.path.exists("results"):
-    os.makedirs("results")
+import numpy as np
+import pandas as pd
+
+from data_loader import DEFAULT_SOURCE, dataset_version, load_superstore
+import discount_impact
+from distinct_count import distinct_by
+from instrumentation import configure, format_summary, instrumented, span, summarize
+from olap_cube import load_or_build
+from streaming_aggregates import DEFAULT_CHUNKSIZE, StreamingAggregator
 
 
 # Function to save insights to text file
+@instrumented("write.analysis_summary")
 def save_insights(insights_dict, filepath):
     with open(filepath, "w") as f:
         f.write("SUPERSTORE SALES ANALYSIS INSIGHTS\n")
@@ -26,412 +32,399 @@ def save_insights(insights_dict, filepath):
             f.write("\n")
 
 
-# Set the style for better visualizations
-plt.style.use("default")
-sns.set_theme()
-
-# Read the dataset
-print("Loading dataset...")
-df = pd.read_csv("Superstore.csv", encoding="latin1")
-
-# Optimize data types for better performance
-print("Optimizing data types...")
-# Convert date columns to datetime
-date_columns = ["Order Date", "Ship Date"]
-for col in date_columns:
-    if col in df.columns:
-        df[col] = pd.to_datetime(df[col])
-
-# Convert numeric columns to appropriate types
-numeric_columns = ["Sales", "Quantity", "Discount", "Profit"]
-for col in numeric_columns:
-    if col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
-
-# Create correlation heatmap
-print("Creating correlation heatmap...")
-numeric_df = df.select_dtypes(include=[np.number])
-correlation_matrix = numeric_df.corr()
-
-plt.figure(figsize=(10, 8))
-sns.heatmap(
-    correlation_matrix,
-    annot=True,  # Show correlation values
-    cmap="coolwarm",  # Color scheme
-    center=0,  # Center the colormap at 0
-    fmt=".2f",  # Format correlation values to 2 decimal places
-    square=True,
-)  # Make the plot square-shaped
-plt.title("Correlation Heatmap of Numeric Variables")
-plt.tight_layout()
-plt.savefig("results/correlation_heatmap.png", dpi=300, bbox_inches="tight")
-plt.close()
-
-# Optimize groupby operations using categorical data types
-print("Optimizing categorical columns...")
-categorical_columns = ["Region", "Category", "Sub-Category", "Segment"]
-for col in categorical_columns:
-    if col in df.columns:
-        df[col] = df[col].astype("category")
-
-# Initialize insights dictionary
-insights = {
-    "Data Quality": [],
-    "Regional Performance": [],
-    "Category Analysis": [],
-    "Customer Segments": [],
-    "Discount Analysis": [],
-    "Overall Business Metrics": [],
-}
-
-# Data Quality Checks
-print("\n=== Data Quality Checks ===")
-
-# Check for null values
-null_counts = df.isnull().sum()
-if null_counts.any():
-    insights["Data Quality"].append(f"Found {null_counts.sum()} null values")
-else:
-    insights["Data Quality"].append("No null values found in the dataset")
-
-# Check for duplicates
-duplicate_rows = df.duplicated().sum()
-insights["Data Quality"].append(f"Found {duplicate_rows} duplicate rows")
-
-# Check data types
-print("\nCurrent data types:")
-print(df.dtypes)
-
-# Check for any remaining issues
-print("\nData types after conversion:")
-print(df.dtypes)
-
-# Regional Analysis with optimized groupby
-print("\nPerforming regional analysis...")
-regional_metrics = (
-    df.groupby("Region")
-    .agg({"Sales": "sum", "Profit": "sum", "Order ID": "count"})
-    .rename(columns={"Order ID": "Number of Orders"})
-)
-
-regional_metrics["Profit Margin"] = (
-    regional_metrics["Profit"] / regional_metrics["Sales"] * 100
-).round(2)
-regional_metrics = regional_metrics.sort_values("Sales", ascending=False)
-
-# Add regional insights
-insights["Regional Performance"].extend(
-    [
+@instrumented("aggregate.regional_metrics", rows=len)
+def regional_metrics_from(cube):
+    regional_metrics = (
+        cube.rollup(["Region"])
+        .set_index("Region")[["Sales", "Profit", "Count"]]
+        .rename(columns={"Count": "Number of Orders"})
+    )
+    regional_metrics["Profit Margin"] = (
+        regional_metrics["Profit"] / regional_metrics["Sales"] * 100
+    ).round(2)
+    return regional_metrics.sort_values("Sales", ascending=False)
+
+
+@instrumented("aggregate.category_metrics", rows=len)
+def category_metrics_from(cube):
+    category_metrics = (
+        cube.rollup(["Category", "Sub-Category"])
+        .set_index(["Category", "Sub-Category"])[["Sales", "Profit", "Count"]]
+        .rename(columns={"Count": "Number of Orders"})
+    )
+    category_metrics["Profit Margin"] = (
+        category_metrics["Profit"] / category_metrics["Sales"] * 100
+    ).round(2)
+    return category_metrics
+
+
+@instrumented("aggregate.segment_metrics", rows=len)
+def segment_metrics_from(cube, unique_orders):
+    segment_metrics = (
+        cube.rollup(["Segment"])
+        .set_index("Segment")[["Sales", "Profit", "Count"]]
+        .rename(columns={"Count": "Number of Orders"})
+    )
+    # "Number of Orders" counts line items; "Unique Orders" counts distinct Order IDs
+    segment_metrics["Unique Orders"] = unique_orders.reindex(segment_metrics.index)
+    return segment_metrics
+
+
+def data_quality_insights(null_total, duplicate_rows):
+    return [
+        f"Found {null_total} null values" if null_total else "No null values found in the dataset",
+        f"Found {duplicate_rows} duplicate rows",
+    ]
+
+
+def regional_insights(regional_metrics):
+    return [
         f"West region leads with ${regional_metrics.loc['West', 'Sales']:,.2f} in sales and ${regional_metrics.loc['West', 'Profit']:,.2f} in profit",
         f"Central region has lowest profit margin at {regional_metrics.loc['Central', 'Profit Margin']:.2f}%",
         f"Profit margins range from {regional_metrics['Profit Margin'].min():.2f}% to {regional_metrics['Profit Margin'].max():.2f}%",
     ]
-)
-
-# Create regional analysis plots
-plt.figure(figsize=(15, 10))
-
-# Sales by Region
-plt.subplot(2, 2, 1)
-sales_by_region = regional_metrics["Sales"].sort_values(ascending=False)
-ax1 = sales_by_region.plot(kind="bar", color="skyblue")
-plt.title("Total Sales by Region", pad=20)
-plt.xlabel("Region")
-plt.ylabel("Sales ($)")
-plt.xticks(rotation=45)
-for i, v in enumerate(sales_by_region):
-    ax1.text(i, v, f"${v:,.0f}", ha="center", va="bottom")
-
-# Profit by Region
-plt.subplot(2, 2, 2)
-profit_by_region = regional_metrics["Profit"].sort_values(ascending=False)
-ax2 = profit_by_region.plot(kind="bar", color="lightgreen")
-plt.title("Total Profit by Region", pad=20)
-plt.xlabel("Region")
-plt.ylabel("Profit ($)")
-plt.xticks(rotation=45)
-for i, v in enumerate(profit_by_region):
-    ax2.text(i, v, f"${v:,.0f}", ha="center", va="bottom")
-
-plt.tight_layout()
-plt.savefig("results/regional_analysis.png", dpi=300, bbox_inches="tight")
-plt.close()
-
-# Monthly Sales Trend Analysis
-print("\n=== Monthly Sales Trend Analysis ===")
-
-# Create monthly sales trend
-monthly_sales = df.groupby(df["Order Date"].dt.to_period("M"))["Sales"].sum()
-monthly_sales.index = monthly_sales.index.astype(str)
-
-plt.figure(figsize=(15, 6))
-ax = monthly_sales.plot(kind="line", marker="o", linewidth=2, markersize=8)
-plt.title("Monthly Sales Trend", pad=20, size=14)
-plt.xlabel("Month", size=12)
-plt.ylabel("Sales ($)", size=12)
-plt.grid(True, linestyle="--", alpha=0.7)
-
-# Add value labels
-for i, v in enumerate(monthly_sales):
-    ax.text(i, v, f"${v:,.0f}", ha="center", va="bottom")
-
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.savefig("results/monthly_sales_trend.png", dpi=300, bbox_inches="tight")
-plt.close()
-
-# Category and Sub-Category Analysis
-print("\n=== Category and Sub-Category Analysis ===")
-
-# Calculate metrics by Category and Sub-Category
-category_metrics = (
-    df.groupby(["Category", "Sub-Category"])
-    .agg({"Sales": "sum", "Profit": "sum", "Order ID": "count"})
-    .rename(columns={"Order ID": "Number of Orders"})
-)
-
-# Calculate profit margin
-category_metrics["Profit Margin"] = (
-    category_metrics["Profit"] / category_metrics["Sales"] * 100
-).round(2)
-
-print("\nCategory and Sub-Category Performance Metrics:")
-print(category_metrics)
-
-# Add category insights
-negative_margin_categories = category_metrics[category_metrics["Profit Margin"] < 0]
-top_margin_categories = category_metrics.nlargest(3, "Profit Margin")
-
-insights["Category Analysis"].extend(
-    [
+
+
+def category_insights(category_metrics):
+    negative_margin_categories = category_metrics[category_metrics["Profit Margin"] < 0]
+    top_margin_categories = category_metrics.nlargest(3, "Profit Margin")
+    return [
         f"Found {len(negative_margin_categories)} categories with negative profit margins",
         f"Top performing category by margin: {top_margin_categories.index[0][1]} ({top_margin_categories['Profit Margin'].iloc[0]:.2f}%)",
         f"Technology category has highest average profit margin",
     ]
-)
-
-# Create visualizations for Category and Sub-Category
-plt.figure(figsize=(15, 10))
-
-# Sales by Category and Sub-Category
-plt.subplot(2, 2, 1)
-category_sales = df.groupby(["Category", "Sub-Category"])["Sales"].sum().unstack()
-category_sales.plot(kind="bar", stacked=True)
-plt.title("Sales by Category and Sub-Category", pad=20)
-plt.xlabel("Category")
-plt.ylabel("Sales ($)")
-plt.xticks(rotation=45)
-plt.legend(title="Sub-Category", bbox_to_anchor=(1.05, 1), loc="upper left")
-plt.tight_layout()
-
-# Profit by Category and Sub-Category
-plt.subplot(2, 2, 2)
-category_profit = df.groupby(["Category", "Sub-Category"])["Profit"].sum().unstack()
-category_profit.plot(kind="bar", stacked=True)
-plt.title("Profit by Category and Sub-Category", pad=20)
-plt.xlabel("Category")
-plt.ylabel("Profit ($)")
-plt.xticks(rotation=45)
-plt.legend(title="Sub-Category", bbox_to_anchor=(1.05, 1), loc="upper left")
-plt.tight_layout()
-
-plt.savefig("results/category_analysis.png", dpi=300, bbox_inches="tight")
-plt.close()
-
-# Discount vs Profit Analysis
-print("\n=== Discount vs Profit Analysis ===")
-
-# Create scatter plot
-plt.figure(figsize=(12, 6))
-plt.scatter(df["Discount"], df["Profit"], alpha=0.5, c=df["Sales"], cmap="viridis")
-plt.colorbar(label="Sales Amount")
-plt.title("Relationship between Discount and Profit", pad=20)
-plt.xlabel("Discount Rate")
-plt.ylabel("Profit ($)")
-plt.grid(True, linestyle="--", alpha=0.7)
-
-# Add trend line
-z = np.polyfit(df["Discount"], df["Profit"], 1)
-p = np.poly1d(z)
-plt.plot(df["Discount"], p(df["Discount"]), "r--", alpha=0.8)
-
-plt.tight_layout()
-plt.savefig("results/discount_profit_analysis.png", dpi=300, bbox_inches="tight")
-plt.close()
-
-# Calculate correlation
-correlation = df["Discount"].corr(df["Profit"])
-print(f"\nCorrelation between Discount and Profit: {correlation:.3f}")
-
-# Display basic information about the dataset
-print("\nDataset Info:")
-print(df.info())
-
-print("\nFirst few rows of the dataset:")
-print(df.head())
-
-print("\nBasic statistics:")
-print(df.describe())
-
-# Check for missing values
-print("\nMissing values in each column:")
-print(df.isnull().sum())
-
-# Display unique values in categorical columns
-print("\nUnique values in categorical columns:")
-categorical_columns = df.select_dtypes(include=["object"]).columns
-for col in categorical_columns:
-    print(f"\n{col}:")
-    print(df[col].value_counts().head())
-
-# Calculate and display key metrics
-print("\nKey Metrics:")
-print(f"Total Sales: ${df['Sales'].sum():,.2f}")
-print(f"Total Profit: ${df['Profit'].sum():,.2f}")
-print(f"Average Order Value: ${df['Sales'].mean():,.2f}")
-print(f"Profit Margin: {(df['Profit'].sum() / df['Sales'].sum() * 100):,.2f}%")
-
-# Customer segment analysis
-plt.figure(figsize=(10, 6))
-segment_metrics = (
-    df.groupby("Segment")
-    .agg({"Sales": "sum", "Profit": "sum", "Order ID": "count"})
-    .rename(columns={"Order ID": "Number of Orders"})
-)
-print("\nCustomer Segment Analysis:")
-print(segment_metrics)
-
-# Add customer segment insights
-insights["Customer Segments"].extend(
-    [
+
+
+def segment_insights(segment_metrics):
+    return [
         f"Consumer segment leads with ${segment_metrics.loc['Consumer', 'Sales']:,.2f} in sales",
         f"Corporate segment second with ${segment_metrics.loc['Corporate', 'Sales']:,.2f} in sales",
         f"Home Office has highest profit per order at ${segment_metrics.loc['Home Office', 'Profit'] / segment_metrics.loc['Home Office', 'Number of Orders']:,.2f}",
     ]
-)
-
-# Create interactive dashboard using Plotly Dash
-print("\nCreating interactive dashboard...")
-app = Dash(__name__)
-
-# Define the layout
-app.layout = html.Div(
-    [
-        html.H1("Superstore Sales Dashboard"),
-        # Region selector
-        html.Div(
-            [
-                html.H3("Select Region"),
-                dcc.Dropdown(
-                    id="region-selector",
-                    options=[
-                        {"label": region, "value": region}
-                        for region in df["Region"].unique()
-                    ],
-                    value="West",
-                ),
-            ]
+
+
+@instrumented("write.data_summary")
+def save_data_summary(regional_metrics, category_metrics, segment_metrics, filepath):
+    with open(filepath, "w") as f:
+        f.write("DATA SUMMARY\n")
+        f.write("============\n\n")
+        f.write("Regional Metrics:\n")
+        f.write(regional_metrics.to_string())
+        f.write("\n\nCategory Metrics:\n")
+        f.write(category_metrics.to_string())
+        f.write("\n\nSegment Metrics:\n")
+        f.write(segment_metrics.to_string())
+
+
+def dashboard_layout(regions):
+    from dash import dcc, html
+
+    return html.Div(
+        [
+            html.H1("Superstore Sales Dashboard"),
+            # Region selector
+            html.Div(
+                [
+                    html.H3("Select Region"),
+                    dcc.Dropdown(
+                        id="region-selector",
+                        options=[
+                            {"label": region, "value": region}
+                            for region in regions
+                        ],
+                        value="West",
+                    ),
+                ]
+            ),
+            # Sales and Profit by Category
+            html.Div([dcc.Graph(id="category-performance")]),
+            # Monthly Sales Trend
+            html.Div([dcc.Graph(id="monthly-trend")]),
+            # Discount vs Profit
+            html.Div([dcc.Graph(id="discount-profit")]),
+        ]
+    )
+
+
+@instrumented("write.dashboard_layout")
+def save_dashboard_layout(layout, filepath):
+    with open(filepath, "w") as f:
+        f.write(str(layout))
+
+
+def discount_impact_insights(table):
+    """Print the discount impact per Sub-Category and return its insight lines."""
+    print("\nDiscount impact by Sub-Category (margin change per discount point):")
+    print(discount_impact.sub_category_view(table)[
+        ["Sub-Category", "Slope", "Slope Low", "Slope High", "Break-even", "Binned Break-even"]
+    ].round(3).to_string(index=False))
+    return discount_impact.insights(table)
+
+
+def run_streaming(source, chunksize):
+    """Produce the report from partial aggregates merged chunk by chunk.
+
+    Memory is bounded by the chunk size and the number of groups, plus
+    8 bytes per row and per distinct order for the exact duplicate and order
+    counts (see ``streaming_aggregates``); the scatter plot is drawn from a
+    uniform sample while its trend line and the correlations come from the
+    exact merged moments.
+    """
+    print(f"Streaming {source} in chunks of {chunksize:,} rows...")
+    aggregator = StreamingAggregator.from_csv(source, chunksize=chunksize)
+    cube = aggregator.cube
+    moments = aggregator.moments
+    print(f"Aggregated {aggregator.rows:,} rows")
+
+    charts = {"correlation_heatmap": (moments.correlation(),)}
+
+    regional_metrics = regional_metrics_from(cube)
+    category_metrics = category_metrics_from(cube)
+    segment_metrics = segment_metrics_from(cube, aggregator.unique_orders_by_segment)
+    insights = {
+        "Data Quality": data_quality_insights(
+            int(aggregator.null_counts.sum()), aggregator.duplicate_rows
         ),
-        # Sales and Profit by Category
-        html.Div([dcc.Graph(id="category-performance")]),
-        # Monthly Sales Trend
-        html.Div([dcc.Graph(id="monthly-trend")]),
-        # Discount vs Profit
-        html.Div([dcc.Graph(id="discount-profit")]),
-    ]
-)
-
-
-# Callback for category performance
-@app.callback(
-    Output("category-performance", "figure"), Input("region-selector", "value")
-)
-def update_category_performance(selected_region):
-    filtered_df = df[df["Region"] == selected_region]
-    category_data = (
-        filtered_df.groupby("Category")
-        .agg({"Sales": "sum", "Profit": "sum"})
-        .reset_index()
+        "Regional Performance": regional_insights(regional_metrics),
+        "Category Analysis": category_insights(category_metrics),
+        "Customer Segments": segment_insights(segment_metrics),
+        "Discount Analysis": discount_impact_insights(
+            discount_impact.analyze_sums(aggregator.discount_sums)
+        ),
+        "Overall Business Metrics": [],
+    }
+
+    charts["regional_analysis"] = (regional_metrics,)
+    charts["monthly_sales_trend"] = (cube.rollup(["Month"]).set_index("Month")["Sales"],)
+    charts["category_analysis"] = (category_metrics,)
+    sample = aggregator.sample
+    charts["discount_profit_analysis"] = (
+        sample["Discount"],
+        sample["Profit"],
+        sample["Sales"],
+        moments.linear_fit("Discount", "Profit"),
     )
+    print("Rendering charts...")
+    from report_charts import render_charts
+
+    render_charts(charts)
+    correlation = moments.correlation().loc["Discount", "Profit"]
+    print(f"\nCorrelation between Discount and Profit: {correlation:.3f}")
 
-    fig = go.Figure()
-    fig.add_trace(
-        go.Bar(x=category_data["Category"], y=category_data["Sales"], name="Sales")
+    save_dashboard_layout(
+        dashboard_layout(aggregator.region_order), "results/dashboard_layout.txt"
     )
-    fig.add_trace(
-        go.Bar(x=category_data["Category"], y=category_data["Profit"], name="Profit")
+    save_insights(insights, "results/analysis_summary.txt")
+    save_data_summary(
+        regional_metrics, category_metrics, segment_metrics, "results/data_summary.txt"
     )
-
-    fig.update_layout(
-        title=f"Category Performance in {selected_region}", barmode="group"
+    print("\nResults saved to the results directory")
+
+
+def run_report(source=DEFAULT_SOURCE):
+    """Produce the report from the whole dataset loaded into memory."""
+    # Read the dataset
+    print("Loading dataset...")
+    df = load_superstore(source)
+
+    # Optimize data types for better performance
+    # (dates and dimension columns already come typed from the columnar cache)
+    print("Optimizing data types...")
+    # Convert numeric columns to appropriate types
+    numeric_columns = ["Sales", "Quantity", "Discount", "Profit"]
+    with span("convert_dtypes") as s:
+        s.rows = len(df)
+        for col in numeric_columns:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    # Create correlation heatmap
+    print("Creating correlation heatmap...")
+    with span("aggregate.correlation") as s:
+        numeric_df = df.select_dtypes(include=[np.number])
+        correlation_matrix = numeric_df.corr()
+        s.rows = len(numeric_df)
+    # Charts are collected here and rendered together at the end
+    charts = {"correlation_heatmap": (correlation_matrix,)}
+
+    # Optimize groupby operations using categorical data types
+    print("Optimizing categorical columns...")
+    categorical_columns = ["Region", "Category", "Sub-Category", "Segment"]
+    with span("convert_categories"):
+        for col in categorical_columns:
+            if col in df.columns:
+                df[col] = df[col].astype("category")
+
+    # Build (or load) the pre-aggregated cube that answers the breakdowns below
+    print("Building aggregate cube...")
+    cube = load_or_build(df, source=source)
+
+    # Initialize insights dictionary
+    insights = {
+        "Data Quality": [],
+        "Regional Performance": [],
+        "Category Analysis": [],
+        "Customer Segments": [],
+        "Discount Analysis": [],
+        "Overall Business Metrics": [],
+    }
+
+    # Data Quality Checks
+    print("\n=== Data Quality Checks ===")
+
+    # Check for null values
+    null_counts = df.isnull().sum()
+
+    # Check for duplicates
+    duplicate_rows = df.duplicated().sum()
+    insights["Data Quality"].extend(data_quality_insights(null_counts.sum(), duplicate_rows))
+
+    # Check data types
+    print("\nCurrent data types:")
+    print(df.dtypes)
+
+    # Check for any remaining issues
+    print("\nData types after conversion:")
+    print(df.dtypes)
+
+    # Regional Analysis with optimized groupby
+    print("\nPerforming regional analysis...")
+    regional_metrics = regional_metrics_from(cube)
+
+    # Add regional insights
+    insights["Regional Performance"].extend(regional_insights(regional_metrics))
+
+    # Create regional analysis plots
+    charts["regional_analysis"] = (regional_metrics,)
+
+    # Monthly Sales Trend Analysis
+    print("\n=== Monthly Sales Trend Analysis ===")
+
+    # Create monthly sales trend
+    monthly_sales = cube.rollup(["Month"]).set_index("Month")["Sales"]
+
+    charts["monthly_sales_trend"] = (monthly_sales,)
+
+    # Category and Sub-Category Analysis
+    print("\n=== Category and Sub-Category Analysis ===")
+
+    # Calculate metrics by Category and Sub-Category
+    category_metrics = category_metrics_from(cube)
+
+    print("\nCategory and Sub-Category Performance Metrics:")
+    print(category_metrics)
+
+    # Add category insights
+    insights["Category Analysis"].extend(category_insights(category_metrics))
+
+    # Create visualizations for Category and Sub-Category
+    charts["category_analysis"] = (category_metrics,)
+
+    # Discount vs Profit Analysis
+    print("\n=== Discount vs Profit Analysis ===")
+
+    z = np.polyfit(df["Discount"], df["Profit"], 1)
+    charts["discount_profit_analysis"] = (df["Discount"], df["Profit"], df["Sales"], z)
+
+    # Calculate correlation
+    correlation = df["Discount"].corr(df["Profit"])
+    print(f"\nCorrelation between Discount and Profit: {correlation:.3f}")
+
+    # Discount impact per Sub-Category and Region, with bootstrap intervals
+    # (computed once per dataset on all cores, then read from the cache)
+    discount_table = discount_impact.load_or_build(
+        df, discount_impact.table_path_for(source), dataset_version(source)
     )
-    return fig
+    insights["Discount Analysis"].extend(discount_impact_insights(discount_table))
 
+    # Display basic information about the dataset
+    print("\nDataset Info:")
+    print(df.info())
 
-# Callback for monthly trend
-@app.callback(Output("monthly-trend", "figure"), Input("region-selector", "value"))
-def update_monthly_trend(selected_region):
-    filtered_df = df[df["Region"] == selected_region]
-    monthly_data = filtered_df.groupby(filtered_df["Order Date"].dt.to_period("M"))[
-        "Sales"
-    ].sum()
-    monthly_data.index = monthly_data.index.astype(str)
+    print("\nFirst few rows of the dataset:")
+    print(df.head())
 
-    fig = go.Figure()
-    fig.add_trace(
-        go.Scatter(x=monthly_data.index, y=monthly_data.values, mode="lines+markers")
-    )
+    print("\nBasic statistics:")
+    print(df.describe())
 
-    fig.update_layout(
-        title=f"Monthly Sales Trend in {selected_region}",
-        xaxis_title="Month",
-        yaxis_title="Sales",
-    )
-    return fig
-
-
-# Callback for discount-profit relationship
-@app.callback(Output("discount-profit", "figure"), Input("region-selector", "value"))
-def update_discount_profit(selected_region):
-    filtered_df = df[df["Region"] == selected_region]
-
-    fig = go.Figure()
-    fig.add_trace(
-        go.Scatter(
-            x=filtered_df["Discount"],
-            y=filtered_df["Profit"],
-            mode="markers",
-            marker=dict(
-                size=8, color=filtered_df["Sales"], colorscale="Viridis", showscale=True
-            ),
-        )
+    # Check for missing values
+    print("\nMissing values in each column:")
+    print(df.isnull().sum())
+
+    # Display unique values in categorical columns
+    print("\nUnique values in categorical columns:")
+    categorical_columns = df.select_dtypes(include=["object", "category"]).columns
+    for col in categorical_columns:
+        print(f"\n{col}:")
+        print(df[col].value_counts().head())
+
+    # Calculate and display key metrics
+    totals = cube.totals()
+    print("\nKey Metrics:")
+    print(f"Total Sales: ${totals['Sales']:,.2f}")
+    print(f"Total Profit: ${totals['Profit']:,.2f}")
+    print(f"Average Order Value: ${totals['Sales'] / totals['Count']:,.2f}")
+    print(f"Profit Margin: {(totals['Profit'] / totals['Sales'] * 100):,.2f}%")
+
+    # Customer segment analysis
+    segment_metrics = segment_metrics_from(cube, distinct_by(df, "Segment", "Order ID"))
+    print("\nCustomer Segment Analysis:")
+    print(segment_metrics)
+
+    # Add customer segment insights
+    insights["Customer Segments"].extend(segment_insights(segment_metrics))
+
+    # Save the layout of the interactive dashboard (served by dashboard.py)
+    save_dashboard_layout(dashboard_layout(df["Region"].unique()), "results/dashboard_layout.txt")
+
+    print("\nDashboard layout saved to results/dashboard_layout.txt")
+    print("To run the dashboard, use: superstore serve")
+
+    # Render the collected charts (unchanged inputs are skipped)
+    print("\nRendering charts...")
+    from report_charts import render_charts
+
+    rendered = render_charts(charts)
+    print(f"Rendered {len(rendered)} of {len(charts)} charts")
+
+    # Save all insights to a text file
+    save_insights(insights, "results/analysis_summary.txt")
+
+    # Save raw data summaries
+    save_data_summary(
+        regional_metrics, category_metrics, segment_metrics, "results/data_summary.txt"
     )
 
-    fig.update_layout(
-        title=f"Discount vs Profit in {selected_region}",
-        xaxis_title="Discount",
-        yaxis_title="Profit",
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Superstore exploratory data analysis")
+    parser.add_argument("source", nargs="?", default=DEFAULT_SOURCE)
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="aggregate the export chunk by chunk instead of loading it into memory",
+    )
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument(
+        "--trace",
+        metavar="PATH",
+        help="append a JSON-lines timing/memory trace of every stage to PATH",
     )
-    return fig
+    args = parser.parse_args(argv)
 
+    if args.trace:
+        configure(args.trace)
+    # Create results directory if it doesn't exist
+    os.makedirs("results", exist_ok=True)
 
-# Save the dashboard layout to a file
-with open("results/dashboard_layout.txt", "w") as f:
-    f.write(str(app.layout))
+    if args.stream:
+        run_streaming(args.source, args.chunksize)
+    else:
+        run_report(args.source)
 
-print("\nDashboard layout saved to results/dashboard_layout.txt")
-print("To run the dashboard, use: python -m dash run eda_superstore.py")
+    if args.trace:
+        print(f"\nTrace written to {args.trace}\n" + format_summary(summarize()))
 
-# Save all insights to a text file
-save_insights(insights, "results/analysis_summary.txt")
 
-# Save raw data summaries
-with open("results/data_summary.txt", "w") as f:
-    f.write("DATA SUMMARY\n")
-    f.write("============\n\n")
-    f.write("Regional Metrics:\n")
-    f.write(regional_metrics.to_string())
-    f.write("\n\nCategory Metrics:\n")
-    f.write(category_metrics.to_string())
-    f.write("\n\nSegment Metrics:\n")
-    f.write(segment_metrics.to_string())
+if __name__ == "__main__":
+    main()
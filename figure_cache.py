@@ -0,0 +1,103 @@
+"""Bounded LRU cache of serialized dashboard callback results.
+
+Users flip between the same few Region / Category / date combinations, so the
+dashboard keeps the JSON of recently built figures and KPI strings keyed by the
+normalized filter tuple and the dataset version. The cache is bounded both by
+entry count and by the total size of the stored JSON, counts hits, misses and
+evictions, and is safe to share between the threads of the Flask server.
+"""
+import functools
+import json
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+from plotly.utils import PlotlyJSONEncoder
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 1024
+
+
+def normalize_filter(name, value):
+    """Canonical form of one filter value, so equivalent inputs share a key."""
+    if name.endswith("_date"):
+        return pd.Timestamp(value).date().isoformat() if value else None
+    return value if value not in (None, "") else "All"
+
+
+class FigureCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_entries=DEFAULT_MAX_ENTRIES, version=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.version = version
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return json.loads(payload)
+
+    def put(self, key, value):
+        payload = json.dumps(value, cls=PlotlyJSONEncoder)
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = payload
+            self._bytes += size
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self, version=None):
+        """Drop every entry, e.g. after the underlying dataset was reloaded."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.version = version
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def cached(self, name, params):
+        """Decorate a callback whose positional arguments are the filters ``params``."""
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args):
+                key = (name, self.version) + tuple(
+                    normalize_filter(param, value) for param, value in zip(params, args)
+                )
+                result = self.get(key)
+                if result is not None:
+                    return result
+                result = func(*args)
+                self.put(key, result)
+                return result
+
+            return wrapper
+
+        return decorator
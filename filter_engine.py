@@ -0,0 +1,253 @@
+"""Shared row-selection engine for the Superstore dashboard.
+
+The dashboard callbacks used to copy the whole frame and chain boolean masks
+for every filter change. ``FilterEngine`` indexes the frame once instead:
+
+- one packed bitmap per Region / Category value, so a dimension filter is a
+  handful of byte-wise ANDs;
+- a sorted ``Order Date`` index, so a date range is two binary searches.
+
+A filter combination resolves to an array of row positions; measures and
+group keys are read straight from the underlying NumPy column arrays.
+
+The index can be saved next to the columnar cache and memory-mapped back
+(:func:`load_or_build`), so dashboard worker processes attach one shared copy
+of it instead of each rebuilding their own.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_loader import cache_lock, save_array
+from distinct_count import BitsetCounter, codes_of
+from instrumentation import instrumented
+
+ALL = "All"
+INDEX_VERSION = 1
+
+
+class FilterEngine:
+    def __init__(
+        self,
+        df,
+        dimensions=("Region", "Category"),
+        date_column="Order Date",
+        columns=("Sales", "Profit", "Discount"),
+        distinct=("Order ID",),
+    ):
+        self._attach(df, date_column, columns, distinct)
+        self.dimensions = tuple(dimensions)
+        self._labels = {}
+        self._bitmaps = {}
+
+        # Dictionary-encode the filter dimensions and build one bitmap per value
+        for dim in dimensions:
+            codes, labels = pd.factorize(df[dim], sort=True)
+            self._codes[dim] = codes.astype(np.int32)
+            self._labels[dim] = np.asarray(labels, dtype=object)
+            self._bitmaps[dim] = {
+                label: np.packbits(codes == i) for i, label in enumerate(labels)
+            }
+
+        # Sorted date index: positions of rows in Order Date order
+        dates = self._columns[date_column]
+        self._date_order = np.argsort(dates, kind="stable")
+        self._sorted_dates = dates[self._date_order]
+
+        # Calendar month key (months since the first order month) for the trend chart
+        months = dates.astype("datetime64[M]")
+        month_min = months.min() if len(months) else np.datetime64(0, "M")
+        self._codes["Month"] = (months - month_min).astype(np.int32)
+        n_months = int((months.max() - month_min).astype(int)) + 1 if len(months) else 0
+        self._labels["Month"] = np.datetime_as_string(
+            np.arange(month_min, month_min + n_months), unit="M"
+        ).astype(object)
+
+    def _attach(self, df, date_column, columns, distinct):
+        """Take the measure, date and distinct-count columns from ``df`` (no copies
+        when it was loaded from the columnar cache)."""
+        self.n_rows = len(df)
+        self.date_column = date_column
+        self._columns = {name: df[name].to_numpy() for name in columns}
+        self._columns[date_column] = df[date_column].to_numpy(dtype="datetime64[ns]")
+        self._codes = {}
+        self._counters = {}
+        # Integer codes for the columns counted with distinct_count
+        for name in distinct:
+            codes, cardinality = codes_of(df[name])
+            self._codes[name] = codes
+            self._counters[name] = BitsetCounter(cardinality)
+
+    def _derived_arrays(self):
+        arrays = {
+            "date_order": self._date_order,
+            "sorted_dates": self._sorted_dates,
+            "codes.Month": self._codes["Month"],
+            "labels.Month": self._labels["Month"].astype(str),
+        }
+        for dim in self.dimensions:
+            arrays[f"codes.{dim}"] = self._codes[dim]
+            arrays[f"labels.{dim}"] = self._labels[dim].astype(str)
+            arrays[f"bitmaps.{dim}"] = np.stack(list(self._bitmaps[dim].values()))
+        return arrays
+
+    def save(self, directory, version=None):
+        """Write the index arrays to ``directory``; ``version`` identifies the dataset."""
+        os.makedirs(directory, exist_ok=True)
+        files = {}
+        for i, (name, values) in enumerate(self._derived_arrays().items()):
+            files[name] = f"arr{i:02d}.npy"
+            save_array(os.path.join(directory, files[name]), values)
+        meta = {
+            "index_version": INDEX_VERSION,
+            "dataset_version": version,
+            "rows": self.n_rows,
+            "date_column": self.date_column,
+            "dimensions": list(self.dimensions),
+            "files": files,
+        }
+        tmp_path = os.path.join(directory, "meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, os.path.join(directory, "meta.json"))
+
+    @classmethod
+    def load(cls, directory, df, version=None, columns=("Sales", "Profit", "Discount"),
+             distinct=("Order ID",)):
+        """Memory-map an index saved by :meth:`save`; None when it is missing or stale."""
+        try:
+            with open(os.path.join(directory, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (
+            meta.get("index_version") != INDEX_VERSION
+            or meta["dataset_version"] != version
+            or meta["rows"] != len(df)
+        ):
+            return None
+
+        engine = cls.__new__(cls)
+        engine._attach(df, meta["date_column"], columns, distinct)
+        engine.dimensions = tuple(meta["dimensions"])
+        arrays = {
+            name: np.load(os.path.join(directory, file), mmap_mode="r")
+            for name, file in meta["files"].items()
+        }
+        engine._date_order = arrays["date_order"]
+        engine._sorted_dates = arrays["sorted_dates"]
+        engine._labels = {}
+        engine._bitmaps = {}
+        for dim in (*engine.dimensions, "Month"):
+            engine._codes[dim] = arrays[f"codes.{dim}"]
+            engine._labels[dim] = np.asarray(arrays[f"labels.{dim}"]).astype(object)
+        for dim in engine.dimensions:
+            engine._bitmaps[dim] = dict(zip(engine._labels[dim], arrays[f"bitmaps.{dim}"]))
+        return engine
+
+    def column(self, name, rows=None):
+        """Return column ``name`` as a NumPy array, optionally taken at ``rows``."""
+        values = self._columns[name]
+        return values if rows is None else values[rows]
+
+    def distinct_count(self, name, rows):
+        """Exact number of distinct ``name`` values among ``rows``."""
+        return self._counters[name].count(self._codes[name][rows])
+
+    def _dimension_bitmap(self, filters):
+        bitmap = None
+        for dim, value in filters.items():
+            if value is None or value == ALL:
+                continue
+            value_bitmap = self._bitmaps[dim].get(value)
+            if value_bitmap is None:
+                # Unknown value selects nothing
+                return np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+            bitmap = value_bitmap if bitmap is None else np.bitwise_and(bitmap, value_bitmap)
+        return bitmap
+
+    def _date_bounds(self, start_date, end_date):
+        lo, hi = 0, self.n_rows
+        if start_date:
+            lo = np.searchsorted(
+                self._sorted_dates, np.datetime64(pd.Timestamp(start_date), "ns"), side="left"
+            )
+        if end_date:
+            hi = np.searchsorted(
+                self._sorted_dates, np.datetime64(pd.Timestamp(end_date), "ns"), side="right"
+            )
+        return int(lo), int(max(hi, lo))
+
+    @instrumented("filter.select", rows=len)
+    def select(self, region=ALL, category=ALL, start_date=None, end_date=None):
+        """Resolve a filter combination to an ascending array of row positions."""
+        bitmap = self._dimension_bitmap({"Region": region, "Category": category})
+        lo, hi = self._date_bounds(start_date, end_date)
+
+        if lo == 0 and hi == self.n_rows:
+            if bitmap is None:
+                return np.arange(self.n_rows)
+            return np.flatnonzero(np.unpackbits(bitmap, count=self.n_rows))
+
+        rows = self._date_order[lo:hi]
+        if bitmap is not None:
+            # Test each candidate's bit directly in the packed bitmap
+            bits = (bitmap[rows >> 3] >> (7 - (rows & 7))) & 1
+            rows = rows[bits.astype(bool)]
+        return np.sort(rows)
+
+    @instrumented("filter.group_sums")
+    def group_sums(self, key, rows, measures):
+        """Sum ``measures`` over ``rows`` grouped by ``key``.
+
+        Returns ``(labels, {measure: sums})`` restricted to non-empty groups,
+        ordered like ``DataFrame.groupby(key)``.
+        """
+        labels = self._labels[key]
+        codes = self._codes[key][rows]
+        counts = np.bincount(codes, minlength=len(labels))
+        present = counts > 0
+        sums = {
+            measure: np.bincount(
+                codes, weights=self._columns[measure][rows], minlength=len(labels)
+            )[present]
+            for measure in measures
+        }
+        return labels[present], sums
+
+    @instrumented("filter.cross_sums")
+    def cross_sums(self, row_key, col_key, rows, measures):
+        """Sum ``measures`` over ``rows`` on the ``row_key`` x ``col_key`` grid.
+
+        Returns ``(row_labels, col_labels, {measure: matrix}, counts)`` covering
+        every label of both keys, empty cells included.
+        """
+        row_labels, col_labels = self._labels[row_key], self._labels[col_key]
+        shape = (len(row_labels), len(col_labels))
+        codes = self._codes[row_key][rows] * shape[1] + self._codes[col_key][rows]
+        size = shape[0] * shape[1]
+        counts = np.bincount(codes, minlength=size).reshape(shape)
+        sums = {
+            measure: np.bincount(
+                codes, weights=self._columns[measure][rows], minlength=size
+            ).reshape(shape)
+            for measure in measures
+        }
+        return row_labels, col_labels, sums, counts
+
+
+def load_or_build(df, directory, version=None):
+    """Attach the index saved in ``directory``, building and saving it first when stale.
+
+    Concurrent callers (e.g. server workers starting together) build it once.
+    """
+    engine = FilterEngine.load(directory, df, version)
+    if engine is None:
+        with cache_lock(directory):
+            engine = FilterEngine.load(directory, df, version)
+            if engine is None:
+                FilterEngine(df).save(directory, version)
+                engine = FilterEngine.load(directory, df, version)
+    return engine
@@ -0,0 +1,287 @@
+"""State and city rollups behind the dashboard's map.
+
+The map never reads the line items. Two rollups are built once, keyed by
+month:
+
+- per (month, Region, Category, State): Sales, Profit and line counts,
+  stored as prefix sums over the months, so the state totals of any month
+  range are the difference of two slices whatever the history length;
+- per (State, month, Region, Category, City) with at least one line: the same
+  totals, sorted by state and month, so drilling into a state reads one
+  contiguous slice and reduces it per city with ``np.bincount``.
+
+Date ranges are answered in whole months: every month the range touches
+counts in full. Cities are keyed by city and state (many city names repeat
+across states) and carry their number of distinct postal codes. The rollups
+are saved next to the columnar cache and memory-mapped back
+(:func:`load_or_build`)::
+
+    python geo_rollups.py [source] --state California --start-date 2017-01-01
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DEFAULT_SOURCE, cache_dir_for, cache_lock, dataset_version, load_superstore, save_array
+from instrumentation import instrumented
+
+ALL = "All"
+TABLE_VERSION = 1
+METRICS = ["Sales", "Profit", "Margin"]
+# Two-letter codes for plotly's built-in "USA-states" geometry
+STATE_CODES = {
+    "Alabama": "AL", "Alaska": "AK", "Arizona": "AZ", "Arkansas": "AR", "California": "CA",
+    "Colorado": "CO", "Connecticut": "CT", "Delaware": "DE", "District of Columbia": "DC",
+    "Florida": "FL", "Georgia": "GA", "Hawaii": "HI", "Idaho": "ID", "Illinois": "IL",
+    "Indiana": "IN", "Iowa": "IA", "Kansas": "KS", "Kentucky": "KY", "Louisiana": "LA",
+    "Maine": "ME", "Maryland": "MD", "Massachusetts": "MA", "Michigan": "MI", "Minnesota": "MN",
+    "Mississippi": "MS", "Missouri": "MO", "Montana": "MT", "Nebraska": "NE", "Nevada": "NV",
+    "New Hampshire": "NH", "New Jersey": "NJ", "New Mexico": "NM", "New York": "NY",
+    "North Carolina": "NC", "North Dakota": "ND", "Ohio": "OH", "Oklahoma": "OK", "Oregon": "OR",
+    "Pennsylvania": "PA", "Rhode Island": "RI", "South Carolina": "SC", "South Dakota": "SD",
+    "Tennessee": "TN", "Texas": "TX", "Utah": "UT", "Vermont": "VT", "Virginia": "VA",
+    "Washington": "WA", "West Virginia": "WV", "Wisconsin": "WI", "Wyoming": "WY",
+}
+# Sales / Profit / line totals, in this order, in every rollup
+TOTALS = ["sales", "profit", "lines"]
+
+
+def _margins(sales, profit):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(sales != 0, profit / sales * 100, np.nan)
+
+
+class GeoRollups:
+    def __init__(self, arrays, labels, first_month, version=None):
+        self.arrays = arrays
+        # "Region", "Category", "State", "City" (with "City State") labels
+        self.labels = labels
+        self.first_month = first_month
+        self.version = version
+        self.n_months = len(arrays["state_sales"]) - 1
+
+    @classmethod
+    @instrumented("geo.build")
+    def from_frame(cls, df, version=None):
+        labels, codes = {}, {}
+        for dim in ("Region", "Category", "State"):
+            dim_codes, uniques = pd.factorize(df[dim], sort=True)
+            codes[dim] = dim_codes.astype(np.int64)
+            labels[dim] = np.asarray(uniques, dtype=str)
+        city, cities = pd.MultiIndex.from_frame(df[["State", "City"]].astype(str)).factorize(sort=True)
+        city = city.astype(np.int64)
+        labels["City"] = np.asarray(cities.get_level_values(1), dtype=str)
+        labels["City State"] = np.asarray(cities.get_level_values(0), dtype=str)
+        n_regions, n_categories = len(labels["Region"]), len(labels["Category"])
+        n_states, n_cities = len(labels["State"]), len(labels["City"])
+
+        month = df["Order Date"].to_numpy(dtype="datetime64[M]").astype(np.int64)
+        first_month = int(month.min()) if len(month) else 0
+        month -= first_month
+        n_months = int(month.max()) + 1 if len(month) else 0
+        cell = codes["Region"] * n_categories + codes["Category"]
+        n_cells = n_regions * n_categories
+        values = {
+            "sales": df["Sales"].to_numpy(dtype=np.float64),
+            "profit": df["Profit"].to_numpy(dtype=np.float64),
+            "lines": None,
+        }
+
+        arrays = {}
+        # State totals per month, as prefix sums with a leading row of zeros
+        key = (month * n_cells + cell) * n_states + codes["State"]
+        shape = (n_months, n_regions, n_categories, n_states)
+        for name, weights in values.items():
+            totals = np.bincount(key, weights=weights, minlength=int(np.prod(shape))).reshape(shape)
+            arrays[f"state_{name}"] = np.concatenate([np.zeros((1,) + shape[1:]), totals.cumsum(axis=0)])
+
+        # City partials sorted by (state, month, cell, city); the state of a
+        # city is fixed, so the state leads the key through the city's state
+        city_state = np.searchsorted(labels["State"], labels["City State"])
+        key = ((city_state[city] * n_months + month) * n_cells + cell) * n_cities + city
+        unique_keys, inverse = np.unique(key, return_inverse=True)
+        part_city = unique_keys % n_cities
+        arrays["part_state_start"] = np.searchsorted(city_state[part_city], np.arange(n_states + 1))
+        arrays["part_month"] = (unique_keys // (n_cells * n_cities) % max(n_months, 1)).astype(np.int32)
+        arrays["part_cell"] = (unique_keys // n_cities % n_cells).astype(np.int16)
+        arrays["part_city"] = part_city.astype(np.int32)
+        for name, weights in values.items():
+            arrays[f"part_{name}"] = np.bincount(inverse, weights=weights, minlength=len(unique_keys))
+        # Distinct (city, postal code) pairs, counted per city; a missing
+        # postal code (-1) is not one
+        postal = df["Postal Code"].fillna(-1).to_numpy(dtype=np.int64)
+        known = postal >= 0
+        base = int(postal.max(initial=0)) + 1
+        pairs = np.unique(city[known] * base + postal[known])
+        arrays["city_postal_codes"] = np.bincount(pairs // base, minlength=n_cities)
+        return cls(arrays, labels, first_month, version)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        files = {}
+        for i, name in enumerate(self.arrays):
+            files[name] = f"arr{i:02d}.npy"
+            save_array(os.path.join(directory, files[name]), self.arrays[name])
+        meta = {
+            "table_version": TABLE_VERSION,
+            "dataset_version": self.version,
+            "first_month": self.first_month,
+            "files": files,
+            "labels": {dim: values.tolist() for dim, values in self.labels.items()},
+        }
+        tmp_path = os.path.join(directory, "meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, os.path.join(directory, "meta.json"))
+
+    @classmethod
+    def load(cls, directory, version=None):
+        """Memory-map rollups saved by :meth:`save`; None when they are missing or stale."""
+        try:
+            with open(os.path.join(directory, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("table_version") != TABLE_VERSION or meta["dataset_version"] != version:
+            return None
+        arrays = {
+            name: np.load(os.path.join(directory, file), mmap_mode="r")
+            for name, file in meta["files"].items()
+        }
+        labels = {dim: np.asarray(values, dtype=str) for dim, values in meta["labels"].items()}
+        return cls(arrays, labels, meta["first_month"], version)
+
+    def _code(self, dim, value):
+        """Code of a filter value: None for "All", -1 when the value is unknown."""
+        if value in (None, ALL):
+            return None
+        labels = self.labels[dim]
+        position = int(np.searchsorted(labels, value))
+        return position if position < len(labels) and labels[position] == value else -1
+
+    def month_range(self, start_date=None, end_date=None):
+        """``[lo, hi)`` month positions of every month the date range touches."""
+        def position(value):
+            return int(np.datetime64(pd.Timestamp(value), "M").astype(np.int64)) - self.first_month
+
+        lo = min(max(position(start_date), 0), self.n_months) if start_date else 0
+        hi = min(max(position(end_date) + 1, 0), self.n_months) if end_date else self.n_months
+        return lo, max(hi, lo)
+
+    def period(self, start_date=None, end_date=None):
+        """Label of the whole months a date range is answered with."""
+        lo, hi = self.month_range(start_date, end_date)
+        if lo == hi:
+            return "no months"
+        first, last = (
+            pd.Timestamp(np.datetime64(self.first_month + m, "M")).strftime("%b %Y") for m in (lo, hi - 1)
+        )
+        return first if first == last else f"{first} - {last}"
+
+    @instrumented("geo.states")
+    def states(self, region=ALL, category=ALL, start_date=None, end_date=None):
+        """Sales, Profit, Margin and line items of every state within the filters.
+
+        All states are listed, in label order, whatever the filters, so the
+        map's locations never change; states outside the filters have zeros.
+        """
+        lo, hi = self.month_range(start_date, end_date)
+        r, c = self._code("Region", region), self._code("Category", category)
+        totals = {}
+        for name in TOTALS:
+            cube = self.arrays[f"state_{name}"]
+            window = cube[hi] - cube[lo]
+            if r is not None:
+                window = window[r:r + 1] if r >= 0 else window[:0]
+            if c is not None:
+                window = window[:, c:c + 1] if c >= 0 else window[:, :0]
+            totals[name] = window.sum(axis=(0, 1))
+        return pd.DataFrame({
+            "State": self.labels["State"],
+            "Code": [STATE_CODES.get(state, "") for state in self.labels["State"]],
+            "Sales": totals["sales"],
+            "Profit": totals["profit"],
+            "Margin": _margins(totals["sales"], totals["profit"]),
+            "Line Items": totals["lines"].astype(np.int64),
+        })
+
+    @instrumented("geo.cities", rows=len)
+    def cities(self, state, region=ALL, category=ALL, start_date=None, end_date=None, metric="Sales", n=15):
+        """The ``n`` cities of ``state`` ranking highest by ``metric`` within the filters."""
+        s = self._code("State", state)
+        if s is None or s < 0:
+            return pd.DataFrame(columns=["City", "Sales", "Profit", "Margin", "Line Items", "Postal Codes"])
+        parts = slice(int(self.arrays["part_state_start"][s]), int(self.arrays["part_state_start"][s + 1]))
+        lo, hi = self.month_range(start_date, end_date)
+        month = self.arrays["part_month"][parts]
+        keep = (month >= lo) & (month < hi)
+        n_categories = len(self.labels["Category"])
+        r, c = self._code("Region", region), self._code("Category", category)
+        cell = self.arrays["part_cell"][parts].astype(np.int64)
+        if r is not None:
+            keep &= cell // n_categories == r
+        if c is not None:
+            keep &= cell % n_categories == c
+        city = self.arrays["part_city"][parts][keep]
+        totals = {
+            name: np.bincount(city, weights=self.arrays[f"part_{name}"][parts][keep], minlength=len(self.labels["City"]))
+            for name in TOTALS
+        }
+        present = np.flatnonzero(totals["lines"] > 0)
+        table = pd.DataFrame({
+            "City": self.labels["City"][present],
+            "Sales": totals["sales"][present],
+            "Profit": totals["profit"][present],
+            "Margin": _margins(totals["sales"][present], totals["profit"][present]),
+            "Line Items": totals["lines"][present].astype(np.int64),
+            "Postal Codes": self.arrays["city_postal_codes"][present],
+        })
+        return table.sort_values([metric, "City"], ascending=[False, True], na_position="last").head(n)
+
+
+def table_dir_for(source=DEFAULT_SOURCE):
+    return os.path.join(cache_dir_for(source), "geo_rollups")
+
+
+def load_or_build(df, directory, version=None):
+    """Memory-map the geo rollups saved in ``directory``, building them first when stale."""
+    rollups = GeoRollups.load(directory, version)
+    if rollups is None:
+        with cache_lock(directory):
+            rollups = GeoRollups.load(directory, version)
+            if rollups is None:
+                GeoRollups.from_frame(df, version).save(directory)
+                rollups = GeoRollups.load(directory, version)
+    return rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sales and Profit by state and city")
+    parser.add_argument("source", nargs="?", default=DEFAULT_SOURCE)
+    parser.add_argument("--state", help="list the cities of this state instead of the states")
+    parser.add_argument("--metric", choices=METRICS, default="Sales")
+    parser.add_argument("-n", type=int, default=15)
+    parser.add_argument("--region", default=ALL)
+    parser.add_argument("--category", default=ALL)
+    parser.add_argument("--start-date")
+    parser.add_argument("--end-date")
+    args = parser.parse_args()
+
+    df = load_superstore(args.source)
+    rollups = load_or_build(df, table_dir_for(args.source), dataset_version(args.source))
+    filters = (args.region, args.category, args.start_date, args.end_date)
+    if args.state:
+        table = rollups.cities(args.state, *filters, metric=args.metric, n=args.n)
+    else:
+        table = rollups.states(*filters)
+        table = table[table["Line Items"] > 0].sort_values(args.metric, ascending=False).head(args.n)
+    print(f"{args.state or 'States'} by {args.metric}, {rollups.period(args.start_date, args.end_date)}:")
+    table.index = np.arange(1, len(table) + 1)
+    print(table.round(2).to_string())
+
+
+if __name__ == "__main__":
+    main()
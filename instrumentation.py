@@ -0,0 +1,288 @@
+"""Timing and memory instrumentation for the load, filter, aggregate and render paths.
+
+Hot paths are wrapped in a :func:`span` (context manager) or decorated with
+:func:`instrumented`::
+
+    with span("load_csv", source=path) as s:
+        df = read_csv(path)
+        s.rows = len(df)
+
+Every finished span records wall time, CPU time of the calling thread, the
+process's peak RSS (and how much the span raised it), the row count when one
+is set, and the enclosing span. Tracing is off unless ``SUPERSTORE_TRACE``
+names a file (or :func:`configure` is called); records are then appended to it
+as JSON lines, one object per span, from every thread and worker process.
+While tracing is off a span costs a couple of attribute lookups.
+
+Setting ``SUPERSTORE_PROFILE`` to ``cprofile`` (or ``pyinstrument``, when that
+package is installed) additionally makes functions decorated with
+:func:`profiled` write one profile per call to ``SUPERSTORE_PROFILE_DIR``.
+"""
+import functools
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TRACE_ENV = "SUPERSTORE_TRACE"
+PROFILE_ENV = "SUPERSTORE_PROFILE"
+PROFILE_DIR_ENV = "SUPERSTORE_PROFILE_DIR"
+DEFAULT_PROFILE_DIR = os.path.join("cache", "profiles")
+PROFILERS = ("cprofile", "pyinstrument")
+RECENT_RECORDS = 10_000
+
+_profile_ids = itertools.count(1)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MiB (None if unknown)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / (1 << 10)
+
+
+def rss_mb():
+    """Current resident set size in MiB, where /proc is available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class Span:
+    __slots__ = ("name", "id", "parent", "attrs", "rows")
+
+    def __init__(self, name, span_id, parent, attrs):
+        self.name = name
+        self.id = span_id
+        self.parent = parent
+        self.attrs = attrs
+        self.rows = None
+
+
+class _NullSpan:
+    """Stand-in yielded while tracing is off; row counts set on it are dropped."""
+
+    __slots__ = ("rows",)
+
+    def __init__(self):
+        self.rows = None
+
+
+class Tracer:
+    def __init__(self, path=None):
+        self.path = path
+        self.enabled = path is not None
+        # The latest records, also kept in memory for tests and ad-hoc inspection
+        self.records = deque(maxlen=RECENT_RECORDS)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def configure(self, path=None, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def emit(self, record):
+        self.records.append(record)
+        if self.path:
+            line = json.dumps(record, default=str) + "\n"
+            with self._lock:
+                # One append-mode write per record keeps lines from concurrent
+                # threads and forked workers whole
+                with open(self.path, "a") as f:
+                    f.write(line)
+
+    @contextmanager
+    def span(self, name, **attrs):
+        if not self.enabled:
+            yield _NullSpan()
+            return
+        stack = self._stack()
+        current = Span(name, f"{os.getpid()}:{next(self._ids)}", stack[-1].id if stack else None, attrs)
+        stack.append(current)
+        peak_before = peak_rss_mb()
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        error = None
+        try:
+            yield current
+        except BaseException as exc:
+            error = type(exc).__name__
+            raise
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            stack.pop()
+            peak_after = peak_rss_mb()
+            record = {
+                "span": name,
+                "id": current.id,
+                "parent": current.parent,
+                "start": time.time() - wall,
+                "wall_ms": round(wall * 1000, 3),
+                "cpu_ms": round(cpu * 1000, 3),
+                "rss_mb": rss_mb(),
+                "peak_rss_mb": peak_after,
+                "peak_rss_growth_mb": (
+                    peak_after - peak_before if peak_after is not None else None
+                ),
+                "rows": current.rows,
+                "pid": os.getpid(),
+                "thread": threading.current_thread().name,
+            }
+            if error:
+                record["error"] = error
+            if current.attrs:
+                record["attrs"] = current.attrs
+            self.emit(record)
+
+
+tracer = Tracer(os.environ.get(TRACE_ENV) or None)
+
+
+def configure(path=None, enabled=True):
+    """Turn tracing on (to ``path`` and/or in memory) or off."""
+    tracer.configure(path, enabled)
+
+
+def span(name, **attrs):
+    return tracer.span(name, **attrs)
+
+
+def instrumented(name=None, rows=None):
+    """Decorator recording a span per call.
+
+    ``rows`` maps the return value to a row count, e.g. ``rows=len``.
+    """
+
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(span_name) as current:
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    current.rows = rows(result)
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def _profile_call(mode, name, func, args, kwargs):
+    directory = os.environ.get(PROFILE_DIR_ENV, DEFAULT_PROFILE_DIR)
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.join(
+        directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_profile_ids)}"
+    )
+    if mode == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            pass  # fall back to cProfile
+        else:
+            # Sampling profiler: low overhead, safe to leave on per callback
+            profiler = Profiler()
+            profiler.start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.stop()
+                with open(f"{stem}.html", "w") as f:
+                    f.write(profiler.output_html())
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(f"{stem}.prof")
+
+
+def profiled(name=None):
+    """Decorator profiling each call when ``SUPERSTORE_PROFILE`` selects a profiler."""
+
+    def decorator(func):
+        profile_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            mode = os.environ.get(PROFILE_ENV, "").lower()
+            if mode not in PROFILERS:
+                return func(*args, **kwargs)
+            return _profile_call(mode, profile_name, func, args, kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def summarize(records=None):
+    """Total wall / CPU time, call count and max peak RSS per span name."""
+    summary = {}
+    for record in tracer.records if records is None else records:
+        entry = summary.setdefault(
+            record["span"], {"calls": 0, "wall_ms": 0.0, "cpu_ms": 0.0, "rows": 0, "peak_rss_mb": 0.0}
+        )
+        entry["calls"] += 1
+        entry["wall_ms"] += record["wall_ms"]
+        entry["cpu_ms"] += record["cpu_ms"]
+        entry["rows"] += record["rows"] or 0
+        entry["peak_rss_mb"] = max(entry["peak_rss_mb"], record["peak_rss_mb"] or 0.0)
+    return summary
+
+
+def load_trace(path):
+    """Read a JSON-lines trace written by the tracer."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def format_summary(summary):
+    """Text table of :func:`summarize` output, slowest span first."""
+    width = max((len(name) for name in summary), default=4)
+    lines = [f"{'span':<{width}}  {'calls':>6}  {'wall ms':>10}  {'cpu ms':>10}  {'rows':>12}  {'peak MiB':>9}"]
+    for name, entry in sorted(summary.items(), key=lambda item: -item[1]["wall_ms"]):
+        lines.append(
+            f"{name:<{width}}  {entry['calls']:>6}  {entry['wall_ms']:>10.1f}  {entry['cpu_ms']:>10.1f}"
+            f"  {entry['rows']:>12,}  {entry['peak_rss_mb']:>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize a SUPERSTORE_TRACE file per span")
+    parser.add_argument("trace")
+    args = parser.parse_args()
+    print(format_summary(summarize(load_trace(args.trace))))
+
+
+if __name__ == "__main__":
+    main()
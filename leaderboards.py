@@ -0,0 +1,357 @@
+"""Top / bottom-N products, customers and cities for any dashboard filter.
+
+Rankings are answered from partial aggregates rather than the line items:
+
+- every (month, Region, Category) partition keeps the Sales / Profit / line
+  totals of each product, customer and city sold in it, sorted by month, so
+  the whole months of a date range are one contiguous slice;
+- the days of a date range that only cover part of a month come from the line
+  items of those days (kept sorted by day, so they are a slice too);
+- without a date range the answer is precomputed: the top and bottom
+  ``MAX_N`` of every metric for every Region / Category combination, "All"
+  included.
+
+The slices are reduced per entity with ``np.bincount`` and ranked with
+``np.argpartition``, so only the N entities shown are ever sorted. Cities are
+keyed by city and state (many city names repeat across states); products by
+Product ID and customers by Customer ID, labelled with their names. Margin
+rankings skip entities with fewer than ``MIN_MARGIN_LINES`` line items, whose
+margins are mostly noise. The tables are saved next to the columnar cache and
+memory-mapped back (:func:`load_or_build`)::
+
+    python leaderboards.py [source] --dimension Product --metric Profit --bottom
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import data_loader
+from data_loader import DEFAULT_SOURCE, cache_dir_for, cache_lock, dataset_version, load_superstore, save_array
+from instrumentation import instrumented
+
+ALL = "All"
+TABLE_VERSION = 1
+MAX_N = 50
+MIN_MARGIN_LINES = 3
+METRICS = ["Sales", "Profit", "Margin"]
+# Ranked dimension -> (key columns, label of an entity from its first line)
+ENTITIES = {
+    "Product": (["Product ID"], lambda rows: rows["Product Name"].astype(str)),
+    "Customer": (["Customer ID"], lambda rows: rows["Customer Name"].astype(str)),
+    "City": (["City", "State"], lambda rows: rows["City"].astype(str) + ", " + rows["State"].astype(str)),
+}
+LOAD_COLUMNS = [
+    "Order Date", "Region", "Category", "Sales", "Profit",
+    "Product ID", "Product Name", "Customer ID", "Customer Name", "City", "State",
+]
+
+
+def _scores(sales, profit, count, metric):
+    """Ranking score per entity; NaN for entities that cannot be ranked."""
+    if metric == "Margin":
+        with np.errstate(invalid="ignore", divide="ignore"):
+            score = profit / sales
+        return np.where((count >= MIN_MARGIN_LINES) & (sales > 0), score, np.nan)
+    return np.where(count > 0, sales if metric == "Sales" else profit, np.nan)
+
+
+def rank(sales, profit, count, metric="Sales", n=10, bottom=False):
+    """Codes of the ``n`` best (or worst) entities by ``metric``, best first.
+
+    A partial selection with ``np.argpartition``: only the ``n`` entities kept
+    are sorted. Ties are broken by entity code.
+    """
+    score = _scores(sales, profit, count, metric)
+    candidates = np.flatnonzero(~np.isnan(score))
+    key = score[candidates] if bottom else -score[candidates]
+    n = min(n, len(candidates))
+    if n == 0:
+        return candidates
+    if n < len(candidates):
+        keep = np.argpartition(key, n - 1)[:n]
+        candidates, key = candidates[keep], key[keep]
+    return candidates[np.lexsort((candidates, key))]
+
+
+class Leaderboards:
+    def __init__(self, arrays, labels, version=None):
+        self.arrays = arrays
+        # "Region" / "Category" filter labels and entity labels per dimension
+        self.labels = labels
+        self.version = version
+
+    @classmethod
+    @instrumented("leaderboards.build")
+    def from_frame(cls, df, version=None, max_n=MAX_N):
+        labels, codes = {}, {}
+        for dim in ("Region", "Category"):
+            dim_codes, uniques = pd.factorize(df[dim], sort=True)
+            codes[dim] = dim_codes.astype(np.int64)
+            labels[dim] = np.asarray(uniques, dtype=str)
+        n_regions, n_categories = len(labels["Region"]), len(labels["Category"])
+        cell = codes["Region"] * n_categories + codes["Category"]
+        days = df["Order Date"].to_numpy(dtype="datetime64[D]")
+        month = days.astype("datetime64[M]").astype(np.int64)
+        sales = df["Sales"].to_numpy(dtype=np.float64)
+        profit = df["Profit"].to_numpy(dtype=np.float64)
+
+        # Line items in day order, for the partial months of a date range
+        by_day = np.argsort(days, kind="stable")
+        arrays = {
+            "line_day": days.astype(np.int64)[by_day].astype(np.int32),
+            "line_cell": cell[by_day].astype(np.int16),
+            "line_sales": sales[by_day],
+            "line_profit": profit[by_day],
+        }
+        for dim, (key_columns, label_of) in ENTITIES.items():
+            entity, first = _entity_codes(df, key_columns)
+            labels[dim] = np.asarray(label_of(df.iloc[first]), dtype=str)
+            n_entities = len(first)
+            arrays[f"line_{dim}"] = entity[by_day].astype(np.int32)
+
+            # Partial aggregates per (month, cell, entity), in that order
+            key = (month * (n_regions * n_categories) + cell) * n_entities + entity
+            unique_keys, inverse = np.unique(key, return_inverse=True)
+            arrays[f"part_{dim}_month"] = (unique_keys // (n_entities * n_regions * n_categories)).astype(np.int32)
+            arrays[f"part_{dim}_cell"] = (unique_keys // n_entities % (n_regions * n_categories)).astype(np.int16)
+            arrays[f"part_{dim}_entity"] = (unique_keys % n_entities).astype(np.int32)
+            arrays[f"part_{dim}_sales"] = np.bincount(inverse, weights=sales)
+            arrays[f"part_{dim}_profit"] = np.bincount(inverse, weights=profit)
+            arrays[f"part_{dim}_count"] = np.bincount(inverse).astype(np.int32)
+
+            # Whole-range rankings of every filter combination ("All" = last
+            # index) with the ranked entities' totals, padded with code -1
+            shape = (n_regions + 1, n_categories + 1, len(METRICS), 2, max_n)
+            ranked = np.full(shape, -1, dtype=np.int32)
+            ranked_totals = [np.zeros(shape), np.zeros(shape), np.zeros(shape, dtype=np.int64)]
+            part_cell = arrays[f"part_{dim}_cell"].astype(np.int64)
+            for r in range(n_regions + 1):
+                for c in range(n_categories + 1):
+                    rows = np.ones(len(part_cell), dtype=bool)
+                    if r < n_regions:
+                        rows &= part_cell // n_categories == r
+                    if c < n_categories:
+                        rows &= part_cell % n_categories == c
+                    totals = _entity_totals(arrays, dim, n_entities, rows)
+                    for m, metric in enumerate(METRICS):
+                        for bottom in (0, 1):
+                            top = rank(*totals, metric, max_n, bool(bottom))
+                            ranked[r, c, m, bottom, :len(top)] = top
+                            for ranked_values, values in zip(ranked_totals, totals):
+                                ranked_values[r, c, m, bottom, :len(top)] = values[top]
+            arrays[f"rank_{dim}"] = ranked
+            for name, values in zip(("sales", "profit", "count"), ranked_totals):
+                arrays[f"rank_{dim}_{name}"] = values
+        return cls(arrays, labels, version)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        files = {}
+        for i, (name, values) in enumerate(self.arrays.items()):
+            files[name] = f"arr{i:02d}.npy"
+            save_array(os.path.join(directory, files[name]), values)
+        meta = {
+            "table_version": TABLE_VERSION,
+            "dataset_version": self.version,
+            "files": files,
+            "labels": {dim: values.tolist() for dim, values in self.labels.items()},
+        }
+        tmp_path = os.path.join(directory, "meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(directory, "meta.json"))
+
+    @classmethod
+    def load(cls, directory, version=None):
+        """Memory-map tables saved by :meth:`save`; None when they are missing or stale."""
+        try:
+            with open(os.path.join(directory, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("table_version") != TABLE_VERSION or meta["dataset_version"] != version:
+            return None
+        arrays = {
+            name: np.load(os.path.join(directory, file), mmap_mode="r")
+            for name, file in meta["files"].items()
+        }
+        labels = {dim: np.asarray(values, dtype=str) for dim, values in meta["labels"].items()}
+        return cls(arrays, labels, version)
+
+    def _filter_code(self, dim, value):
+        """Code of a Region / Category filter value; None for "All", -1 if unknown."""
+        if value in (None, ALL):
+            return None
+        labels = self.labels[dim]
+        position = int(np.searchsorted(labels, value))
+        return position if position < len(labels) and labels[position] == value else -1
+
+    def _in_cells(self, cells, region, category):
+        n_categories = len(self.labels["Category"])
+        keep = np.ones(len(cells), dtype=bool)
+        region_code = self._filter_code("Region", region)
+        category_code = self._filter_code("Category", category)
+        if region_code is not None:
+            keep &= cells // n_categories == region_code
+        if category_code is not None:
+            keep &= cells % n_categories == category_code
+        return keep
+
+    def totals(self, dim, region=ALL, category=ALL, start_date=None, end_date=None):
+        """``(sales, profit, line items)`` per entity of ``dim`` within the filters."""
+        arrays, n_entities = self.arrays, len(self.labels[dim])
+        months = arrays[f"part_{dim}_month"]
+        line_day = arrays["line_day"]
+        start = _day_number(start_date) if start_date else int(line_day[0])
+        end = _day_number(end_date) if end_date else int(line_day[-1])
+
+        # Whole months inside [start, end] from the partitions
+        first_month = _month_of(start) + (_month_start(_month_of(start)) < start)
+        last_month = _month_of(end) - (_month_start(_month_of(end) + 1) - 1 > end)
+        if first_month <= last_month:
+            lo = int(np.searchsorted(months, first_month, "left"))
+            hi = int(np.searchsorted(months, last_month, "right"))
+            parts = slice(lo, hi)
+            cells = arrays[f"part_{dim}_cell"][parts].astype(np.int64)
+            sales, profit, count = _entity_totals(
+                arrays, dim, n_entities, self._in_cells(cells, region, category), parts
+            )
+            edges = [(start, _month_start(first_month) - 1), (_month_start(last_month + 1), end)]
+        else:
+            sales, profit, count = np.zeros(n_entities), np.zeros(n_entities), np.zeros(n_entities, dtype=np.int64)
+            edges = [(start, end)]
+
+        # Partial months from the line items of those days
+        for lo_day, hi_day in edges:
+            if lo_day > hi_day:
+                continue
+            lines = slice(
+                int(np.searchsorted(line_day, lo_day, "left")), int(np.searchsorted(line_day, hi_day, "right"))
+            )
+            keep = self._in_cells(arrays["line_cell"][lines].astype(np.int64), region, category)
+            entity = arrays[f"line_{dim}"][lines][keep]
+            sales += np.bincount(entity, weights=arrays["line_sales"][lines][keep], minlength=n_entities)
+            profit += np.bincount(entity, weights=arrays["line_profit"][lines][keep], minlength=n_entities)
+            count += np.bincount(entity, minlength=n_entities)
+        return sales, profit, count
+
+    @instrumented("leaderboards.top", rows=len)
+    def top(self, dim="Product", metric="Sales", n=10, region=ALL, category=ALL,
+            start_date=None, end_date=None, bottom=False):
+        """The ``n`` best (or worst) entities of ``dim`` by ``metric`` within the filters.
+
+        A DataFrame with the entity label, Sales, Profit, Margin (%) and line
+        items, best first.
+        """
+        if not start_date and not end_date and n <= self.arrays[f"rank_{dim}"].shape[-1]:
+            index = self._precomputed_index(metric, region, category, bottom)
+            if index is not None:
+                codes = self.arrays[f"rank_{dim}"][index][:n]
+                ranked = codes >= 0
+                return self._frame(dim, codes[ranked], *(
+                    self.arrays[f"rank_{dim}_{name}"][index][:n][ranked] for name in ("sales", "profit", "count")
+                ))
+        sales, profit, count = self.totals(dim, region, category, start_date, end_date)
+        codes = rank(sales, profit, count, metric, n, bottom)
+        return self._frame(dim, codes, sales[codes], profit[codes], count[codes])
+
+    def _precomputed_index(self, metric, region, category, bottom):
+        """Position of a whole-range ranking; None when a filter value is unknown."""
+        index = []
+        for filter_dim, value in (("Region", region), ("Category", category)):
+            code = self._filter_code(filter_dim, value)
+            if code == -1:
+                return None
+            index.append(len(self.labels[filter_dim]) if code is None else code)
+        return index[0], index[1], METRICS.index(metric), int(bottom)
+
+    def _frame(self, dim, codes, sales, profit, count):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            margin = np.where(sales > 0, profit / sales * 100, np.nan)
+        return pd.DataFrame({
+            dim: self.labels[dim][codes],
+            "Sales": sales,
+            "Profit": profit,
+            "Margin": margin,
+            "Line Items": np.asarray(count, dtype=np.int64),
+        })
+
+
+def _entity_codes(df, key_columns):
+    """Code of every line's entity and the first line of each entity."""
+    codes, _ = pd.MultiIndex.from_frame(df[key_columns]).factorize()
+    _, first = np.unique(codes, return_index=True)
+    return codes.astype(np.int64), first
+
+
+def _entity_totals(arrays, dim, n_entities, keep, parts=slice(None)):
+    """Sales / Profit / line totals per entity of the partition rows ``parts`` where ``keep``."""
+    entity = arrays[f"part_{dim}_entity"][parts][keep]
+    return (
+        np.bincount(entity, weights=arrays[f"part_{dim}_sales"][parts][keep], minlength=n_entities),
+        np.bincount(entity, weights=arrays[f"part_{dim}_profit"][parts][keep], minlength=n_entities),
+        np.bincount(entity, weights=arrays[f"part_{dim}_count"][parts][keep], minlength=n_entities).astype(np.int64),
+    )
+
+
+def _day_number(value):
+    return int(np.datetime64(pd.Timestamp(value), "D").astype(np.int64))
+
+
+def _month_of(day):
+    return int(np.datetime64(day, "D").astype("datetime64[M]").astype(np.int64))
+
+
+def _month_start(month):
+    return int(np.datetime64(month, "M").astype("datetime64[D]").astype(np.int64))
+
+
+def table_dir_for(source=DEFAULT_SOURCE):
+    return os.path.join(cache_dir_for(source), "leaderboards")
+
+
+def load_or_build(source=DEFAULT_SOURCE, directory=None):
+    """Memory-map the leaderboards kept for ``source``, building them first when stale.
+
+    Building needs the name columns the dashboard leaves out, so it reads its
+    own columns from the cache.
+    """
+    directory = directory or table_dir_for(source)
+    if not data_loader.is_fresh(source, cache_dir_for(source)):
+        load_superstore(source)
+    version = dataset_version(source)
+    boards = Leaderboards.load(directory, version)
+    if boards is None:
+        with cache_lock(directory):
+            boards = Leaderboards.load(directory, version)
+            if boards is None:
+                Leaderboards.from_frame(load_superstore(source, columns=LOAD_COLUMNS), version).save(directory)
+                boards = Leaderboards.load(directory, version)
+    return boards
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Top / bottom-N products, customers and cities")
+    parser.add_argument("source", nargs="?", default=DEFAULT_SOURCE)
+    parser.add_argument("--dimension", choices=list(ENTITIES), default="Product")
+    parser.add_argument("--metric", choices=METRICS, default="Sales")
+    parser.add_argument("-n", type=int, default=10)
+    parser.add_argument("--bottom", action="store_true")
+    parser.add_argument("--region", default=ALL)
+    parser.add_argument("--category", default=ALL)
+    parser.add_argument("--start-date")
+    parser.add_argument("--end-date")
+    args = parser.parse_args()
+
+    boards = load_or_build(args.source)
+    table = boards.top(args.dimension, args.metric, args.n, args.region, args.category,
+                       args.start_date, args.end_date, args.bottom)
+    table.index = np.arange(1, len(table) + 1)
+    print(table.round(2).to_string())
+
+
+if __name__ == "__main__":
+    main()
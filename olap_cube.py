@@ -0,0 +1,312 @@
+"""Pre-aggregated sales cube over Region x Category x Sub-Category x Segment x month.
+
+The cube is built once from the raw rows and holds, for every populated cell,
+the sums of Sales / Profit / Quantity and the number of line items. Totals,
+regional / category / segment breakdowns and monthly trends are answered by
+rolling cells up instead of grouping the raw frame again.
+
+Usage::
+
+    cube = SalesCube.from_frame(df)
+    cube.save("cache/Superstore/cube.npz")
+    cube = SalesCube.load("cache/Superstore/cube.npz")
+    cube.rollup(["Region"], filters={"Category": "Furniture"})
+
+Every source keeps its own cube next to its columnar cache
+(:func:`cube_path_for`), stamped with the ``dataset_version`` it was built
+from; :func:`load_or_build` rebuilds it when that no longer matches. A cube
+delta-updated by ``incremental_ingest`` records the size and mtime of the
+file right after the append instead, and stays current while they hold.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from cache_meta import DEFAULT_SOURCE, cube_path_for, stamp_matches
+from data_loader import cache_lock, dataset_version
+from distinct_count import DEFAULT_PRECISION, HyperLogLog, hash_values
+from instrumentation import instrumented
+
+DIMENSIONS = ["Region", "Category", "Sub-Category", "Segment", "Month"]
+MEASURES = ["Sales", "Profit", "Quantity"]
+
+
+DEFAULT_CUBE_PATH = cube_path_for(DEFAULT_SOURCE)
+
+
+class SalesCube:
+    def __init__(self, cells, labels, month_first_day, month_last_day, sketches=None, version=None, stamp=None):
+        # cells: one row per populated cell, integer codes per dimension plus measures
+        self.cells = cells
+        self.labels = labels
+        # First / last order date seen in each month, used to decide whether a
+        # day-granular date range can be answered from whole months
+        self.month_first_day = month_first_day
+        self.month_last_day = month_last_day
+        # Optional HyperLogLog sketch of distinct Order IDs, one row per cell
+        self.sketches = sketches
+        # dataset_version of the data the cube was built from, when known
+        self.version = version
+        # Size / mtime of the source file the cube covers, when known
+        self.stamp = stamp
+
+    @classmethod
+    @instrumented("cube.build", rows=lambda cube: int(cube.cells["Count"].sum()))
+    def from_frame(cls, df, date_column="Order Date", distinct_column=None,
+                   precision=DEFAULT_PRECISION):
+        """Build the cube from raw rows.
+
+        With ``distinct_column`` set (e.g. ``"Order ID"``) every cell also keeps a
+        HyperLogLog sketch, and rollups report an approximate ``Distinct`` count.
+        """
+        keys = {}
+        labels = {}
+        for dim in DIMENSIONS[:-1]:
+            codes, uniques = pd.factorize(df[dim], sort=True)
+            keys[dim] = codes
+            labels[dim] = np.asarray(uniques, dtype=str)
+
+        months = df[date_column].dt.to_period("M")
+        month_codes, month_uniques = pd.factorize(months, sort=True)
+        keys["Month"] = month_codes
+        labels["Month"] = np.asarray(month_uniques.astype(str), dtype=str)
+
+        grouped = (
+            pd.DataFrame({**keys, **{m: df[m].to_numpy(dtype=np.float64) for m in MEASURES}})
+            .groupby(DIMENSIONS, sort=True)
+        )
+        cells = grouped[MEASURES].sum()
+        cells["Count"] = grouped.size()
+        cells = cells.reset_index()
+        for dim in DIMENSIONS:
+            cells[dim] = cells[dim].astype(np.int32)
+        cells["Count"] = cells["Count"].astype(np.int64)
+
+        sketches = None
+        if distinct_column is not None:
+            sketches = HyperLogLog.empty(len(cells), precision).add(
+                grouped.ngroup().to_numpy(), hash_values(df[distinct_column])
+            )
+
+        day = df[date_column].to_numpy(dtype="datetime64[D]")
+        bounds = pd.DataFrame({"Month": month_codes, "Day": day}).groupby("Month")["Day"]
+        return cls(
+            cells,
+            labels,
+            bounds.min().to_numpy(dtype="datetime64[D]"),
+            bounds.max().to_numpy(dtype="datetime64[D]"),
+            sketches,
+        )
+
+    def save(self, path=DEFAULT_CUBE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        arrays = {f"cell:{col}": self.cells[col].to_numpy() for col in self.cells.columns}
+        arrays.update({f"label:{dim}": values for dim, values in self.labels.items()})
+        arrays["month_first_day"] = self.month_first_day
+        arrays["month_last_day"] = self.month_last_day
+        if self.sketches is not None:
+            arrays["sketch_registers"] = self.sketches.registers
+            arrays["sketch_precision"] = np.array(self.sketches.precision)
+        if self.version is not None:
+            arrays["dataset_version"] = np.array(self.version)
+        if self.stamp is not None:
+            arrays["source_size"] = np.array(self.stamp["size"])
+            arrays["source_mtime"] = np.array(self.stamp["mtime"])
+        # Written aside and renamed, so concurrent loaders never see half a file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_CUBE_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            cells = pd.DataFrame(
+                {
+                    key.split(":", 1)[1]: data[key]
+                    for key in data.files
+                    if key.startswith("cell:")
+                }
+            )
+            labels = {
+                key.split(":", 1)[1]: data[key]
+                for key in data.files
+                if key.startswith("label:")
+            }
+            sketches = None
+            if "sketch_registers" in data.files:
+                sketches = HyperLogLog(data["sketch_registers"], int(data["sketch_precision"]))
+            version = str(data["dataset_version"]) if "dataset_version" in data.files else None
+            stamp = None
+            if "source_size" in data.files:
+                stamp = {"size": int(data["source_size"]), "mtime": float(data["source_mtime"])}
+            return cls(
+                cells, labels, data["month_first_day"], data["month_last_day"], sketches, version, stamp
+            )
+
+    def _month_code(self, month):
+        return int(np.searchsorted(self.labels["Month"], str(pd.Period(month, freq="M"))))
+
+    def month_range(self, start_date=None, end_date=None):
+        """Translate a day-granular date range into an inclusive month-code range.
+
+        Returns ``None`` when the range cuts through a month that has orders on
+        both sides of the cut, i.e. when whole cube months cannot answer it.
+        """
+        months = self.labels["Month"]
+        start_code, end_code = 0, len(months) - 1
+        if start_date:
+            start = np.datetime64(pd.Timestamp(start_date).normalize(), "D")
+            start_code = self._month_code(start)
+            if start_code < len(months) and months[start_code] == str(pd.Period(start, freq="M")):
+                if start > self.month_last_day[start_code]:
+                    start_code += 1
+                elif start > self.month_first_day[start_code]:
+                    return None
+        if end_date:
+            end = np.datetime64(pd.Timestamp(end_date).normalize(), "D")
+            end_code = self._month_code(end)
+            if end_code < len(months) and months[end_code] == str(pd.Period(end, freq="M")):
+                if end < self.month_first_day[end_code]:
+                    end_code -= 1
+                elif end < self.month_last_day[end_code]:
+                    return None
+            else:
+                end_code -= 1
+        return start_code, end_code
+
+    @instrumented("cube.rollup", rows=len)
+    def rollup(self, by=(), filters=None, months=None):
+        """Sum cube cells grouped by the dimensions in ``by``.
+
+        ``filters`` maps a dimension to a label (``"All"`` / ``None`` means no
+        filter); ``months`` is an inclusive ``(start_code, end_code)`` pair as
+        returned by :meth:`month_range`. The result has one row per populated
+        group with the dimension labels followed by Sales, Profit, Quantity and
+        Count, plus an approximate ``Distinct`` count when the cube has sketches.
+        """
+        by = list(by)
+        cells = self.cells
+        mask = np.ones(len(cells), dtype=bool)
+        for dim, value in (filters or {}).items():
+            if value is None or value == "All":
+                continue
+            code = np.flatnonzero(self.labels[dim] == value)
+            if not len(code):
+                mask[:] = False
+                break
+            mask &= cells[dim].to_numpy() == code[0]
+        if months is not None:
+            month_codes = cells["Month"].to_numpy()
+            mask &= (month_codes >= months[0]) & (month_codes <= months[1])
+        selected = cells[mask]
+
+        columns = MEASURES + ["Count"]
+        if not by:
+            result = selected[columns].sum().to_frame().T
+            group_ids = np.zeros(len(selected), dtype=np.int64)
+        else:
+            grouped = selected.groupby(by, sort=True)
+            result = grouped[columns].sum().reset_index()
+            group_ids = grouped.ngroup().to_numpy()
+            for dim in by:
+                result[dim] = self.labels[dim][result[dim].to_numpy()]
+        if self.sketches is not None:
+            sketches = HyperLogLog(self.sketches.registers[mask], self.sketches.precision)
+            result["Distinct"] = sketches.reduce(group_ids, len(result)).estimate()
+        return result
+
+    def cross_sums(self, row_key, col_key, measures=MEASURES, filters=None, months=None):
+        """Roll cells up onto the full ``row_key`` x ``col_key`` grid.
+
+        Same return shape as ``FilterEngine.cross_sums``:
+        ``(row_labels, col_labels, {measure: matrix}, counts)``.
+        """
+        row_labels, col_labels = self.labels[row_key], self.labels[col_key]
+        shape = (len(row_labels), len(col_labels))
+        rolled = self.rollup([row_key, col_key], filters, months)
+        i = np.searchsorted(row_labels, rolled[row_key].to_numpy(dtype=str))
+        j = np.searchsorted(col_labels, rolled[col_key].to_numpy(dtype=str))
+        sums = {}
+        for measure in list(measures) + ["Count"]:
+            matrix = np.zeros(shape)
+            matrix[i, j] = rolled[measure].to_numpy()
+            sums[measure] = matrix
+        counts = sums.pop("Count").astype(np.int64)
+        return row_labels, col_labels, sums, counts
+
+    def totals(self, filters=None, months=None):
+        """Grand totals as a Series of Sales, Profit, Quantity and Count."""
+        return self.rollup((), filters, months).iloc[0]
+
+    def merge(self, other):
+        """Combine two cubes built from disjoint sets of rows into a new cube."""
+        labels = {}
+        remapped = []
+        for dim in DIMENSIONS:
+            labels[dim] = np.union1d(self.labels[dim], other.labels[dim])
+        for cube in (self, other):
+            cells = cube.cells.copy()
+            for dim in DIMENSIONS:
+                # Translate this cube's codes into positions in the merged label set
+                mapping = np.searchsorted(labels[dim], cube.labels[dim]).astype(np.int32)
+                cells[dim] = mapping[cells[dim].to_numpy()]
+            remapped.append(cells)
+
+        grouped = pd.concat(remapped, ignore_index=True).groupby(DIMENSIONS, sort=True)
+        cells = grouped[MEASURES + ["Count"]].sum().reset_index()
+
+        sketches = None
+        if self.sketches is not None and other.sketches is not None:
+            registers = np.concatenate([self.sketches.registers, other.sketches.registers])
+            sketches = HyperLogLog(registers, self.sketches.precision).reduce(
+                grouped.ngroup().to_numpy(), len(cells)
+            )
+
+        first_day = np.full(len(labels["Month"]), np.datetime64("NaT"), dtype="datetime64[D]")
+        last_day = first_day.copy()
+        for cube in (self, other):
+            positions = np.searchsorted(labels["Month"], cube.labels["Month"])
+            first_day[positions] = np.where(
+                np.isnat(first_day[positions]),
+                cube.month_first_day,
+                np.minimum(first_day[positions], cube.month_first_day),
+            )
+            last_day[positions] = np.where(
+                np.isnat(last_day[positions]),
+                cube.month_last_day,
+                np.maximum(last_day[positions], cube.month_last_day),
+            )
+        return SalesCube(cells, labels, first_day, last_day, sketches)
+
+
+def _load_current(path, version, source):
+    if not os.path.exists(path):
+        return None
+    cube = SalesCube.load(path)
+    if version is not None and cube.version == version:
+        return cube
+    return cube if stamp_matches(source, cube.stamp) else None
+
+
+def load_or_build(df, path=None, source=DEFAULT_SOURCE, version=None):
+    """Load the cube persisted for ``source`` (``df``), rebuilding it when stale.
+
+    The cube is current when it was built from ``version`` (by default the
+    ``dataset_version`` of ``source``) or its stamp still matches ``source``;
+    ``path`` defaults to :func:`cube_path_for`.
+    """
+    path = path or cube_path_for(source)
+    version = version if version is not None else dataset_version(source)
+    cube = _load_current(path, version, source)
+    if cube is None:
+        with cache_lock(os.path.dirname(path) or "."):
+            cube = _load_current(path, version, source)
+            if cube is None:
+                cube = SalesCube.from_frame(df)
+                cube.version = version
+                cube.save(path)
+    return cube
@@ -0,0 +1,242 @@
+"""Order-level and shipping metrics derived from the line items.
+
+Every other aggregate in the project counts line items. This stage collapses
+the lines into one row per order in a single vectorized pass: the rows are
+ordered by their ``Order ID`` code, order boundaries are where the code
+changes, and ``np.add.reduceat`` sums each order's lines. Per order it keeps:
+
+- order day, Region, Segment and Ship Mode (shared by all lines of an order);
+- ship lead time in days (``Ship Date - Order Date``);
+- basket size (lines and units), value (Sales) and Profit;
+- a bitmask of the Categories the order contains.
+
+Orders are stored sorted by order day, so a date range is a slice and the
+dashboard filters (Region, Category, dates) select orders without touching the
+line items. A Category filter keeps the orders containing that category, with
+their whole basket. The table is saved next to the columnar cache and
+memory-mapped back (:func:`load_or_build`)::
+
+    python order_metrics.py [source]
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DEFAULT_SOURCE, cache_dir_for, cache_lock, dataset_version, load_superstore, save_array
+from distinct_count import codes_of
+from instrumentation import instrumented
+
+ALL = "All"
+TABLE_VERSION = 1
+DIMENSIONS = ["Region", "Segment", "Ship Mode", "Category"]
+# Per-order arrays, all of one length
+COLUMNS = ["order_day", "lead_days", "lines", "units", "value", "profit",
+           "Region", "Segment", "Ship Mode", "categories"]
+LEAD_QUANTILES = (0.5, 0.9)
+# Lead time histogram window: one bin per day up to MAX_LEAD_DAYS, with
+# underflow / overflow bins for anything outside it
+MAX_LEAD_DAYS = 10
+
+
+def lead_days(df):
+    """Ship lead time of every line, in whole days."""
+    return (
+        df["Ship Date"].to_numpy(dtype="datetime64[D]") - df["Order Date"].to_numpy(dtype="datetime64[D]")
+    ).astype(np.int64)
+
+
+class OrderTable:
+    def __init__(self, columns, labels, version=None):
+        self.columns = columns
+        self.labels = labels
+        self.version = version
+        self.n_orders = len(columns["order_day"])
+
+    @classmethod
+    @instrumented("orders.build", rows=lambda table: table.n_orders)
+    def from_frame(cls, df, version=None):
+        labels, codes = {}, {}
+        for dim in DIMENSIONS:
+            dim_codes, uniques = pd.factorize(df[dim], sort=True)
+            codes[dim] = dim_codes
+            labels[dim] = np.asarray(uniques, dtype=str)
+
+        # Group the lines by order: sort by order code, cut where it changes
+        order_codes, _ = codes_of(df["Order ID"])
+        by_order = np.argsort(order_codes, kind="stable")
+        sorted_codes = order_codes[by_order]
+        starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+        first = by_order[starts]
+
+        def per_order(values, ufunc=np.add):
+            return ufunc.reduceat(values[by_order], starts) if len(starts) else values[:0]
+
+        columns = {
+            "order_day": df["Order Date"].to_numpy(dtype="datetime64[D]")[first],
+            "lead_days": lead_days(df)[first],
+            "lines": np.diff(np.r_[starts, len(by_order)]),
+            "units": per_order(df["Quantity"].to_numpy(dtype=np.int64)),
+            "value": per_order(df["Sales"].to_numpy(dtype=np.float64)),
+            "profit": per_order(df["Profit"].to_numpy(dtype=np.float64)),
+            "categories": per_order(np.left_shift(1, codes["Category"]).astype(np.int64), np.bitwise_or),
+        }
+        for dim in ("Region", "Segment", "Ship Mode"):
+            columns[dim] = codes[dim][first]
+
+        # Order day order, so a date range is a contiguous slice
+        by_day = np.argsort(columns["order_day"], kind="stable")
+        columns = {name: values[by_day] for name, values in columns.items()}
+        return cls(columns, labels, version)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        files = {}
+        for i, name in enumerate(COLUMNS):
+            files[name] = f"arr{i:02d}.npy"
+            save_array(os.path.join(directory, files[name]), self.columns[name])
+        meta = {
+            "table_version": TABLE_VERSION,
+            "dataset_version": self.version,
+            "files": files,
+            "labels": {dim: values.tolist() for dim, values in self.labels.items()},
+        }
+        tmp_path = os.path.join(directory, "meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, os.path.join(directory, "meta.json"))
+
+    @classmethod
+    def load(cls, directory, version=None):
+        """Memory-map a table saved by :meth:`save`; None when it is missing or stale."""
+        try:
+            with open(os.path.join(directory, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("table_version") != TABLE_VERSION or meta["dataset_version"] != version:
+            return None
+        columns = {
+            name: np.load(os.path.join(directory, file), mmap_mode="r")
+            for name, file in meta["files"].items()
+        }
+        labels = {dim: np.asarray(values, dtype=str) for dim, values in meta["labels"].items()}
+        return cls(columns, labels, version)
+
+    def _code(self, dim, value):
+        labels = self.labels[dim]
+        position = int(np.searchsorted(labels, value))
+        return position if position < len(labels) and labels[position] == value else -1
+
+    @instrumented("orders.select", rows=len)
+    def select(self, region=ALL, category=ALL, start_date=None, end_date=None):
+        """Positions of the orders placed in the date range within the filters."""
+        days = self.columns["order_day"]
+        lo = np.searchsorted(days, np.datetime64(pd.Timestamp(start_date), "D"), "left") if start_date else 0
+        hi = np.searchsorted(days, np.datetime64(pd.Timestamp(end_date), "D"), "right") if end_date else len(days)
+        rows = np.arange(lo, max(hi, lo))
+        keep = None
+        if region not in (None, ALL):
+            keep = self.columns["Region"][lo:hi] == self._code("Region", region)
+        if category not in (None, ALL):
+            code = self._code("Category", category)
+            in_category = (
+                (self.columns["categories"][lo:hi] >> code) & 1 if code >= 0 else np.zeros(len(rows), dtype=np.int64)
+            ).astype(bool)
+            keep = in_category if keep is None else keep & in_category
+        return rows if keep is None else rows[keep]
+
+    def basket(self, rows=None):
+        """Order count and mean basket size / value over ``rows`` (all orders by default)."""
+        rows = slice(None) if rows is None else rows
+        lines = self.columns["lines"][rows]
+        n_orders = len(lines)
+        if not n_orders:
+            return {"orders": 0, "lines": 0.0, "units": 0.0, "value": 0.0, "profit": 0.0, "lead_days": 0.0}
+        return {
+            "orders": n_orders,
+            "lines": float(lines.mean()),
+            "units": float(self.columns["units"][rows].mean()),
+            "value": float(self.columns["value"][rows].mean()),
+            "profit": float(self.columns["profit"][rows].mean()),
+            "lead_days": float(self.columns["lead_days"][rows].mean()),
+        }
+
+    def lead_time_histogram(self, rows=None, max_days=MAX_LEAD_DAYS):
+        """``(ship modes, lead days, counts)`` with ``counts[mode, i]`` orders shipped ``days[i]`` days after.
+
+        Days always run from -1 to ``max_days + 1``, whatever the data: the
+        first bin counts every order shipped before it was placed (a Ship Date
+        preceding its Order Date) and the last one every order shipped more
+        than ``max_days`` days after.
+        """
+        rows = slice(None) if rows is None else rows
+        modes = self.columns["Ship Mode"][rows].astype(np.int64)
+        lead = np.clip(self.columns["lead_days"][rows].astype(np.int64), -1, max_days + 1)
+        n_modes = len(self.labels["Ship Mode"])
+        days = np.arange(-1, max_days + 2)
+        counts = np.bincount(modes * len(days) + (lead + 1), minlength=n_modes * len(days))
+        return self.labels["Ship Mode"], days, counts.reshape(n_modes, len(days))
+
+    def lead_time_distribution(self, rows=None, quantiles=LEAD_QUANTILES):
+        """Per Ship Mode: orders, mean / quantile / max lead days (exact, outliers included)."""
+        rows = slice(None) if rows is None else rows
+        modes = self.columns["Ship Mode"][rows].astype(np.int64)
+        lead = self.columns["lead_days"][rows].astype(np.int64)
+        n_modes = len(self.labels["Ship Mode"])
+        # Lead times sorted within each mode; mode m owns sorted_lead[start[m]:start[m] + n[m]]
+        sorted_lead = lead[np.lexsort((lead, modes))]
+        n = np.bincount(modes, minlength=n_modes)
+        start = np.r_[0, np.cumsum(n)[:-1]]
+        present = n > 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            table = pd.DataFrame(
+                {"Orders": n, "Mean Days": np.bincount(modes, weights=lead, minlength=n_modes) / n},
+                index=pd.Index(self.labels["Ship Mode"].astype(object), name="Ship Mode"),
+            )
+        # Smallest lead time covering a share q of the orders, then the longest
+        positions = [(f"P{int(q * 100)} Days", start + np.maximum(np.ceil(q * n).astype(np.int64) - 1, 0))
+                     for q in quantiles]
+        for name, position in positions + [("Max Days", start + n - 1)]:
+            values = np.full(n_modes, np.nan)
+            values[present] = sorted_lead[position[present]]
+            table[name] = values
+        return table[present]
+
+
+def table_dir_for(source=DEFAULT_SOURCE):
+    return os.path.join(cache_dir_for(source), "order_metrics")
+
+
+def load_or_build(df, directory, version=None):
+    """Memory-map the order table saved in ``directory``, building it first when stale."""
+    table = OrderTable.load(directory, version)
+    if table is None:
+        with cache_lock(directory):
+            table = OrderTable.load(directory, version)
+            if table is None:
+                OrderTable.from_frame(df, version).save(directory)
+                table = OrderTable.load(directory, version)
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Order-level basket and ship lead time metrics")
+    parser.add_argument("source", nargs="?", default=DEFAULT_SOURCE)
+    args = parser.parse_args()
+
+    df = load_superstore(args.source)
+    table = load_or_build(df, table_dir_for(args.source), dataset_version(args.source))
+    basket = table.basket()
+    print(f"{basket['orders']:,} orders from {len(df):,} line items")
+    print(f"Lines per order: {basket['lines']:.2f}, units per order: {basket['units']:.2f}")
+    print(f"Average order value: ${basket['value']:,.2f}, profit per order: ${basket['profit']:,.2f}")
+    print(f"Average ship lead time: {basket['lead_days']:.2f} days")
+    print("\nShip lead time by Ship Mode (days):")
+    print(table.lead_time_distribution().round(2).to_string())
+
+
+if __name__ == "__main__":
+    main()
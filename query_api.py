@@ -0,0 +1,389 @@
+"""Headless JSON query service over the resident Superstore dataset.
+
+The typed dataset (and the sales cube built from it) is loaded once and kept in
+memory; BI tools post aggregate queries and get JSON back::
+
+    POST /query
+    {"group_by": ["Region"],
+     "filters": {"Category": "Furniture", "Year": 2017},
+     "measures": ["Sales", "Profit"]}
+
+    -> {"data": [{"Region": "Central", "Sales": 29797.8, "Profit": -2.8}, ...],
+        "source": "cube", "cached": false, "elapsed_ms": 0.41}
+
+- ``group_by`` and the keys of ``filters`` may be any text column, plus
+  ``Month`` ("2017-03") and ``Year`` derived from ``Order Date``; a filter
+  value is either one label or a list of labels;
+- ``start_date`` / ``end_date`` bound ``Order Date`` (inclusive);
+- ``measures`` are sums of Sales / Profit / Quantity, ``Count`` (line items)
+  and ``Orders`` (exact distinct Order IDs).
+
+Queries the sales cube can answer (cube dimensions, single-label filters and a
+date range on month boundaries) are rolled up from cube cells; everything else
+is aggregated from the integer-coded columns with ``np.bincount``. Results are
+kept in a bounded LRU keyed by the canonical query and the dataset version.
+
+Posting a JSON list runs a batch in one round trip: identical queries are
+answered once and queries sharing filters share the row selection. The
+bundled threaded server speaks HTTP/1.1 so clients keep their connections
+open between requests::
+
+    python query_api.py --port 8060
+
+``create_app()`` returns the same API as a WSGI application, e.g. for
+``gunicorn -k gthread --threads 8 'query_api:create_app()'``.
+"""
+import argparse
+import json
+import time
+import traceback
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DEFAULT_SOURCE, TEXT_COLUMNS, dataset_version, load_superstore
+from distinct_count import codes_of, grouped_distinct
+from figure_cache import FigureCache
+from olap_cube import DIMENSIONS, load_or_build
+
+SUMMED = ["Sales", "Profit", "Quantity"]
+MEASURES = SUMMED + ["Count", "Orders"]
+DEFAULT_MEASURES = ["Sales", "Profit"]
+MAX_BATCH = 256
+
+
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def _json_value(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class QueryEngine:
+    def __init__(self, df, cube=None, date_column="Order Date"):
+        self.df = df
+        self.cube = cube
+        self.n_rows = len(df)
+        self._dates = df[date_column].to_numpy(dtype="datetime64[ns]")
+        self._measures = {m: df[m].to_numpy(dtype=np.float64) for m in SUMMED}
+        self._order_codes, self._order_cardinality = codes_of(df["Order ID"])
+
+        # Integer codes and labels of every groupable key
+        self._keys = {}
+        for column in df.columns:
+            if isinstance(df[column].dtype, pd.CategoricalDtype) or df[column].dtype == object:
+                codes, labels = pd.factorize(df[column], sort=True)
+                self._keys[column] = (codes, np.asarray(labels, dtype=object))
+        months = self._dates.astype("datetime64[M]")
+        for key, values in (("Month", np.datetime_as_string(months, unit="M")),
+                            ("Year", months.astype("datetime64[Y]").astype(np.int64) + 1970)):
+            codes, labels = pd.factorize(values, sort=True)
+            self._keys[key] = (codes, np.asarray(labels, dtype=object))
+        self._lookup = {
+            key: {str(label): code for code, label in enumerate(labels)}
+            for key, (_, labels) in self._keys.items()
+        }
+
+    def dimensions(self):
+        return sorted(self._keys)
+
+    def normalize(self, query):
+        """Validate ``query`` and return its canonical form (also the cache key)."""
+        if not isinstance(query, dict):
+            raise ValueError("a query must be a JSON object")
+        unknown = set(query) - {"group_by", "filters", "measures", "start_date", "end_date"}
+        if unknown:
+            raise ValueError(f"unknown query fields: {sorted(unknown)}")
+        group_by = _as_list(query.get("group_by") or [])
+        measures = _as_list(query.get("measures") or DEFAULT_MEASURES)
+        filters = query.get("filters") or {}
+        if not isinstance(filters, dict):
+            raise ValueError("filters must be an object")
+        if not all(isinstance(key, str) for key in group_by):
+            raise ValueError(f"group_by must list dimension names, got {query['group_by']!r}")
+        for key in list(group_by) + list(filters):
+            if key not in self._keys:
+                raise ValueError(f"unknown dimension {key!r}")
+        for key, values in filters.items():
+            if not all(isinstance(value, (str, int, float)) for value in _as_list(values)):
+                raise ValueError(f"{key} filter values must be labels, got {values!r}")
+        years = _as_list(filters.get("Year", []))
+        if any(isinstance(year, bool) or not str(year).isdigit() for year in years):
+            raise ValueError(f"Year filter values must be integers, got {filters['Year']!r}")
+        for measure in measures:
+            if measure not in MEASURES:
+                raise ValueError(f"unknown measure {measure!r}; expected one of {MEASURES}")
+        dates = {}
+        for name in ("start_date", "end_date"):
+            if query.get(name):
+                try:
+                    dates[name] = pd.Timestamp(query[name]).date().isoformat()
+                except (TypeError, ValueError, OverflowError):
+                    raise ValueError(f"invalid {name} {query[name]!r}") from None
+        return {
+            "group_by": group_by,
+            "filters": {
+                key: sorted(str(int(v)) if key == "Year" else str(v) for v in _as_list(filters[key]))
+                for key in sorted(filters)
+            },
+            "measures": measures,
+            **dates,
+        }
+
+    def _date_range(self, query):
+        start, end = query.get("start_date"), query.get("end_date")
+        years = query["filters"].get("Year")
+        if years and len(years) == 1:
+            # A single year is a date range, which keeps it answerable from the cube
+            start = max(filter(None, [start, f"{years[0]}-01-01"]))
+            end = min(filter(None, [end, f"{years[0]}-12-31"]))
+        return start, end
+
+    def _cube_plan(self, query):
+        """Cube month range for ``query``, or None when the cube cannot answer it."""
+        if self.cube is None or "Orders" in query["measures"]:
+            return None
+        filters = {key: values for key, values in query["filters"].items() if key != "Year"}
+        if "Year" in query["group_by"] or len(query["filters"].get("Year", [])) > 1:
+            return None
+        if any(key not in DIMENSIONS for key in list(query["group_by"]) + list(filters)):
+            return None
+        if any(len(values) != 1 for values in filters.values()):
+            return None
+        start, end = self._date_range(query)
+        if start and end and start > end:
+            return None
+        return self.cube.month_range(start, end)
+
+    def select(self, query):
+        """Boolean row mask of the filters and date range of ``query``."""
+        mask = np.ones(self.n_rows, dtype=bool)
+        for key, values in query["filters"].items():
+            lookup = self._lookup[key]
+            wanted = np.zeros(len(lookup) + 1, dtype=bool)
+            wanted[[lookup[v] for v in values if v in lookup]] = True
+            mask &= wanted[self._keys[key][0]]
+        start, end = query.get("start_date"), query.get("end_date")
+        if start:
+            mask &= self._dates >= np.datetime64(start, "ns")
+        if end:
+            mask &= self._dates < np.datetime64(end, "D") + np.timedelta64(1, "D")
+        return mask
+
+    def _from_cube(self, query, months):
+        filters = {key: values[0] for key, values in query["filters"].items() if key != "Year"}
+        result = self.cube.rollup(query["group_by"], filters, months)
+        result["Count"] = result["Count"].astype(np.int64)
+        return result[query["group_by"] + query["measures"]]
+
+    def _from_rows(self, query, rows):
+        group_by = query["group_by"]
+        if group_by:
+            shape = [len(self._keys[key][1]) for key in group_by]
+            codes = [self._keys[key][0][rows] for key in group_by]
+            if np.prod(shape, dtype=np.float64) < 2**62:
+                groups, group_ids = np.unique(np.ravel_multi_index(codes, shape), return_inverse=True)
+                group_codes = np.unravel_index(groups, shape)
+            else:
+                groups, group_ids = np.unique(np.stack(codes, axis=1), axis=0, return_inverse=True)
+                group_codes = groups.T
+        else:
+            groups, group_ids = np.zeros(1, dtype=np.int64), np.zeros(len(rows), dtype=np.int64)
+        n_groups = len(groups)
+
+        result = {}
+        if group_by:
+            for key, codes in zip(group_by, group_codes):
+                result[key] = self._keys[key][1][codes]
+        for measure in query["measures"]:
+            if measure == "Count":
+                result[measure] = np.bincount(group_ids, minlength=n_groups)
+            elif measure == "Orders":
+                result[measure] = grouped_distinct(
+                    group_ids, self._order_codes[rows], n_groups, self._order_cardinality
+                )
+            else:
+                result[measure] = np.bincount(
+                    group_ids, weights=self._measures[measure][rows], minlength=n_groups
+                )
+        return pd.DataFrame(result)
+
+    def run(self, query, selections=None):
+        """Answer a normalized query; returns ``(frame, source)``.
+
+        ``selections`` memoizes row selections across the queries of a batch.
+        """
+        months = self._cube_plan(query)
+        if months is not None:
+            return self._from_cube(query, months), "cube"
+        key = json.dumps([query["filters"], query.get("start_date"), query.get("end_date")])
+        if selections is not None and key in selections:
+            rows = selections[key]
+        else:
+            rows = np.flatnonzero(self.select(query))
+            if selections is not None:
+                selections[key] = rows
+        return self._from_rows(query, rows), "rows"
+
+
+class QueryService:
+    """Query engine plus result cache for one resident dataset."""
+
+    def __init__(self, source=DEFAULT_SOURCE, cache=None):
+        self.source = source
+        self.cache = cache or FigureCache()
+        self.reload()
+
+    def reload(self):
+        df = load_superstore(self.source, exclude=TEXT_COLUMNS)
+        self.engine = QueryEngine(df, load_or_build(df, source=self.source))
+        self.cache.invalidate(dataset_version(self.source))
+
+    def answer(self, query, selections=None):
+        start = time.perf_counter()
+        try:
+            query = self.engine.normalize(query)
+        except ValueError as exc:
+            return {"error": str(exc)}
+        key = (self.cache.version, json.dumps(query, sort_keys=True))
+        response = self.cache.get(key)
+        if response is not None:
+            response["cached"] = True
+        else:
+            frame, source = self.engine.run(query, selections)
+            response = {
+                "data": [
+                    {column: _json_value(value) for column, value in row.items()}
+                    for row in frame.to_dict("records")
+                ],
+                "source": source,
+            }
+            self.cache.put(key, response)
+            response["cached"] = False
+        response["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return response
+
+    def answer_batch(self, queries):
+        selections = {}
+        answered = {}
+        responses = []
+        for query in queries:
+            # Identical queries within a batch are answered once
+            key = json.dumps(query, sort_keys=True, default=str)
+            if key not in answered:
+                answered[key] = self.answer(query, selections)
+            responses.append(answered[key])
+        return responses
+
+    def handle(self, method, path, body):
+        """Route one request; returns ``(status, JSON bytes)``.
+
+        Errors come back as a JSON body as well (400 for a malformed query,
+        500 otherwise), so no request ever costs the client its connection.
+        """
+        try:
+            status, payload = self._route(method, path, body)
+        except (TypeError, ValueError) as exc:
+            status, payload = 400, {"error": str(exc)}
+        except Exception as exc:
+            traceback.print_exc()
+            status, payload = 500, {"error": f"{type(exc).__name__}: {exc}"}
+        return status, json.dumps(payload).encode()
+
+    def _route(self, method, path, body):
+        status, payload = 200, None
+        if path == "/query" and method == "POST":
+            try:
+                request = json.loads(body or b"null")
+            except ValueError:
+                request = None
+            if isinstance(request, list):
+                if len(request) > MAX_BATCH:
+                    status, payload = 400, {"error": f"at most {MAX_BATCH} queries per batch"}
+                else:
+                    payload = self.answer_batch(request)
+            elif request is None:
+                status, payload = 400, {"error": "expected a JSON query or a list of queries"}
+            else:
+                payload = self.answer(request)
+                status = 400 if "error" in payload else 200
+        elif path == "/dimensions" and method == "GET":
+            payload = {"dimensions": self.engine.dimensions(), "measures": MEASURES}
+        elif path == "/stats" and method == "GET":
+            payload = {"rows": self.engine.n_rows, "cache": self.cache.stats()}
+        elif path == "/reload" and method == "POST":
+            self.reload()
+            payload = {"rows": self.engine.n_rows, "version": self.cache.version}
+        else:
+            status, payload = 404, {"error": f"no route for {method} {path}"}
+        return status, payload
+
+
+def create_app(source=DEFAULT_SOURCE, service=None):
+    """WSGI application answering the query API (for gunicorn, waitress, ...)."""
+    service = service or QueryService(source)
+
+    def app(environ, start_response):
+        body = b""
+        if environ["REQUEST_METHOD"] == "POST":
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+            body = environ["wsgi.input"].read(length) if length else b""
+        status, payload = service.handle(environ["REQUEST_METHOD"], environ.get("PATH_INFO", "/"), body)
+        start_response(
+            f"{status} {HTTPStatus(status).phrase}",
+            [("Content-Type", "application/json"), ("Content-Length", str(len(payload)))],
+        )
+        return [payload]
+
+    app.service = service
+    return app
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    """Standalone HTTP/1.1 front end; connections stay open between requests."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without TCP_NODELAY every
+    # kept-alive request waits on the client's delayed ACK
+    disable_nagle_algorithm = True
+    service = None
+
+    def _respond(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        status, payload = self.service.handle(method, self.path.split("?", 1)[0], body)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._respond("GET")
+
+    def do_POST(self):
+        self._respond("POST")
+
+    def log_request(self, code="-", size="-"):
+        # Per-request access logging costs more than answering a cached query
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve aggregate queries over the Superstore dataset")
+    parser.add_argument("--source", default=DEFAULT_SOURCE)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8060)
+    args = parser.parse_args()
+
+    QueryRequestHandler.service = QueryService(args.source)
+    server = ThreadingHTTPServer((args.host, args.port), QueryRequestHandler)
+    print(f"Serving {QueryRequestHandler.service.engine.n_rows:,} rows on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
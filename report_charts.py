@@ -0,0 +1,216 @@
+"""Matplotlib / seaborn charts of the EDA report, rendered in parallel and cached.
+
+Each chart is a plain function of its input aggregate and output path, so it
+can run in its own worker process. ``render_charts`` hashes every chart's
+inputs and skips charts whose PNG already exists with the same hash, keeping
+the hashes in ``.render_cache.json`` inside the output directory; whatever is
+left is rendered on a process pool with the Agg backend.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import seaborn as sns
+
+from instrumentation import instrumented, span
+
+# Bump when a chart function changes so cached PNGs are re-rendered
+RENDER_VERSION = 1
+CACHE_FILE = ".render_cache.json"
+
+# Set the style for better visualizations
+plt.style.use("default")
+sns.set_theme()
+
+
+def plot_correlation_heatmap(correlation_matrix, path):
+    plt.figure(figsize=(10, 8))
+    sns.heatmap(
+        correlation_matrix,
+        annot=True,  # Show correlation values
+        cmap="coolwarm",  # Color scheme
+        center=0,  # Center the colormap at 0
+        fmt=".2f",  # Format correlation values to 2 decimal places
+        square=True,
+    )  # Make the plot square-shaped
+    plt.title("Correlation Heatmap of Numeric Variables")
+    plt.tight_layout()
+    plt.savefig(path, dpi=300, bbox_inches="tight")
+    plt.close()
+
+
+def plot_regional_analysis(regional_metrics, path):
+    plt.figure(figsize=(15, 10))
+
+    # Sales by Region
+    plt.subplot(2, 2, 1)
+    sales_by_region = regional_metrics["Sales"].sort_values(ascending=False)
+    ax1 = sales_by_region.plot(kind="bar", color="skyblue")
+    plt.title("Total Sales by Region", pad=20)
+    plt.xlabel("Region")
+    plt.ylabel("Sales ($)")
+    plt.xticks(rotation=45)
+    for i, v in enumerate(sales_by_region):
+        ax1.text(i, v, f"${v:,.0f}", ha="center", va="bottom")
+
+    # Profit by Region
+    plt.subplot(2, 2, 2)
+    profit_by_region = regional_metrics["Profit"].sort_values(ascending=False)
+    ax2 = profit_by_region.plot(kind="bar", color="lightgreen")
+    plt.title("Total Profit by Region", pad=20)
+    plt.xlabel("Region")
+    plt.ylabel("Profit ($)")
+    plt.xticks(rotation=45)
+    for i, v in enumerate(profit_by_region):
+        ax2.text(i, v, f"${v:,.0f}", ha="center", va="bottom")
+
+    plt.tight_layout()
+    plt.savefig(path, dpi=300, bbox_inches="tight")
+    plt.close()
+
+
+def plot_monthly_sales(monthly_sales, path):
+    plt.figure(figsize=(15, 6))
+    ax = monthly_sales.plot(kind="line", marker="o", linewidth=2, markersize=8)
+    plt.title("Monthly Sales Trend", pad=20, size=14)
+    plt.xlabel("Month", size=12)
+    plt.ylabel("Sales ($)", size=12)
+    plt.grid(True, linestyle="--", alpha=0.7)
+
+    # Add value labels
+    for i, v in enumerate(monthly_sales):
+        ax.text(i, v, f"${v:,.0f}", ha="center", va="bottom")
+
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    plt.savefig(path, dpi=300, bbox_inches="tight")
+    plt.close()
+
+
+def plot_category_analysis(category_metrics, path):
+    plt.figure(figsize=(15, 10))
+
+    # Sales by Category and Sub-Category
+    plt.subplot(2, 2, 1)
+    category_sales = category_metrics["Sales"].unstack()
+    category_sales.plot(kind="bar", stacked=True)
+    plt.title("Sales by Category and Sub-Category", pad=20)
+    plt.xlabel("Category")
+    plt.ylabel("Sales ($)")
+    plt.xticks(rotation=45)
+    plt.legend(title="Sub-Category", bbox_to_anchor=(1.05, 1), loc="upper left")
+    plt.tight_layout()
+
+    # Profit by Category and Sub-Category
+    plt.subplot(2, 2, 2)
+    category_profit = category_metrics["Profit"].unstack()
+    category_profit.plot(kind="bar", stacked=True)
+    plt.title("Profit by Category and Sub-Category", pad=20)
+    plt.xlabel("Category")
+    plt.ylabel("Profit ($)")
+    plt.xticks(rotation=45)
+    plt.legend(title="Sub-Category", bbox_to_anchor=(1.05, 1), loc="upper left")
+    plt.tight_layout()
+
+    plt.savefig(path, dpi=300, bbox_inches="tight")
+    plt.close()
+
+
+def plot_discount_profit(discount, profit, sales, trend, path):
+    # Create scatter plot
+    plt.figure(figsize=(12, 6))
+    plt.scatter(discount, profit, alpha=0.5, c=sales, cmap="viridis")
+    plt.colorbar(label="Sales Amount")
+    plt.title("Relationship between Discount and Profit", pad=20)
+    plt.xlabel("Discount Rate")
+    plt.ylabel("Profit ($)")
+    plt.grid(True, linestyle="--", alpha=0.7)
+
+    # Add trend line
+    p = np.poly1d(trend)
+    plt.plot(discount, p(discount), "r--", alpha=0.8)
+
+    plt.tight_layout()
+    plt.savefig(path, dpi=300, bbox_inches="tight")
+    plt.close()
+
+
+CHARTS = {
+    "correlation_heatmap": plot_correlation_heatmap,
+    "regional_analysis": plot_regional_analysis,
+    "monthly_sales_trend": plot_monthly_sales,
+    "category_analysis": plot_category_analysis,
+    "discount_profit_analysis": plot_discount_profit,
+}
+
+
+def input_hash(name, args):
+    """Content hash of a chart's inputs."""
+    digest = hashlib.sha256(f"{name}:{RENDER_VERSION}".encode())
+    digest.update(pickle.dumps(args, protocol=4))
+    return digest.hexdigest()
+
+
+def _render(name, args, path):
+    with span(f"render.{name}", path=path):
+        CHARTS[name](*args, path)
+    return name
+
+
+def _pool_context():
+    # Workers must not re-import the calling script (the EDA runs at import
+    # time), which rules out "spawn"; without "fork", render in-process
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+
+@instrumented("render.charts", rows=len)
+def render_charts(jobs, output_dir="results", workers=None):
+    """Render ``jobs`` (``{name: args}``) into ``output_dir/<name>.png``.
+
+    Returns the names of the charts that were actually re-rendered.
+    """
+    cache_path = os.path.join(output_dir, CACHE_FILE)
+    try:
+        with open(cache_path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+
+    pending = {}
+    for name, args in jobs.items():
+        path = os.path.join(output_dir, f"{name}.png")
+        digest = input_hash(name, args)
+        if cache.get(name) == digest and os.path.exists(path):
+            continue
+        pending[name] = (args, path, digest)
+
+    context = _pool_context()
+    if len(pending) > 1 and workers != 1 and context is not None:
+        with ProcessPoolExecutor(
+            max_workers=min(workers or os.cpu_count(), len(pending)), mp_context=context
+        ) as pool:
+            futures = [pool.submit(_render, name, args, path) for name, (args, path, _) in pending.items()]
+            for future in futures:
+                future.result()
+    else:
+        for name, (args, path, _) in pending.items():
+            _render(name, args, path)
+
+    cache.update({name: digest for name, (_, _, digest) in pending.items()})
+    # Written aside and renamed, so an interrupted run never leaves half a file
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, cache_path)
+    return list(pending)
@@ -0,0 +1,132 @@
+"""Size-bounded rendering of the Discount vs Profit scatter.
+
+Shipping one SVG marker per line item stalls the browser past ~100k points.
+``discount_profit_traces`` picks a representation from the number of rows:
+
+- ``"svg"``: plain ``go.Scatter`` markers, as before, for small selections;
+- ``"webgl"``: the same markers drawn with ``go.Scattergl``;
+- ``"density"``: a server-side 2D histogram sent as a ``go.Heatmap``, whose
+  size depends only on the bin counts;
+- ``"sample"``: a sample stratified by discount level, capped at ``max_points``.
+
+Whatever the representation, the least-squares trend line is fitted on all rows.
+"""
+import numpy as np
+import plotly.graph_objects as go
+
+WEBGL_THRESHOLD = 5_000
+DENSITY_THRESHOLD = 100_000
+MAX_SAMPLE_POINTS = 20_000
+DENSITY_BINS = (40, 80)
+MODES = ("auto", "svg", "webgl", "density", "sample")
+
+
+def choose_mode(n_rows, webgl_threshold=WEBGL_THRESHOLD, density_threshold=DENSITY_THRESHOLD):
+    if n_rows > density_threshold:
+        return "density"
+    if n_rows > webgl_threshold:
+        return "webgl"
+    return "svg"
+
+
+def stratified_sample(strata, max_points, seed=0):
+    """Row positions of at most ``max_points`` rows, every stratum represented proportionally.
+
+    Each stratum keeps at least one row; when those minimums push the total
+    past ``max_points`` the largest quotas are capped at the highest level
+    that still fits (and with more strata than points, a random subset of
+    strata keeps one row each).
+    """
+    n = len(strata)
+    if n <= max_points:
+        return np.arange(n)
+    rng = np.random.default_rng(seed)
+    labels, inverse, counts = np.unique(strata, return_inverse=True, return_counts=True)
+    quota = np.maximum(1, np.floor(counts * max_points / n)).astype(np.int64)
+    if len(quota) > max_points:
+        quota = np.zeros_like(quota)
+        quota[rng.choice(len(counts), max_points, replace=False)] = 1
+    elif quota.sum() > max_points:
+        # Total of min(quota, level) for every level, from the sorted quotas
+        ordered = np.sort(quota)
+        below = np.concatenate(([0], np.cumsum(ordered)))
+        levels = np.arange(1, ordered[-1] + 1)
+        smaller = np.searchsorted(ordered, levels)
+        totals = below[smaller] + levels * (len(ordered) - smaller)
+        quota = np.minimum(quota, levels[totals <= max_points].max())
+    # Random rank of each row within its stratum; keep ranks below the quota
+    order = np.lexsort((rng.random(n), inverse))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n) - np.repeat(starts, counts)
+    return np.flatnonzero(rank < quota[inverse])
+
+
+def trend_line(discount, profit):
+    """Exact least-squares trend of Profit on Discount, as a two-point line trace."""
+    if len(discount) < 2 or np.ptp(discount) == 0:
+        return None
+    slope, intercept = np.polyfit(discount, profit, 1)
+    x = np.array([discount.min(), discount.max()])
+    return go.Scatter(
+        x=x,
+        y=slope * x + intercept,
+        mode="lines",
+        name="Trend",
+        line=dict(color="red", dash="dash"),
+    )
+
+
+def discount_profit_traces(
+    discount,
+    profit,
+    sales,
+    mode="auto",
+    webgl_threshold=WEBGL_THRESHOLD,
+    density_threshold=DENSITY_THRESHOLD,
+    max_points=MAX_SAMPLE_POINTS,
+    bins=DENSITY_BINS,
+):
+    discount = np.asarray(discount, dtype=np.float64)
+    profit = np.asarray(profit, dtype=np.float64)
+    sales = np.asarray(sales, dtype=np.float64)
+    if mode not in MODES:
+        raise ValueError(f"Unknown scatter mode {mode!r}; expected one of {MODES}")
+    if mode == "auto":
+        mode = choose_mode(len(discount), webgl_threshold, density_threshold)
+
+    marker = dict(size=8, colorscale="Viridis", showscale=True)
+    if mode == "density":
+        counts, x_edges, y_edges = np.histogram2d(discount, profit, bins=bins)
+        traces = [
+            go.Heatmap(
+                x=(x_edges[:-1] + x_edges[1:]) / 2,
+                y=(y_edges[:-1] + y_edges[1:]) / 2,
+                # Heatmap rows run along y; empty bins are left transparent
+                z=np.where(counts.T > 0, counts.T, np.nan),
+                colorscale="Viridis",
+                colorbar=dict(title="Line Items"),
+                name="Density",
+            )
+        ]
+    elif mode == "sample":
+        rows = stratified_sample(np.round(discount, 2), max_points)
+        traces = [
+            go.Scattergl(
+                x=discount[rows],
+                y=profit[rows],
+                mode="markers",
+                marker=dict(marker, color=sales[rows]),
+                name=f"Sample ({len(rows):,} of {len(discount):,})",
+            )
+        ]
+    else:
+        scatter = go.Scattergl if mode == "webgl" else go.Scatter
+        traces = [
+            scatter(x=discount, y=profit, mode="markers", marker=dict(marker, color=sales))
+        ]
+
+    line = trend_line(discount, profit)
+    if line is not None:
+        traces.append(line)
+    return traces
@@ -0,0 +1,537 @@
+"""Embedded SQLite backend: the export as an indexed star schema.
+
+The dataset is bulk-loaded into a SQLite file next to the columnar cache:
+
+- ``fact_sales``: one row per line item with the measures, dates, Ship Mode
+  and keys into the dimensions. Region and Category are also kept on the fact
+  rows so the dashboard filters are answered by a covering index on
+  ``(region, category, order_date)`` without joins;
+- ``dim_customer`` (ID, name, Segment), ``dim_product`` (ID, name, Category,
+  Sub-Category) and ``dim_geography`` (Country, City, State, Postal Code,
+  Region).
+
+Loading goes through batched ``executemany`` inserts into a temporary file with
+journaling off, builds the indexes once the rows are in, runs ``ANALYZE`` and
+renames the file into place. Queries run on read-only connections taken from
+a small pool, and push the filters and aggregation down to SQLite.
+
+:class:`SqlStore` answers the aggregates the dashboard reads from the
+time-series store (``cross_sums``, ``distinct_orders``, ``series``) and the
+cube rollups behind ``analysis_results.txt``, so either backend can be swapped
+in. Build the database and compare it with the in-memory pandas path::
+
+    python sql_store.py [source] [--repeat 20]
+"""
+import argparse
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+import data_loader
+from data_loader import DEFAULT_SOURCE, cache_dir_for, cache_lock, dataset_version, load_superstore
+from instrumentation import instrumented
+
+ALL = "All"
+# Aggregate backend of the dashboard and superstore_analysis.py: "arrays"
+# (prefix sums and cube) or "sql" (this module)
+BACKEND_ENV = "SUPERSTORE_BACKEND"
+SCHEMA_VERSION = 1
+BATCH_ROWS = 50_000
+DEFAULT_POOL_SIZE = 8
+# Seconds a query waits for a pooled connection before giving up
+DEFAULT_POOL_TIMEOUT = 30
+MEASURES = ["Sales", "Profit", "Quantity"]
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE dim_customer (
+    customer_key INTEGER PRIMARY KEY,
+    customer_id TEXT NOT NULL,
+    customer_name TEXT,
+    segment TEXT NOT NULL
+);
+CREATE TABLE dim_product (
+    product_key INTEGER PRIMARY KEY,
+    product_id TEXT NOT NULL,
+    product_name TEXT,
+    category TEXT NOT NULL,
+    sub_category TEXT NOT NULL
+);
+CREATE TABLE dim_geography (
+    geography_key INTEGER PRIMARY KEY,
+    country TEXT NOT NULL,
+    city TEXT NOT NULL,
+    state TEXT NOT NULL,
+    postal_code INTEGER,
+    region TEXT NOT NULL
+);
+CREATE TABLE fact_sales (
+    row_id INTEGER PRIMARY KEY,
+    order_id TEXT NOT NULL,
+    order_date TEXT NOT NULL,
+    ship_date TEXT NOT NULL,
+    ship_mode TEXT NOT NULL,
+    customer_key INTEGER NOT NULL REFERENCES dim_customer,
+    product_key INTEGER NOT NULL REFERENCES dim_product,
+    geography_key INTEGER NOT NULL REFERENCES dim_geography,
+    region TEXT NOT NULL,
+    category TEXT NOT NULL,
+    sales REAL NOT NULL,
+    quantity INTEGER NOT NULL,
+    discount REAL NOT NULL,
+    profit REAL NOT NULL
+);
+"""
+
+# Built after the bulk load. The filter index covers every column the
+# dashboard aggregates read; the date index serves date-only filters.
+INDEXES = """
+CREATE INDEX fact_filter ON fact_sales (region, category, order_date, sales, profit, order_id);
+CREATE INDEX fact_date ON fact_sales (order_date, region, category, sales, profit, order_id);
+CREATE INDEX fact_customer ON fact_sales (customer_key);
+CREATE INDEX fact_product ON fact_sales (product_key);
+"""
+
+# Dataset column -> (SQL expression, dimension table it needs joined)
+DIMENSIONS = {
+    "Region": ("f.region", None),
+    "Category": ("f.category", None),
+    "Ship Mode": ("f.ship_mode", None),
+    "Month": ("substr(f.order_date, 1, 7)", None),
+    "Segment": ("c.segment", "dim_customer c ON c.customer_key = f.customer_key"),
+    "Sub-Category": ("p.sub_category", "dim_product p ON p.product_key = f.product_key"),
+    "State": ("g.state", "dim_geography g ON g.geography_key = f.geography_key"),
+    "City": ("g.city", "dim_geography g ON g.geography_key = f.geography_key"),
+}
+COLUMNS = {"Sales": "f.sales", "Profit": "f.profit", "Quantity": "f.quantity", "Discount": "f.discount"}
+# Period key of each series frequency, on the ISO date strings
+PERIOD_KEYS = {
+    "D": "f.order_date",
+    # Weeks are labelled by their Monday, as in the time-series store
+    "W": "date(f.order_date, 'weekday 0', '-6 days')",
+    "M": "substr(f.order_date, 1, 7)",
+    "Q": "substr(f.order_date, 1, 4) || 'Q' || ((CAST(substr(f.order_date, 6, 2) AS INTEGER) + 2) / 3)",
+    "Y": "substr(f.order_date, 1, 4)",
+}
+
+
+def _iso_days(values):
+    return pd.DatetimeIndex(values).strftime("%Y-%m-%d").to_numpy(dtype=object)
+
+
+def _day(value):
+    return pd.Timestamp(value).strftime("%Y-%m-%d")
+
+
+def _dimension_rows(df, columns):
+    """Surrogate key of every line and the distinct rows of ``columns``."""
+    keys, uniques = pd.MultiIndex.from_frame(df[columns]).factorize()
+    return keys + 1, uniques.to_frame(index=False, name=columns)
+
+
+def _insert(connection, table, columns, values, batch_rows=BATCH_ROWS):
+    """Batched ``executemany`` of column arrays into ``table``."""
+    statement = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    n_rows = len(values[0])
+    for start in range(0, n_rows, batch_rows):
+        batch = [np.asarray(v[start:start + batch_rows]).tolist() for v in values]
+        connection.executemany(statement, zip(*batch))
+
+
+@instrumented("sql.build", rows=len)
+def build(df, path, version=None, batch_rows=BATCH_ROWS):
+    """Write ``df`` as a fresh star-schema database at ``path``."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    connection = sqlite3.connect(tmp_path)
+    try:
+        connection.executescript("PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;" + SCHEMA)
+        customer_key, customers = _dimension_rows(df, ["Customer ID", "Customer Name", "Segment"])
+        product_key, products = _dimension_rows(df, ["Product ID", "Product Name", "Category", "Sub-Category"])
+        geography_key, places = _dimension_rows(df, ["Country", "City", "State", "Postal Code", "Region"])
+        with connection:
+            _insert(connection, "dim_customer", ["customer_key", "customer_id", "customer_name", "segment"],
+                    [np.arange(1, len(customers) + 1)] + [customers[c].astype(str) for c in customers])
+            _insert(connection, "dim_product",
+                    ["product_key", "product_id", "product_name", "category", "sub_category"],
+                    [np.arange(1, len(products) + 1)] + [products[c].astype(str) for c in products])
+            _insert(connection, "dim_geography",
+                    ["geography_key", "country", "city", "state", "postal_code", "region"],
+                    [np.arange(1, len(places) + 1)]
+                    + [places[c].astype(str) for c in ["Country", "City", "State"]]
+                    + [[None if pd.isna(code) else int(code) for code in places["Postal Code"]],
+                       places["Region"].astype(str)])
+            _insert(connection, "fact_sales", [
+                "row_id", "order_id", "order_date", "ship_date", "ship_mode", "customer_key",
+                "product_key", "geography_key", "region", "category", "sales", "quantity",
+                "discount", "profit",
+            ], [
+                df["Row ID"].to_numpy(dtype=np.int64),
+                df["Order ID"].astype(str).to_numpy(dtype=object),
+                _iso_days(df["Order Date"]),
+                _iso_days(df["Ship Date"]),
+                df["Ship Mode"].astype(str).to_numpy(dtype=object),
+                customer_key, product_key, geography_key,
+                df["Region"].astype(str).to_numpy(dtype=object),
+                df["Category"].astype(str).to_numpy(dtype=object),
+                df["Sales"].to_numpy(dtype=np.float64),
+                df["Quantity"].to_numpy(dtype=np.int64),
+                df["Discount"].to_numpy(dtype=np.float64),
+                df["Profit"].to_numpy(dtype=np.float64),
+            ], batch_rows)
+            connection.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("schema_version", str(SCHEMA_VERSION)), ("dataset_version", version or ""),
+            ])
+        connection.executescript(INDEXES + "ANALYZE;")
+    except BaseException:
+        connection.close()
+        os.remove(tmp_path)
+        raise
+    connection.close()
+    os.replace(tmp_path, path)
+    return df
+
+
+def _read_meta(path):
+    try:
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    except sqlite3.Error:
+        return {}
+    try:
+        return dict(connection.execute("SELECT key, value FROM meta"))
+    except sqlite3.Error:
+        return {}
+    finally:
+        connection.close()
+
+
+def is_current(path, version=None):
+    """True when the database at ``path`` was built from dataset ``version``."""
+    meta = _read_meta(path) if os.path.exists(path) else {}
+    return meta.get("schema_version") == str(SCHEMA_VERSION) and meta.get("dataset_version") == (version or "")
+
+
+class ConnectionPool:
+    """Read-only connections to one database file, shared across threads.
+
+    Connections are opened on demand up to ``size`` and reused; a process
+    forked with the pool in place opens its own instead of sharing them.
+    With all ``size`` connections busy a caller waits up to ``timeout``
+    seconds for one to come back, then gets a ``TimeoutError``.
+    """
+
+    def __init__(self, path, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _open(self):
+        connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        connection.execute("PRAGMA query_only = ON")
+        connection.execute("PRAGMA mmap_size = 268435456")
+        return connection
+
+    def _reset_after_fork(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._idle = queue.LifoQueue()
+                self._opened = 0
+                self._pid = os.getpid()
+
+    @contextmanager
+    def connection(self):
+        self._reset_after_fork()
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.size
+                self._opened += can_open
+            if can_open:
+                connection = self._open()
+            else:
+                try:
+                    connection = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError(
+                        f"no free connection to {self.path} after {self.timeout}s ({self.size} in use)"
+                    ) from None
+        try:
+            yield connection
+        finally:
+            self._idle.put(connection)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        self._opened = 0
+
+
+class SqlStore:
+    # Order IDs are counted exactly by the database, whatever their dates
+    exact_orders = True
+
+    def __init__(self, path, pool_size=DEFAULT_POOL_SIZE):
+        self.path = path
+        self.pool = ConnectionPool(path, pool_size)
+        self.labels = {
+            dim: np.asarray(self.query(f"SELECT DISTINCT {column} FROM fact_sales ORDER BY 1")[0], dtype=str)
+            for dim, column in (("Region", "region"), ("Category", "category"))
+        }
+
+    def query(self, sql, params=()):
+        """Result columns of ``sql`` as a list of tuples (one per column)."""
+        with self.pool.connection() as connection:
+            cursor = connection.execute(sql, params)
+            rows = cursor.fetchall()
+        return list(zip(*rows)) if rows else [()] * len(cursor.description)
+
+    @staticmethod
+    def _where(region=ALL, category=ALL, start_date=None, end_date=None):
+        clauses, params = [], []
+        for column, value in (("f.region", region), ("f.category", category)):
+            if value not in (None, ALL):
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if start_date:
+            clauses.append("f.order_date >= ?")
+            params.append(_day(start_date))
+        if end_date:
+            clauses.append("f.order_date <= ?")
+            params.append(_day(end_date))
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    @instrumented("sql.cross_sums")
+    def cross_sums(self, start_date=None, end_date=None, measures=("Sales", "Profit")):
+        """Region x Category totals of a date range, like ``TimeSeriesStore.cross_sums``."""
+        where, params = self._where(start_date=start_date, end_date=end_date)
+        regions, categories = self.labels["Region"], self.labels["Category"]
+        columns = self.query(
+            f"SELECT f.region, f.category, count(*), "
+            f"{', '.join(f'sum({COLUMNS[m]})' for m in measures)} "
+            f"FROM fact_sales f{where} GROUP BY f.region, f.category", params
+        )
+        row = np.searchsorted(regions, np.asarray(columns[0], dtype=str))
+        col = np.searchsorted(categories, np.asarray(columns[1], dtype=str))
+        counts = np.zeros((len(regions), len(categories)), dtype=np.int64)
+        counts[row, col] = columns[2]
+        sums = {}
+        for measure, values in zip(measures, columns[3:]):
+            sums[measure] = np.zeros(counts.shape)
+            sums[measure][row, col] = values
+        return regions.astype(object), categories.astype(object), sums, counts
+
+    @instrumented("sql.distinct_orders")
+    def distinct_orders(self, region=ALL, category=ALL, start_date=None, end_date=None):
+        where, params = self._where(region, category, start_date, end_date)
+        (count,), = self.query(f"SELECT count(DISTINCT f.order_id) FROM fact_sales f{where}", params)
+        return int(count)
+
+    @instrumented("sql.series")
+    def series(self, freq="M", region=ALL, category=ALL, start_date=None, end_date=None,
+               measures=("Sales", "Profit"), drop_empty=True):
+        """Per-period totals like ``TimeSeriesStore.series`` (``freq`` one of D, W, M, Q, Y).
+
+        Only periods with line items are returned, whatever ``drop_empty``.
+        """
+        if freq not in PERIOD_KEYS:
+            raise ValueError(f"unknown frequency {freq!r}; expected one of {list(PERIOD_KEYS)}")
+        key = PERIOD_KEYS[freq]
+        where, params = self._where(region, category, start_date, end_date)
+        columns = self.query(
+            f"SELECT {key}, count(*), {', '.join(f'sum({COLUMNS[m]})' for m in measures)} "
+            f"FROM fact_sales f{where} GROUP BY 1 ORDER BY 1", params
+        )
+        values = {m: np.asarray(v, dtype=np.float64) for m, v in zip(measures, columns[2:])}
+        values["Count"] = np.asarray(columns[1], dtype=np.int64)
+        return np.asarray(columns[0], dtype=object), values
+
+    @instrumented("sql.rollup", rows=len)
+    def rollup(self, by=(), filters=None, start_date=None, end_date=None):
+        """Sales, Profit, Quantity and line Count per group, like ``SalesCube.rollup``."""
+        by = list(by)
+        filters = filters or {}
+        where, params = self._where(
+            filters.get("Region", ALL), filters.get("Category", ALL), start_date, end_date
+        )
+        joins = {DIMENSIONS[dim][1] for dim in by if DIMENSIONS[dim][1]}
+        keys = [DIMENSIONS[dim][0] for dim in by]
+        sql = (
+            f"SELECT {''.join(f'{k}, ' for k in keys)}"
+            f"{', '.join(f'sum({COLUMNS[m]})' for m in MEASURES)}, count(*) "
+            f"FROM fact_sales f{''.join(f' JOIN {join}' for join in sorted(joins))}{where}"
+        )
+        if keys:
+            sql += f" GROUP BY {', '.join(keys)} ORDER BY {', '.join(keys)}"
+        columns = self.query(sql, params)
+        result = pd.DataFrame({dim: pd.Series(values, dtype=str) for dim, values in zip(by, columns)})
+        for measure, values in zip(MEASURES, columns[len(by):]):
+            result[measure] = np.asarray(values, dtype=np.float64)
+        result["Count"] = np.asarray(columns[-1], dtype=np.int64)
+        return result
+
+    @instrumented("sql.correlation")
+    def correlation(self, x="Discount", y="Profit"):
+        """Pearson correlation of two columns, from centred sums computed in SQL."""
+        x, y = COLUMNS[x], COLUMNS[y]
+        (sxy,), (sxx,), (syy,) = self.query(
+            f"SELECT sum(({x} - m.x) * ({y} - m.y)), sum(({x} - m.x) * ({x} - m.x)), "
+            f"sum(({y} - m.y) * ({y} - m.y)) "
+            f"FROM fact_sales f, (SELECT avg({x}) AS x, avg({y}) AS y FROM fact_sales f) m"
+        )
+        return sxy / np.sqrt(sxx * syy)
+
+    def close(self):
+        self.pool.close()
+
+
+def database_path_for(source=DEFAULT_SOURCE):
+    return os.path.join(cache_dir_for(source), "superstore.sqlite")
+
+
+def load_or_build(source=DEFAULT_SOURCE, path=None, rebuild=False, pool_size=DEFAULT_POOL_SIZE):
+    """Open the database kept for ``source``, (re)building it when stale.
+
+    Needs the full dataset (text columns included) only when building.
+    """
+    path = path or database_path_for(source)
+    if not data_loader.is_fresh(source, cache_dir_for(source)):
+        # Refresh the columnar cache first, it identifies the dataset version
+        load_superstore(source)
+    version = dataset_version(source)
+    if rebuild or not is_current(path, version):
+        with cache_lock(os.path.dirname(path) or "."):
+            if rebuild or not is_current(path, version):
+                build(load_superstore(source), path, version)
+    return SqlStore(path, pool_size)
+
+
+# Filter combinations compared between the two paths
+COMPARE_FILTERS = [
+    ("All", "All", None, None),
+    ("West", "Furniture", None, None),
+    ("East", "All", "2016-01-01", "2016-12-31"),
+    ("All", "Technology", "2015-03-15", "2017-06-20"),
+]
+
+
+def pandas_queries(df):
+    """The analysis metrics and dashboard filters, computed on the DataFrame."""
+
+    def filtered(region, category, start_date, end_date):
+        mask = np.ones(len(df), dtype=bool)
+        if region != ALL:
+            mask &= (df["Region"] == region).to_numpy()
+        if category != ALL:
+            mask &= (df["Category"] == category).to_numpy()
+        if start_date:
+            mask &= (df["Order Date"] >= pd.Timestamp(start_date)).to_numpy()
+        if end_date:
+            mask &= (df["Order Date"] <= pd.Timestamp(end_date)).to_numpy()
+        return df[mask]
+
+    def dashboard(region, category, start_date, end_date):
+        rows = filtered(region, category, start_date, end_date)
+        in_range = filtered(ALL, ALL, start_date, end_date)
+        return (
+            rows["Sales"].sum(), rows["Profit"].sum(), rows["Order ID"].nunique(),
+            in_range.groupby(["Region", "Category"], observed=True)[["Sales", "Profit"]].sum(),
+            filtered(region, category, None, None)
+            .groupby(df["Order Date"].dt.strftime("%Y-%m"))[["Sales", "Profit"]].sum(),
+        )
+
+    return {
+        "analysis": lambda: (
+            df.groupby("Region", observed=True)[["Sales", "Profit"]].sum(),
+            df.groupby("Category", observed=True)[["Sales", "Profit"]].sum(),
+            df.groupby("Segment", observed=True).agg({"Sales": "sum", "Profit": "sum", "Order ID": "count"}),
+            df.groupby(df["Order Date"].dt.strftime("%Y-%m"))["Sales"].sum(),
+            df["Discount"].corr(df["Profit"]),
+        ),
+        "dashboard": lambda: [dashboard(*filters) for filters in COMPARE_FILTERS],
+    }
+
+
+def sql_queries(store):
+    """The same queries pushed down to SQLite."""
+
+    def dashboard(region, category, start_date, end_date):
+        regions, categories, sums, counts = store.cross_sums(start_date, end_date)
+        in_region = regions == region if region != ALL else np.ones(len(regions), dtype=bool)
+        in_category = categories == category if category != ALL else np.ones(len(categories), dtype=bool)
+        cells = np.ix_(in_region, in_category)
+        return (
+            sums["Sales"][cells].sum(), sums["Profit"][cells].sum(),
+            store.distinct_orders(region, category, start_date, end_date),
+            sums, store.series("M", region, category),
+        )
+
+    return {
+        "analysis": lambda: (
+            store.rollup(["Region"]), store.rollup(["Category"]), store.rollup(["Segment"]),
+            store.rollup(["Month"]), store.correlation("Discount", "Profit"),
+        ),
+        "dashboard": lambda: [dashboard(*filters) for filters in COMPARE_FILTERS],
+    }
+
+
+def _median_ms(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the SQLite star schema and compare it with pandas")
+    parser.add_argument("source", nargs="?", default=DEFAULT_SOURCE)
+    parser.add_argument("--rebuild", action="store_true")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    store = load_or_build(args.source, rebuild=args.rebuild)
+    print(f"Database {store.path} ready in {time.perf_counter() - start:.2f}s "
+          f"({os.path.getsize(store.path) / (1 << 20):.1f} MiB)")
+
+    df = load_superstore(args.source)
+    for name, sql, pandas in zip(
+        ("analysis", "dashboard"), sql_queries(store).values(), pandas_queries(df).values()
+    ):
+        sql_ms, pandas_ms = _median_ms(sql, args.repeat), _median_ms(pandas, args.repeat)
+        print(f"{name:<10} pandas {pandas_ms:8.2f} ms   sqlite {sql_ms:8.2f} ms   ({pandas_ms / sql_ms:.1f}x)")
+
+    # The pushed-down results must match the DataFrame ones
+    (regional, _, segments, monthly, correlation) = sql_queries(store)["analysis"]()
+    assert np.allclose(regional["Sales"], df.groupby("Region", observed=True)["Sales"].sum().sort_index())
+    assert np.allclose(segments["Count"], df.groupby("Segment", observed=True).size().sort_index())
+    assert np.allclose(monthly["Sales"], df.groupby(df["Order Date"].dt.strftime("%Y-%m"))["Sales"].sum())
+    assert np.isclose(correlation, df["Discount"].corr(df["Profit"]))
+    for filters, (sales, profit, orders, _, _), (p_sales, p_profit, p_orders, _, _) in zip(
+        COMPARE_FILTERS, sql_queries(store)["dashboard"](), pandas_queries(df)["dashboard"]()
+    ):
+        assert np.isclose(sales, p_sales) and np.isclose(profit, p_profit) and orders == p_orders, filters
+    print("Results match.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Mergeable partial aggregates for exports that do not fit in memory.
+
+``StreamingAggregator`` consumes the Superstore export one chunk at a time and
+keeps, besides the current chunk, state whose size depends on the number of
+groups rather than rows:
+
+- a :class:`~olap_cube.SalesCube` (regional / category / segment / monthly sums
+  and counts);
+- :class:`Moments`, the running means and co-moment matrix of the numeric
+  columns, which give the correlation heatmap and the Discount/Profit trend;
+- null counts and a uniform row sample for the scatter plot;
+- the discount impact block sums per Sub-Category x Region
+  (:func:`discount_impact.partial_sums`), at most ``N_BLOCKS`` rows per group.
+
+Two exact counts are the exception and grow with the data, 8 bytes per item:
+
+- one 64-bit hash per row for duplicate detection (``rows x 8 B``, about
+  80 MB per 10 million rows);
+- the set of hashed ``Order ID`` values per Segment, for exact distinct
+  order counts (``distinct orders x 8 B``).
+
+Both are a small fraction of the parsed rows they stand for, but an export
+with billions of rows needs a sketch or an external sort instead.
+
+Two aggregators built over disjoint rows can be combined with ``merge``.
+"""
+import numpy as np
+import pandas as pd
+
+import discount_impact
+from data_loader import DATE_COLUMNS, parse_dates
+from distinct_count import hash_values
+from instrumentation import span
+from olap_cube import SalesCube
+
+DEFAULT_CHUNKSIZE = 100_000
+SAMPLE_COLUMNS = ["Discount", "Profit", "Sales"]
+
+
+class Moments:
+    """Running count, means and co-moment matrix of a fixed set of columns.
+
+    Batches are folded in with the pairwise update of Chan, Golub & LeVeque
+    (the multivariate form of Welford's algorithm), so the result does not
+    depend on how the rows were split.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        k = len(self.columns)
+        self.n = 0
+        self.mean = np.zeros(k)
+        self.comoment = np.zeros((k, k))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values).any(axis=1)]
+        if not len(values):
+            return
+        batch = Moments(self.columns)
+        batch.n = len(values)
+        batch.mean = values.mean(axis=0)
+        centered = values - batch.mean
+        batch.comoment = centered.T @ centered
+        self.merge(batch)
+
+    def merge(self, other):
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.n, self.mean, self.comoment = other.n, other.mean.copy(), other.comoment.copy()
+            return self
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.comoment = self.comoment + other.comoment + np.outer(delta, delta) * (
+            self.n * other.n / n
+        )
+        self.mean = self.mean + delta * (other.n / n)
+        self.n = n
+        return self
+
+    def to_dict(self):
+        return {
+            "columns": self.columns,
+            "n": self.n,
+            "mean": self.mean.tolist(),
+            "comoment": self.comoment.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        moments = cls(state["columns"])
+        moments.n = state["n"]
+        moments.mean = np.asarray(state["mean"], dtype=np.float64)
+        moments.comoment = np.asarray(state["comoment"], dtype=np.float64)
+        return moments
+
+    def covariance(self):
+        return pd.DataFrame(self.comoment / (self.n - 1), index=self.columns, columns=self.columns)
+
+    def correlation(self):
+        std = np.sqrt(np.diag(self.comoment))
+        corr = self.comoment / np.outer(std, std)
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+    def linear_fit(self, x, y):
+        """Least-squares ``(slope, intercept)`` of ``y`` on ``x``, as ``np.polyfit(x, y, 1)``."""
+        i, j = self.columns.index(x), self.columns.index(y)
+        slope = self.comoment[i, j] / self.comoment[i, i]
+        return slope, self.mean[j] - slope * self.mean[i]
+
+
+class StreamingAggregator:
+    def __init__(self, sample_size=20_000, seed=0):
+        self.rows = 0
+        self.cube = None
+        self.moments = None
+        self.null_counts = None
+        self.row_hashes = []
+        self.sample = None
+        # Regions in first-seen order, as ``df["Region"].unique()`` would list them
+        self.region_order = []
+        self.segment_orders = {}
+        self.discount_sums = None
+        self.sample_size = sample_size
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, chunk):
+        for col in DATE_COLUMNS:
+            if col in chunk.columns and not pd.api.types.is_datetime64_any_dtype(chunk[col]):
+                chunk[col] = parse_dates(chunk[col])
+
+        self.rows += len(chunk)
+        self._add_regions(chunk["Region"].unique())
+        cube = SalesCube.from_frame(chunk)
+        self.cube = cube if self.cube is None else self.cube.merge(cube)
+
+        if self.moments is None:
+            self.moments = Moments(chunk.select_dtypes(include=[np.number]).columns)
+        self.moments.update(chunk[self.moments.columns].to_numpy(dtype=np.float64))
+
+        nulls = chunk.isnull().sum()
+        self.null_counts = nulls if self.null_counts is None else self.null_counts.add(nulls, fill_value=0)
+
+        self.row_hashes.append(pd.util.hash_pandas_object(chunk, index=False).to_numpy())
+
+        order_hashes = pd.Series(hash_values(chunk["Order ID"]), index=chunk.index)
+        for segment, hashes in order_hashes.groupby(chunk["Segment"]):
+            self._add_orders(segment, np.unique(hashes.to_numpy()))
+
+        self.discount_sums = discount_impact.merge_sums(self.discount_sums, discount_impact.partial_sums(chunk))
+
+        # Uniform sample: every row draws a random key, the smallest keys survive
+        sample = chunk[SAMPLE_COLUMNS].copy()
+        sample["_key"] = self._rng.random(len(sample))
+        self._add_sample(sample)
+        return self
+
+    def _add_orders(self, segment, hashes):
+        seen = self.segment_orders.get(segment)
+        self.segment_orders[segment] = hashes if seen is None else np.union1d(seen, hashes)
+
+    def _add_regions(self, regions):
+        self.region_order.extend(r for r in regions if r not in self.region_order)
+
+    def _add_sample(self, sample):
+        if self.sample is not None:
+            sample = pd.concat([self.sample, sample], ignore_index=True)
+        self.sample = sample.nsmallest(self.sample_size, "_key").reset_index(drop=True)
+
+    def merge(self, other):
+        if other.rows == 0:
+            return self
+        if self.rows == 0:
+            self.__dict__.update(other.__dict__)
+            return self
+        self.rows += other.rows
+        self.cube = self.cube.merge(other.cube)
+        self.moments.merge(other.moments)
+        self.null_counts = self.null_counts.add(other.null_counts, fill_value=0)
+        self.row_hashes.extend(other.row_hashes)
+        self._add_regions(other.region_order)
+        for segment, hashes in other.segment_orders.items():
+            self._add_orders(segment, hashes)
+        self.discount_sums = discount_impact.merge_sums(self.discount_sums, other.discount_sums)
+        self._add_sample(other.sample)
+        return self
+
+    @property
+    def unique_orders_by_segment(self):
+        counts = {segment: len(hashes) for segment, hashes in sorted(self.segment_orders.items())}
+        return pd.Series(counts, index=pd.Index(list(counts), dtype=object, name="Segment"))
+
+    @property
+    def duplicate_rows(self):
+        if not self.row_hashes:
+            return 0
+        hashes = np.concatenate(self.row_hashes)
+        return int(len(hashes) - len(np.unique(hashes)))
+
+    @classmethod
+    def from_csv(cls, source, chunksize=DEFAULT_CHUNKSIZE, **kwargs):
+        aggregator = cls(**kwargs)
+        for chunk in pd.read_csv(source, encoding="latin1", chunksize=chunksize):
+            with span("stream.chunk") as s:
+                s.rows = len(chunk)
+                aggregator.update(chunk)
+        return aggregator
@@ -0,0 +1,144 @@
+"""Command-line entry point: ``superstore report | serve | summary``.
+
+Each subcommand imports only what it needs:
+
+- ``report`` runs the exploratory analysis (pandas, matplotlib);
+- ``serve`` runs the production dashboard server (Dash, plotly), which loads
+  the dataset on first use;
+- ``summary`` prints headline totals and breakdowns read from the persisted
+  sales cube with NumPy alone, so it starts in a fraction of a second. Only
+  when the cube is missing or was built from other data than the export does
+  it load the data (pandas) and rebuild the cube first.
+
+Installed with ``pip install -e .`` it is available as ``superstore``; without
+installing, run ``python superstore.py <subcommand>``.
+"""
+import argparse
+import os
+
+import numpy as np
+
+# pandas-free, unlike data_loader and olap_cube which re-export these names
+from cache_meta import DEFAULT_SOURCE, cached_version, cube_path_for, stamp_matches
+
+SUMMARY_DIMENSIONS = ["Region", "Category", "Segment"]
+
+
+def load_cube_arrays(source, cube_path):
+    """Cube arrays by name, rebuilding the cube first when it is stale.
+
+    Staleness follows ``olap_cube.load_or_build``: the cube must be stamped
+    with the ``dataset_version`` of the export, or with its current size and
+    mtime after an incremental ingestion.
+    """
+    arrays = None
+    if os.path.exists(cube_path):
+        with np.load(cube_path, allow_pickle=False) as data:
+            arrays = {key: data[key] for key in data.files}
+    current = False
+    if arrays is not None:
+        version = cached_version(source)
+        stamp = None
+        if "source_size" in arrays:
+            stamp = {"size": int(arrays["source_size"]), "mtime": float(arrays["source_mtime"])}
+        current = (version is not None and str(arrays.get("dataset_version")) == version) or stamp_matches(source, stamp)
+    if not current:
+        from data_loader import load_superstore
+        from olap_cube import load_or_build
+
+        load_or_build(load_superstore(source), cube_path, source)
+        with np.load(cube_path, allow_pickle=False) as data:
+            arrays = {key: data[key] for key in data.files}
+    return arrays
+
+
+def summarize_cube(arrays, dimensions=SUMMARY_DIMENSIONS):
+    """Totals plus Sales / Profit per label of each dimension."""
+    sales, profit, count = arrays["cell:Sales"], arrays["cell:Profit"], arrays["cell:Count"]
+    months = arrays["label:Month"]
+    summary = {
+        "totals": {"Sales": sales.sum(), "Profit": profit.sum(), "Count": int(count.sum())},
+        "months": (str(months[0]), str(months[-1])) if len(months) else (None, None),
+        "breakdowns": {},
+    }
+    for dim in dimensions:
+        labels = arrays[f"label:{dim}"]
+        codes = arrays[f"cell:{dim}"]
+        summary["breakdowns"][dim] = [
+            (str(label), s, p)
+            for label, s, p in zip(
+                labels,
+                np.bincount(codes, weights=sales, minlength=len(labels)),
+                np.bincount(codes, weights=profit, minlength=len(labels)),
+            )
+        ]
+    return summary
+
+
+def format_cube_summary(summary, source):
+    totals = summary["totals"]
+    first, last = summary["months"]
+    lines = [
+        f"{source}: {totals['Count']:,} line items, {first} to {last}",
+        "",
+        f"Total Sales: ${totals['Sales']:,.2f}",
+        f"Total Profit: ${totals['Profit']:,.2f}",
+        f"Average Order Value: ${totals['Sales'] / totals['Count']:,.2f}",
+        f"Profit Margin: {totals['Profit'] / totals['Sales'] * 100:,.2f}%",
+    ]
+    for dim, rows in summary["breakdowns"].items():
+        width = max(len(dim), *(len(label) for label, _, _ in rows))
+        lines += ["", f"{dim:<{width}}  {'Sales':>14}  {'Profit':>13}  {'Margin':>7}"]
+        for label, sales, profit in sorted(rows, key=lambda row: -row[1]):
+            margin = profit / sales * 100 if sales else 0.0
+            lines.append(f"{label:<{width}}  {sales:>14,.2f}  {profit:>13,.2f}  {margin:>6.2f}%")
+    return "\n".join(lines)
+
+
+def summary_main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Headline totals from the sales cube")
+    parser.add_argument("source", nargs="?", default=DEFAULT_SOURCE)
+    parser.add_argument("--cube", help="cube file (default: the one kept for the source)")
+    args = parser.parse_args(argv)
+    arrays = load_cube_arrays(args.source, args.cube or cube_path_for(args.source))
+    print(format_cube_summary(summarize_cube(arrays), args.source))
+
+
+def report_main(argv, prog):
+    import eda_superstore
+
+    eda_superstore.main(argv, prog)
+
+
+def serve_main(argv, prog):
+    import dashboard
+
+    dashboard.main(["--serve", *argv], prog)
+
+
+# Subcommand -> (entry point taking (argv, prog), help); each one parses its
+# own options, so nothing heavy is imported to build this parser
+COMMANDS = {
+    "report": (report_main, "write the analysis report and charts to results/"),
+    "serve": (serve_main, "serve the dashboard in production mode"),
+    "summary": (summary_main, "print headline totals from the sales cube"),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="superstore",
+        description="Superstore sales analysis",
+        epilog="Run 'superstore <command> --help' for the options of a command.",
+    )
+    parser.add_argument("command", choices=COMMANDS, help=", ".join(
+        f"{name}: {text}" for name, (_, text) in COMMANDS.items()
+    ))
+    parser.add_argument("args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    entry_point, _ = COMMANDS[args.command]
+    entry_point(args.args, f"superstore {args.command}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,13 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 from datetime import datetime
+import os
+
+from data_loader import load_superstore
+from olap_cube import load_or_build
+import sql_store
+from parallel_aggregation import (category_table, regional_table, segment_table,
+                                  write_analysis_results)
 
 # Set style for better visualizations
 plt.style.use('default')
@@ -10,7 +17,7 @@ sns.set_theme()
 
 # Read the dataset
 print("Loading the dataset...")
-df = pd.read_csv('Superstore.csv', encoding='latin1')
+df = load_superstore()
 
 # Display basic information
 print("\nDataset Info:")
@@ -26,9 +33,10 @@ print(df.isnull().sum())
 print("\nChecking for duplicates:")
 print(f"Number of duplicate rows: {df.duplicated().sum()}")
 
-# Convert date columns to datetime
-df['Order Date'] = pd.to_datetime(df['Order Date'])
-df['Ship Date'] = pd.to_datetime(df['Ship Date'])
+# Build (or load) the pre-aggregated cube that answers the breakdowns below;
+# with SUPERSTORE_BACKEND=sql they are pushed down to the SQLite database instead
+use_sql = os.environ.get(sql_store.BACKEND_ENV) == 'sql'
+cube = sql_store.load_or_build() if use_sql else load_or_build(df)
 
 # Basic Statistics
 print("\nBasic Statistics for Sales and Profit:")
@@ -41,10 +49,7 @@ if not os.path.exists('visualizations'):
 
 # 1. Sales and Profit Analysis by Region
 plt.figure(figsize=(12, 6))
-regional_metrics = df.groupby('Region').agg({
-    'Sales': 'sum',
-    'Profit': 'sum'
-}).reset_index()
+regional_metrics = regional_table(cube)
 
 # Create a bar plot
 x = np.arange(len(regional_metrics['Region']))
@@ -66,7 +71,7 @@ plt.close()
 
 # 2. Monthly Sales Trend
 plt.figure(figsize=(15, 6))
-monthly_sales = df.groupby(df['Order Date'].dt.to_period('M'))['Sales'].sum()
+monthly_sales = cube.rollup(['Month']).set_index('Month')['Sales']
 monthly_sales.plot(kind='line', marker='o')
 plt.title('Monthly Sales Trend')
 plt.xlabel('Month')
@@ -78,10 +83,7 @@ plt.close()
 
 # 3. Category and Sub-Category Analysis
 plt.figure(figsize=(15, 6))
-category_metrics = df.groupby('Category').agg({
-    'Sales': 'sum',
-    'Profit': 'sum'
-}).reset_index()
+category_metrics = category_table(cube)
 
 # Create a grouped bar plot
 x = np.arange(len(category_metrics['Category']))
@@ -112,36 +114,16 @@ plt.savefig('visualizations/discount_profit_analysis.png')
 plt.close()
 
 # Calculate correlation between discount and profit
-correlation = df['Discount'].corr(df['Profit'])
+correlation = cube.correlation('Discount', 'Profit') if use_sql else df['Discount'].corr(df['Profit'])
 print(f"\nCorrelation between Discount and Profit: {correlation:.2f}")
 
 # 5. Customer Segment Analysis
-segment_metrics = df.groupby('Segment').agg({
-    'Sales': 'sum',
-    'Profit': 'sum',
-    'Order ID': 'count'
-}).reset_index()
+segment_metrics = segment_table(cube)
 
 print("\nCustomer Segment Analysis:")
 print(segment_metrics)
 
 # Save the analysis results to a text file
-with open('analysis_results.txt', 'w') as f:
-    f.write("Superstore Sales Analysis Results\n")
-    f.write("================================\n\n")
-    
-    f.write("1. Regional Performance:\n")
-    f.write(regional_metrics.to_string())
-    f.write("\n\n")
-    
-    f.write("2. Category Performance:\n")
-    f.write(category_metrics.to_string())
-    f.write("\n\n")
-    
-    f.write("3. Customer Segment Analysis:\n")
-    f.write(segment_metrics.to_string())
-    f.write("\n\n")
-    
-    f.write(f"4. Discount-Profit Correlation: {correlation:.2f}\n")
+write_analysis_results(cube, correlation, 'analysis_results.txt')
 
 print("\nAnalysis complete! Check the 'visualizations' folder for plots and 'analysis_results.txt' for detailed metrics.") 
\ No newline at end of file
@@ -0,0 +1,245 @@
+"""Deterministic synthetic Superstore exports of any size.
+
+Synthetic orders are drawn from the real export, which keeps the schema and
+the joint distributions that matter to the analyses:
+
+- every synthetic order copies a real order's lines (basket size, products,
+  Region / Category / Sub-Category / Segment / Ship Mode mix, geography and
+  discounts come along together);
+- order dates are jittered around the template's date within the real date
+  range, and ship dates keep the template's shipping lag;
+- customers are drawn from a pool that grows with the row count, so customer
+  cardinality scales like order cardinality (IDs keep the ``AB-12345`` format
+  and every customer stays in one segment);
+- Sales are recomputed from each product's unit list price, quantity and
+  discount, and Profit from a per-Sub-Category linear model of margin on
+  discount fitted to the real rows, so the discount-profit relationship holds
+  at any scale.
+
+Rows are generated in chunks from ``(seed, chunk index)``, so a given seed and
+size always produce the same file, and 100M-row exports are written without
+holding them in memory::
+
+    python synthetic_data.py 1000000 cache/bench/superstore_1000000.csv
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DEFAULT_SOURCE, load_superstore
+
+DEFAULT_CHUNK_ROWS = 500_000
+DATE_JITTER_DAYS = 15
+COLUMNS = [
+    "Row ID", "Order ID", "Order Date", "Ship Date", "Ship Mode", "Customer ID",
+    "Customer Name", "Segment", "Country", "City", "State", "Postal Code", "Region",
+    "Product ID", "Category", "Sub-Category", "Product Name", "Sales", "Quantity",
+    "Discount", "Profit",
+]
+# Columns copied verbatim from the template line
+TEMPLATE_COLUMNS = [
+    "Ship Mode", "Segment", "Country", "City", "State", "Postal Code", "Region",
+    "Product ID", "Category", "Sub-Category", "Product Name",
+]
+
+
+class Profile:
+    """Order templates and fitted models taken from a real export."""
+
+    def __init__(self, df):
+        df = df.sort_values(["Order ID", "Row ID"], kind="stable").reset_index(drop=True)
+        order_codes, order_ids = pd.factorize(df["Order ID"])
+        self.template = df
+        self.n_real_rows = len(df)
+        self.order_start = np.flatnonzero(np.r_[True, order_codes[1:] != order_codes[:-1]])
+        self.order_size = np.diff(np.r_[self.order_start, len(df)])
+        self.order_prefix = np.asarray(order_ids.str[:2], dtype=object)
+
+        first = df.iloc[self.order_start]
+        self.order_day = first["Order Date"].to_numpy(dtype="datetime64[D]")
+        self.ship_lag = (first["Ship Date"].to_numpy(dtype="datetime64[D]") - self.order_day).astype(np.int64)
+        self.first_day = self.order_day.min()
+        self.last_day = self.order_day.max()
+
+        # Customer templates: name and segment of every real customer
+        customers = df.drop_duplicates("Customer ID")
+        self.customer_names = np.asarray(customers["Customer Name"], dtype=object)
+        self.customer_segments = np.asarray(customers["Segment"], dtype=object)
+        self.segments = np.unique(self.customer_segments)
+        self.order_segment = np.searchsorted(self.segments, np.asarray(first["Segment"], dtype=object))
+
+        # Unit list price per line (Sales = price * quantity * (1 - discount))
+        self.unit_price = (
+            df["Sales"].to_numpy(dtype=np.float64)
+            / (df["Quantity"].to_numpy(dtype=np.float64) * (1 - df["Discount"].to_numpy(dtype=np.float64)))
+        )
+
+        # Margin = a + b * discount (+ noise) per Sub-Category
+        sub_codes, self.sub_categories = pd.factorize(df["Sub-Category"], sort=True)
+        self.line_sub_category = sub_codes
+        margin = (df["Profit"] / df["Sales"]).to_numpy(dtype=np.float64)
+        discount = df["Discount"].to_numpy(dtype=np.float64)
+        n_sub = len(self.sub_categories)
+        self.margin_intercept = np.zeros(n_sub)
+        self.margin_slope = np.zeros(n_sub)
+        self.margin_noise = np.zeros(n_sub)
+        for code in range(n_sub):
+            rows = sub_codes == code
+            x, y = discount[rows], margin[rows]
+            if np.ptp(x) > 0:
+                slope, intercept = np.polyfit(x, y, 1)
+            else:
+                slope, intercept = 0.0, y.mean()
+            self.margin_intercept[code] = intercept
+            self.margin_slope[code] = slope
+            self.margin_noise[code] = np.std(y - (intercept + slope * x))
+
+    @classmethod
+    def from_source(cls, source=DEFAULT_SOURCE):
+        return cls(load_superstore(source))
+
+    @property
+    def mean_order_size(self):
+        return self.n_real_rows / len(self.order_size)
+
+    def customer_pool_size(self, n_rows):
+        """Number of distinct customers for an export of ``n_rows`` rows."""
+        return max(len(self.customer_names), int(round(len(self.customer_names) * n_rows / self.n_real_rows)))
+
+
+def _customer_ids(indices):
+    """``AB-12345`` style IDs, unique per pool index."""
+    letters = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    number = indices % 90_000 + 10_000
+    block = indices // 90_000
+    first = letters[block // 26 % 26]
+    second = letters[block % 26]
+    return (
+        pd.Series(first, dtype=object)
+        + pd.Series(second, dtype=object)
+        + "-"
+        + pd.Series(number).astype(str)
+    ).to_numpy(dtype=object)
+
+
+def generate_chunk(profile, n_rows, seed=0, chunk_index=0, first_row_id=1, first_order=0, n_customers=None):
+    """``n_rows`` synthetic rows (plus the number of orders they span)."""
+    rng = np.random.default_rng([seed, chunk_index])
+    n_customers = n_customers or profile.customer_pool_size(n_rows)
+
+    # Enough whole template orders to cover n_rows lines; the last one is cut
+    n_orders = int(n_rows / profile.mean_order_size * 1.1) + 16
+    while True:
+        orders = rng.integers(len(profile.order_size), size=n_orders)
+        sizes = profile.order_size[orders]
+        if sizes.sum() >= n_rows:
+            break
+        n_orders *= 2
+    ends = np.cumsum(sizes)
+    n_orders = int(np.searchsorted(ends, n_rows) + 1)
+    orders, sizes = orders[:n_orders], sizes[:n_orders]
+
+    order_of_line = np.repeat(np.arange(n_orders), sizes)[:n_rows]
+    offset_in_order = np.arange(n_rows) - np.repeat(np.cumsum(sizes) - sizes, sizes)[:n_rows]
+    lines = profile.order_start[orders][order_of_line] + offset_in_order
+    template = profile.template
+
+    # Order-level fields
+    jitter = rng.integers(-DATE_JITTER_DAYS, DATE_JITTER_DAYS + 1, size=n_orders)
+    order_day = np.clip(profile.order_day[orders] + jitter, profile.first_day, profile.last_day)
+    ship_day = order_day + profile.ship_lag[orders]
+    year = order_day.astype("datetime64[Y]").astype(np.int64) + 1970
+    sequence = first_order + np.arange(n_orders)
+    order_ids = (
+        pd.Series(profile.order_prefix[orders], dtype=object)
+        + "-"
+        + pd.Series(year).astype(str)
+        + "-"
+        + pd.Series(100_000 + sequence).astype(str)
+    ).to_numpy(dtype=object)
+
+    # Customers: the pool is split into segments, each order draws from its own
+    n_segments = len(profile.segments)
+    segment = profile.order_segment[orders]
+    per_segment = max(1, n_customers // n_segments)
+    customer = segment + n_segments * rng.integers(per_segment, size=n_orders)
+    customer_ids = _customer_ids(customer)
+    customer_names = profile.customer_names[customer % len(profile.customer_names)]
+
+    # Line-level measures
+    quantity = template["Quantity"].to_numpy()[lines]
+    discount = template["Discount"].to_numpy(dtype=np.float64)[lines]
+    sub = profile.line_sub_category[lines]
+    sales = profile.unit_price[lines] * quantity * (1 - discount) * rng.normal(1.0, 0.05, size=n_rows).clip(0.5)
+    margin = (
+        profile.margin_intercept[sub]
+        + profile.margin_slope[sub] * discount
+        + profile.margin_noise[sub] * rng.standard_normal(n_rows)
+    )
+    profit = sales * margin
+
+    data = {
+        "Row ID": first_row_id + np.arange(n_rows),
+        "Order ID": order_ids[order_of_line],
+        "Order Date": order_day[order_of_line],
+        "Ship Date": ship_day[order_of_line],
+        "Customer ID": customer_ids[order_of_line],
+        "Customer Name": customer_names[order_of_line],
+        "Sales": np.round(sales, 4),
+        "Quantity": quantity,
+        "Discount": discount,
+        "Profit": np.round(profit, 4),
+    }
+    for column in TEMPLATE_COLUMNS:
+        data[column] = np.asarray(template[column], dtype=object)[lines]
+    return pd.DataFrame(data)[COLUMNS], n_orders
+
+
+def generate(n_rows, seed=0, profile=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yield DataFrame chunks that together hold ``n_rows`` synthetic rows."""
+    profile = profile or Profile.from_source()
+    n_customers = profile.customer_pool_size(n_rows)
+    row_id, order = 1, 0
+    for index, start in enumerate(range(0, n_rows, chunk_rows)):
+        size = min(chunk_rows, n_rows - start)
+        chunk, n_orders = generate_chunk(profile, size, seed, index, row_id, order, n_customers)
+        row_id += size
+        order += n_orders
+        yield chunk
+
+
+def write_csv(path, n_rows, seed=0, profile=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Write a synthetic export with the real file's layout and date format."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="latin1", newline="") as f:
+        for index, chunk in enumerate(generate(n_rows, seed, profile, chunk_rows)):
+            for column in ("Order Date", "Ship Date"):
+                dates = pd.DatetimeIndex(chunk[column])
+                chunk[column] = (
+                    dates.month.astype(str) + "/" + dates.day.astype(str) + "/" + dates.year.astype(str)
+                )
+            chunk.to_csv(f, header=index == 0, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Superstore export")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("output")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--source", default=DEFAULT_SOURCE, help="real export to model")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    write_csv(args.output, args.rows, args.seed, Profile.from_source(args.source), args.chunk_rows)
+    print(f"Wrote {args.rows:,} rows to {args.output} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
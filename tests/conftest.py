@@ -0,0 +1,30 @@
+import os
+
+import pandas as pd
+import pytest
+
+from data_loader import read_csv
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE = os.path.join(ROOT, "Superstore.csv")
+
+
+@pytest.fixture(scope="session")
+def raw():
+    """The bundled export parsed by plain pandas: the baseline every fast path must match."""
+    return read_csv(SOURCE)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """A scratch working directory, so caches land under ``tmp_path/cache``."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def write_subset(path, rows):
+    """Write the first ``rows`` line items of the bundled export to ``path``."""
+    pd.read_csv(SOURCE, encoding="latin1", dtype=str, keep_default_na=False, nrows=rows).to_csv(
+        path, index=False, encoding="latin1"
+    )
+    return str(path)
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+
+from callback_pool import CallbackPool, Superseded
+
+
+def _start(pool, results, i, session, func, value, **kwargs):
+    """Run ``func(value)`` on the fast lane from a new thread; the outcome lands in ``results[i]``."""
+    def call():
+        try:
+            results[i] = pool.run("fast", session, func, value, **kwargs)
+        except Superseded as exc:
+            results[i] = exc
+
+    thread = threading.Thread(target=call)
+    thread.start()
+    return thread
+
+
+def _run_all(pool, calls):
+    """Run ``(session, func, value)`` calls concurrently; outcomes in call order."""
+    results = [None] * len(calls)
+    for thread in [_start(pool, results, i, *c) for i, c in enumerate(calls)]:
+        thread.join()
+    return results
+
+
+def _start_queued(pool, results, calls, release, **kwargs):
+    """Occupy the single worker, queue ``calls`` one after another, then let them run."""
+    blocker = _callback("blocker", release)
+    threads = [_start(pool, results, 0, "page", blocker, 0)]
+    for i, func in enumerate(calls, start=1):
+        threads.append(_start(pool, results, i, "page", func, i, **kwargs))
+        time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    pool.shutdown()
+
+
+def _callback(name, release):
+    def render(value):
+        release.wait(5)
+        return (name, value)
+
+    render.__name__ = name
+    return render
+
+
+def test_callbacks_of_one_session_run_side_by_side():
+    pool = CallbackPool({"fast": 2})
+    release = threading.Event()
+    callbacks = [_callback(f"render_{i}", release) for i in range(7)]
+    threading.Timer(0.2, release.set).start()
+    try:
+        results = _run_all(pool, [("page", func, i) for i, func in enumerate(callbacks)])
+    finally:
+        pool.shutdown()
+    assert results == [(f"render_{i}", i) for i in range(7)]
+    counts = pool.metrics()["fast"]
+    assert (counts["completed"], counts["superseded"], counts["cancelled"]) == (7, 0, 0)
+
+
+def test_newer_request_of_the_same_callback_supersedes_the_older():
+    pool = CallbackPool({"fast": 1})
+    release = threading.Event()
+    render = _callback("render", release)
+    results = [None] * 3
+    # The first render is still queued when the second one arrives
+    _start_queued(pool, results, [render, render], release)
+    assert results[0] == ("blocker", 0)
+    assert isinstance(results[1], Superseded)
+    assert results[2] == ("render", 2)
+
+
+def test_sessions_do_not_supersede_each_other():
+    pool = CallbackPool({"fast": 2})
+    release = threading.Event()
+    render = _callback("render", release)
+    threading.Timer(0.2, release.set).start()
+    try:
+        results = _run_all(pool, [(f"tab-{i}", render, i) for i in range(4)])
+    finally:
+        pool.shutdown()
+    assert results == [("render", i) for i in range(4)]
+
+
+@pytest.mark.parametrize("key", ["panel", None])
+def test_explicit_key_groups_different_functions(key):
+    pool = CallbackPool({"fast": 1})
+    release = threading.Event()
+    results = [None] * 3
+    _start_queued(pool, results, [_callback("first", release), _callback("second", release)], release, key=key)
+    assert isinstance(results[1], Superseded) == (key is not None)
+    assert results[2] == ("second", 2)
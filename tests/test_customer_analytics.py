@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import customer_analytics
+from customer_analytics import SEGMENTS, CustomerTable, scores
+
+
+@pytest.fixture(scope="module")
+def table(raw):
+    return CustomerTable.from_frame(raw)
+
+
+@pytest.fixture(scope="module")
+def customers(raw):
+    """Per-customer RFM inputs from plain pandas."""
+    reference = raw["Order Date"].max() + pd.Timedelta(days=1)
+    grouped = raw.groupby("Customer ID")
+    return pd.DataFrame({
+        "recency": (reference - grouped["Order Date"].max()).dt.days,
+        "orders": grouped["Order ID"].nunique(),
+        "lines": grouped.size(),
+        "sales": grouped["Sales"].sum(),
+        "profit": grouped["Profit"].sum(),
+    })
+
+
+def test_customer_totals_match_groupby(table, customers):
+    assert list(table.arrays["customer"]) == list(customers.index)
+    for column in customers.columns:
+        np.testing.assert_allclose(table.arrays[column], customers[column], err_msg=column)
+
+
+def test_scores_are_quintiles_of_the_ranks():
+    values = np.array([5, 1, 3, 3, 9, 7, 2, 8, 6, 4])
+    # 1 + (values strictly below) * 5 // 10; ties share a score
+    np.testing.assert_array_equal(scores(values), [3, 1, 2, 2, 5, 4, 1, 5, 4, 3])
+    assert scores(values[:0]).size == 0
+
+
+def test_segments_cover_every_score_pair(table, customers):
+    segments = table.rfm_segments()
+    assert segments["Customers"].sum() == len(customers)
+    assert (table.arrays["segment"] >= 0).all()
+    names = np.array([name for name, _, _ in SEGMENTS])[table.arrays["segment"]]
+    expected = customers.assign(Segment=names).groupby("Segment")["sales"].sum()
+    np.testing.assert_allclose(segments.loc[expected.index, "Sales"], expected)
+
+
+@pytest.mark.parametrize("period, freq", [("Month", "M"), ("Quarter", "Q")])
+def test_retention_matches_pandas_cohorts(raw, table, period, freq):
+    periods = raw["Order Date"].dt.to_period(freq)
+    cohort = periods.groupby(raw["Customer ID"]).transform("min")
+    age = (periods - cohort).map(lambda offset: offset.n)
+    active = raw.assign(Cohort=cohort, Age=age).groupby(["Cohort", "Age"])["Customer ID"].nunique().unstack()
+    size = active[0]
+    expected = active.div(size, axis=0)
+
+    retention = table.retention(period)
+    assert list(retention.index) == [str(label) for label in expected.index]
+    np.testing.assert_array_equal(retention["Customers"], size)
+    result = retention.drop(columns="Customers").to_numpy()
+    # Ages the data cannot reach yet are NaN; unobserved ones with no orders are 0
+    reachable = ~np.isnan(result[:, :expected.shape[1]])
+    np.testing.assert_allclose(
+        result[:, :expected.shape[1]][reachable], expected.fillna(0).to_numpy()[reachable]
+    )
+
+
+def test_saved_table_is_rebuilt_for_another_version(raw, table, tmp_path):
+    directory = str(tmp_path / "customers")
+    saved = customer_analytics.load_or_build(raw, directory, version="v1")
+    pd.testing.assert_frame_equal(saved.rfm_segments(), table.rfm_segments())
+    assert CustomerTable.load(directory, "v2") is None
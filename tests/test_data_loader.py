@@ -0,0 +1,35 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from conftest import SOURCE, write_subset
+from data_loader import TEXT_COLUMNS, cache_dir_for, dataset_version, is_fresh, load_superstore, source_version
+
+
+def test_cached_frame_matches_pandas(raw, workdir):
+    df = load_superstore(SOURCE)
+    assert list(df.columns) == list(raw.columns)
+    for column in raw.columns:
+        if pd.api.types.is_numeric_dtype(raw[column]) or pd.api.types.is_datetime64_any_dtype(raw[column]):
+            np.testing.assert_array_equal(df[column].to_numpy(), raw[column].to_numpy(), err_msg=column)
+        else:
+            assert list(df[column].astype(str)) == list(raw[column].astype(str)), column
+    assert set(load_superstore(SOURCE, exclude=TEXT_COLUMNS).columns) == set(raw.columns) - set(TEXT_COLUMNS)
+
+
+def test_cache_is_rebuilt_only_when_the_content_changes(workdir):
+    source = write_subset(workdir / "sub.csv", 200)
+    assert len(load_superstore(source)) == 200
+    version = dataset_version(source)
+    assert version == source_version(source)
+
+    # Touched but unchanged: the content hash keeps the cache
+    stat = os.stat(source)
+    os.utime(source, (stat.st_atime, stat.st_mtime + 10))
+    assert is_fresh(source, cache_dir_for(source))
+
+    write_subset(source, 300)
+    assert not is_fresh(source, cache_dir_for(source))
+    assert len(load_superstore(source)) == 300
+    assert dataset_version(source) not in (None, version)
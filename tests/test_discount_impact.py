@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import discount_impact
+from discount_impact import ALL
+from streaming_aggregates import StreamingAggregator
+
+REPLICATES = 50
+
+
+@pytest.fixture(scope="module")
+def table(raw):
+    return discount_impact.analyze(raw, REPLICATES, workers=1)
+
+
+def test_group_totals_match_pandas(raw, table):
+    expected = raw.groupby(["Sub-Category", "Region"]).agg(
+        Lines=("Sales", "size"), Sales=("Sales", "sum"), Profit=("Profit", "sum"),
+        **{"Mean Discount": ("Discount", "mean")},
+    )
+    result = table[(table["Sub-Category"] != ALL) & (table["Region"] != ALL)].set_index(["Sub-Category", "Region"])
+    result = result.loc[expected.index, list(expected.columns)]
+    np.testing.assert_allclose(result, expected)
+    overall = table[(table["Sub-Category"] == ALL) & (table["Region"] == ALL)].iloc[0]
+    assert overall["Lines"] == len(raw)
+
+
+@pytest.mark.parametrize("sub_category, region", [(ALL, ALL), ("Tables", ALL), ("Binders", "Central")])
+def test_slope_matches_weighted_polyfit(raw, table, sub_category, region):
+    rows = raw
+    if sub_category != ALL:
+        rows = rows[rows["Sub-Category"] == sub_category]
+    if region != ALL:
+        rows = rows[rows["Region"] == region]
+    # Margin on discount, weighted by Sales (polyfit weights multiply residuals)
+    slope, intercept = np.polyfit(rows["Discount"], rows["Profit"] / rows["Sales"], 1, w=np.sqrt(rows["Sales"]))
+    row = table[(table["Sub-Category"] == sub_category) & (table["Region"] == region)].iloc[0]
+    assert row["Slope"] == pytest.approx(slope)
+    assert row["Slope Low"] <= row["Slope"] <= row["Slope High"]
+
+
+def test_chunked_sums_give_the_same_table(raw, table):
+    parts = [discount_impact.partial_sums(raw.iloc[start:start + 1500]) for start in range(0, len(raw), 1500)]
+    merged = discount_impact.merge_sums(*parts)
+    pd.testing.assert_frame_equal(merged, discount_impact.partial_sums(raw))
+    pd.testing.assert_frame_equal(discount_impact.analyze_sums(merged, REPLICATES, workers=1), table)
+
+
+def test_streaming_aggregator_accumulates_the_sums(raw):
+    aggregator = StreamingAggregator()
+    for start in range(0, len(raw), 4000):
+        aggregator.update(raw.iloc[start:start + 4000].copy())
+    pd.testing.assert_frame_equal(aggregator.discount_sums, discount_impact.partial_sums(raw))
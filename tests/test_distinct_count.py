@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from distinct_count import (
+    BitsetCounter, HyperLogLog, _bit_length, codes_of, distinct_by, grouped_distinct, hash_values,
+)
+
+# Standard error of a precision-10 sketch is about 3.3%
+TOLERANCE = 0.1
+
+
+def test_bitset_and_grouped_counts_match_nunique(raw):
+    codes, cardinality = codes_of(raw["Order ID"])
+    counter = BitsetCounter(cardinality)
+    assert counter.count(codes) == raw["Order ID"].nunique()
+    west = np.flatnonzero(raw["Region"] == "West")
+    assert counter.count(codes[west]) == raw.loc[west, "Order ID"].nunique()
+    assert counter.count(codes[:0]) == 0
+
+    region_codes, regions = pd.factorize(raw["Region"], sort=True)
+    counts = grouped_distinct(region_codes, codes, len(regions), cardinality)
+    expected = raw.groupby("Region")["Order ID"].nunique()
+    np.testing.assert_array_equal(counts, expected.loc[regions].to_numpy())
+    pd.testing.assert_series_equal(
+        distinct_by(raw, "Segment", "Customer ID"), raw.groupby("Segment")["Customer ID"].nunique(),
+        check_names=False, check_dtype=False, check_index_type=False,
+    )
+
+
+def test_missing_codes_are_not_counted():
+    codes, cardinality = codes_of(pd.Series(["a", None, "b", "a", np.nan]))
+    assert cardinality == 2 and (codes == -1).sum() == 2
+    counter = BitsetCounter(cardinality)
+    assert counter.count(codes) == 2
+    assert counter.count(codes[[1, 4]]) == 0
+    # Counts do not leak into the next call through the reused bitmap
+    assert counter.count(codes[:1]) == 1
+
+    groups = np.array([0, 0, 1, 1, -1])
+    np.testing.assert_array_equal(grouped_distinct(groups, codes, 2, cardinality), [1, 2])
+    df = pd.DataFrame({"g": ["x", "x", "y", "y"], "v": ["a", None, None, None]})
+    assert distinct_by(df, "g", "v").to_dict() == {"x": 1, "y": 0}
+
+
+def test_codes_of_a_categorical_column(raw):
+    categorical = raw["Order ID"].astype("category")
+    codes, cardinality = codes_of(categorical)
+    assert cardinality == raw["Order ID"].nunique()
+    assert BitsetCounter(cardinality).count(codes) == cardinality
+
+
+def test_bit_length_matches_python():
+    values = np.array([0, 1, 2, 3, 4, 7, 8, 2**52 - 1, 2**53, 2**53 + 1, 2**63 - 1, 2**63, 2**64 - 1], dtype=np.uint64)
+    np.testing.assert_array_equal(_bit_length(values), [int(v).bit_length() for v in values])
+
+
+@pytest.mark.parametrize("n", [50, 5_000, 200_000])
+def test_hyperloglog_estimate_is_close(n):
+    hashes = hash_values(np.arange(n).astype(str))
+    # Every value added twice: duplicates must not count
+    sketch = HyperLogLog.empty(1).add(np.zeros(2 * n, dtype=np.int64), np.r_[hashes, hashes])
+    assert sketch.estimate()[0] == pytest.approx(n, rel=TOLERANCE)
+
+
+def test_reduced_sketches_equal_sketches_of_the_union(raw):
+    hashes = hash_values(raw["Order ID"])
+    cell_codes, cells = pd.MultiIndex.from_arrays([raw["Region"], raw["Category"]]).factorize()
+    region_codes, regions = pd.factorize(raw["Region"])
+    per_cell = HyperLogLog.empty(len(cells)).add(cell_codes, hashes)
+    cell_regions = pd.Index(regions).get_indexer(cells.get_level_values(0))
+    reduced = per_cell.reduce(cell_regions, len(regions))
+    direct = HyperLogLog.empty(len(regions)).add(region_codes, hashes)
+    np.testing.assert_array_equal(reduced.registers, direct.registers)
+    expected = raw.groupby("Region")["Order ID"].nunique().loc[regions].to_numpy()
+    np.testing.assert_allclose(reduced.estimate(), expected, rtol=TOLERANCE)
@@ -0,0 +1,75 @@
+import threading
+
+from figure_cache import FigureCache, normalize_filter
+
+
+def test_equivalent_filters_share_an_entry():
+    cache = FigureCache(version="v1")
+    calls = []
+
+    @cache.cached("kpis", ("region", "start_date"))
+    def render(region, start_date):
+        calls.append((region, start_date))
+        return {"region": region, "start": start_date}
+
+    first = render("All", "2016-01-01")
+    assert render(None, "2016-01-01T00:00:00") == first
+    assert render("", "2016-01-01 00:00") == first
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 2
+    assert normalize_filter("end_date", None) is None
+
+
+def test_a_new_dataset_version_is_never_served_old_results():
+    cache = FigureCache(version="v1")
+    version = {"value": 1}
+
+    @cache.cached("total", ("region",))
+    def render(region):
+        return version["value"]
+
+    assert render("West") == 1
+    version["value"] = 2
+    assert render("West") == 1
+    cache.invalidate("v2")
+    assert render("West") == 2
+    assert cache.stats()["version"] == "v2"
+
+
+def test_bounded_by_entries_and_bytes():
+    cache = FigureCache(max_entries=3)
+    for i in range(5):
+        cache.put(i, [i])
+    assert cache.get(0) is None and cache.get(1) is None
+    assert cache.get(4) == [4]
+    assert cache.stats()["evictions"] == 2
+
+    cache = FigureCache(max_bytes=100)
+    cache.put("a", "x" * 40)
+    cache.put("b", "y" * 40)
+    # Reading "a" makes "b" the least recently used when "c" needs the room
+    cache.get("a")
+    cache.put("c", "z" * 40)
+    assert cache.stats()["bytes"] <= 100
+    assert cache.get("b") is None
+    assert cache.get("a") == "x" * 40 and cache.get("c") == "z" * 40
+    cache.put("huge", "w" * 200)
+    assert cache.get("huge") is None
+
+
+def test_threads_share_one_cache():
+    cache = FigureCache(max_entries=50)
+
+    def work(offset):
+        for i in range(200):
+            cache.put((offset + i) % 80, {"i": i})
+            cache.get(i % 80)
+
+    threads = [threading.Thread(target=work, args=(n * 7,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert stats["entries"] <= 50
+    assert stats["hits"] + stats["misses"] == 8 * 200
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import filter_engine
+from filter_engine import ALL, FilterEngine
+
+FILTERS = [
+    (ALL, ALL, None, None),
+    ("West", ALL, None, None),
+    ("East", "Furniture", None, None),
+    (ALL, "Technology", "2016-01-01", "2016-12-31"),
+    ("Central", "Office Supplies", "2014-06-15", "2015-02-28"),
+    ("South", ALL, "2017-12-31", None),
+    ("Nowhere", ALL, None, None),
+    (ALL, ALL, "2017-01-01", "2016-01-01"),
+]
+
+
+@pytest.fixture(scope="module")
+def engine(raw):
+    return FilterEngine(raw)
+
+
+def _mask(raw, region, category, start_date, end_date):
+    mask = np.ones(len(raw), dtype=bool)
+    if region != ALL:
+        mask &= raw["Region"] == region
+    if category != ALL:
+        mask &= raw["Category"] == category
+    if start_date:
+        mask &= raw["Order Date"] >= start_date
+    if end_date:
+        mask &= raw["Order Date"] <= end_date
+    return np.asarray(mask)
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_select_matches_pandas_masks(raw, engine, filters):
+    np.testing.assert_array_equal(engine.select(*filters), np.flatnonzero(_mask(raw, *filters)))
+
+
+@pytest.mark.parametrize("filters", FILTERS[:6])
+def test_group_sums_and_distinct_orders_match_pandas(raw, engine, filters):
+    rows = engine.select(*filters)
+    selected = raw[_mask(raw, *filters)]
+    labels, sums = engine.group_sums("Region", rows, ["Sales", "Profit"])
+    expected = selected.groupby("Region")[["Sales", "Profit"]].sum()
+    assert list(labels) == list(expected.index)
+    np.testing.assert_allclose(np.column_stack([sums["Sales"], sums["Profit"]]), expected)
+    assert engine.distinct_count("Order ID", rows) == selected["Order ID"].nunique()
+
+    months = selected["Order Date"].dt.strftime("%Y-%m")
+    labels, sums = engine.group_sums("Month", rows, ["Sales"])
+    expected = selected.groupby(months)["Sales"].sum()
+    assert list(labels) == list(expected.index)
+    np.testing.assert_allclose(sums["Sales"], expected)
+
+
+def test_cross_sums_match_pivot_table(raw, engine):
+    rows = engine.select(start_date="2015-01-01", end_date="2016-06-30")
+    selected = raw[_mask(raw, ALL, ALL, "2015-01-01", "2016-06-30")]
+    row_labels, col_labels, sums, counts = engine.cross_sums("Region", "Category", rows, ["Profit"])
+    expected = pd.pivot_table(selected, "Profit", "Region", "Category", aggfunc="sum", fill_value=0)
+    np.testing.assert_allclose(sums["Profit"], expected.loc[row_labels, col_labels])
+    assert counts.sum() == len(selected)
+
+
+def test_saved_index_is_reused_until_the_version_changes(raw, engine, tmp_path):
+    directory = tmp_path / "filter_index"
+    loaded = filter_engine.load_or_build(raw, str(directory), version="v1")
+    for filters in FILTERS:
+        np.testing.assert_array_equal(loaded.select(*filters), engine.select(*filters))
+    assert FilterEngine.load(str(directory), raw, version="v1") is not None
+    assert FilterEngine.load(str(directory), raw, version="v2") is None
+    assert FilterEngine.load(str(directory), raw.iloc[:100], version="v1") is None
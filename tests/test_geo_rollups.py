@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import geo_rollups
+from geo_rollups import ALL, GeoRollups
+
+
+@pytest.fixture(scope="module")
+def rollups(raw):
+    return GeoRollups.from_frame(raw)
+
+
+def _selected(raw, region=ALL, category=ALL, start_date=None, end_date=None):
+    """Line items of the filters, with the date range widened to whole months."""
+    mask = np.ones(len(raw), dtype=bool)
+    if region != ALL:
+        mask &= raw["Region"] == region
+    if category != ALL:
+        mask &= raw["Category"] == category
+    month = raw["Order Date"].dt.to_period("M")
+    if start_date:
+        mask &= month >= pd.Period(start_date, "M")
+    if end_date:
+        mask &= month <= pd.Period(end_date, "M")
+    return raw[mask]
+
+
+FILTERS = [
+    (ALL, ALL, None, None),
+    ("West", ALL, None, None),
+    (ALL, "Technology", "2016-03-15", "2016-08-02"),
+    ("Central", "Furniture", "2015-01-01", None),
+    (ALL, ALL, None, "2014-02-10"),
+    ("Nowhere", ALL, None, None),
+    (ALL, ALL, "2020-01-01", None),
+]
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_states_match_groupby(raw, rollups, filters):
+    states = rollups.states(*filters).set_index("State")
+    assert list(states.index) == sorted(raw["State"].unique())
+    selected = _selected(raw, *filters)
+    expected = selected.groupby("State")[["Sales", "Profit"]].sum().assign(
+        **{"Line Items": selected.groupby("State").size()}
+    ).reindex(states.index, fill_value=0)
+    np.testing.assert_allclose(states[["Sales", "Profit", "Line Items"]], expected, atol=1e-6)
+
+
+@pytest.mark.parametrize("state", ["California", "Texas", "Wyoming"])
+@pytest.mark.parametrize("filters", FILTERS[:5])
+def test_cities_match_groupby(raw, rollups, state, filters):
+    selected = _selected(raw, *filters)
+    selected = selected[selected["State"] == state]
+    expected = selected.groupby("City")["Sales"].sum().sort_values(ascending=False)
+    cities = rollups.cities(state, *filters, n=10)
+    np.testing.assert_allclose(cities["Sales"], expected.head(10))
+    assert set(cities["City"]) <= set(expected.index)
+    postal = raw[raw["State"] == state].groupby("City")["Postal Code"].nunique()
+    assert (cities.set_index("City")["Postal Codes"] == postal.loc[cities["City"]]).all()
+
+
+def test_missing_postal_codes_are_not_counted(raw):
+    state = raw[raw["State"] == "Rhode Island"].copy()
+    state["Postal Code"] = state["Postal Code"].astype("float64")
+    # Every Warwick code and every other Providence code go missing
+    missing = (state["City"] == "Warwick") | ((state["City"] == "Providence") & (np.arange(len(state)) % 2 == 0))
+    state.loc[missing, "Postal Code"] = np.nan
+    cities = GeoRollups.from_frame(state).cities("Rhode Island")
+    postal = cities.set_index("City")["Postal Codes"]
+    assert postal.to_dict() == state.groupby("City")["Postal Code"].nunique().to_dict()
+    assert postal["Warwick"] == 0 and postal["Providence"] == 1
+    np.testing.assert_allclose(cities["Sales"].sum(), state["Sales"].sum())
+
+
+def test_unknown_state_has_no_cities(rollups):
+    assert rollups.cities("Atlantis").empty
+
+
+def test_saved_rollups_are_rebuilt_for_another_version(raw, rollups, tmp_path):
+    directory = str(tmp_path / "geo")
+    saved = geo_rollups.load_or_build(raw, directory, version="v1")
+    pd.testing.assert_frame_equal(saved.states("South"), rollups.states("South"))
+    assert GeoRollups.load(directory, "v2") is None
@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import data_loader
+import incremental_ingest
+import olap_cube
+from conftest import SOURCE, write_subset
+from data_loader import load_superstore, read_csv
+
+
+def _write_delta(path, start, rows):
+    delta = pd.read_csv(SOURCE, encoding="latin1", dtype=str, keep_default_na=False, skiprows=range(1, start + 1), nrows=rows)
+    delta.to_csv(path, index=False, encoding="latin1")
+    return str(path)
+
+
+def test_ingest_updates_the_datasets_own_aggregates(workdir, monkeypatch):
+    dataset = write_subset(workdir / "sub.csv", 1000)
+    other = write_subset(workdir / "Superstore.csv", 300)
+    olap_cube.load_or_build(load_superstore(other), source=other)
+
+    delta = _write_delta(workdir / "delta.csv", 1000, 200)
+    appended, state = incremental_ingest.ingest(delta, dataset)
+    assert appended == 200 and state["rows"] == 1200
+    assert incremental_ingest.ingest(delta, dataset)[0] == 0
+
+    # Later runs trust the recorded size / mtime instead of rehashing the dataset
+    def no_hashing(path, chunk_size=None):
+        raise AssertionError(f"{path} was rehashed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(data_loader, "file_sha1", no_hashing)
+        appended, state = incremental_ingest.ingest(_write_delta(workdir / "delta2.csv", 1200, 100), dataset)
+    assert appended == 100 and state["rows"] == 1300
+
+    # The delta-updated cube is current for the appended dataset (reused, not
+    # rebuilt, once the dataset is reloaded) and matches the appended rows
+    cube_path = olap_cube.cube_path_for(dataset)
+    saved = os.stat(cube_path).st_mtime_ns
+    expected = read_csv(dataset)
+    cube = olap_cube.load_or_build(load_superstore(dataset), source=dataset)
+    assert os.stat(cube_path).st_mtime_ns == saved
+    assert cube.totals()["Count"] == len(expected) == 1300
+    assert np.isclose(cube.totals()["Sales"], expected["Sales"].sum())
+    # ... and the other dataset's cube was left alone
+    assert olap_cube.load_or_build(load_superstore(other), source=other).totals()["Count"] == 300
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+import leaderboards
+from conftest import SOURCE
+from leaderboards import ALL, ENTITIES, MIN_MARGIN_LINES, Leaderboards
+
+
+@pytest.fixture(scope="module")
+def boards(raw):
+    return Leaderboards.from_frame(raw)
+
+
+def _selected(raw, region=ALL, category=ALL, start_date=None, end_date=None):
+    mask = np.ones(len(raw), dtype=bool)
+    if region != ALL:
+        mask &= raw["Region"] == region
+    if category != ALL:
+        mask &= raw["Category"] == category
+    if start_date:
+        mask &= raw["Order Date"] >= start_date
+    if end_date:
+        mask &= raw["Order Date"] <= end_date
+    return raw[mask]
+
+
+def _expected(raw, dim, metric, n, bottom, filters):
+    keys, _ = ENTITIES[dim]
+    totals = _selected(raw, *filters).groupby(keys).agg(
+        Sales=("Sales", "sum"), Profit=("Profit", "sum"), Lines=("Sales", "size")
+    )
+    if metric == "Margin":
+        totals = totals[(totals["Lines"] >= MIN_MARGIN_LINES) & (totals["Sales"] > 0)]
+        score = totals["Profit"] / totals["Sales"]
+    else:
+        score = totals[metric]
+    return score.sort_values(ascending=bottom).head(n).to_numpy()
+
+
+FILTERS = [
+    (ALL, ALL, None, None),
+    ("West", "Technology", None, None),
+    (ALL, ALL, "2016-03-15", "2016-11-20"),
+    ("East", ALL, "2015-01-01", "2015-06-30"),
+    (ALL, "Furniture", "2017-12-10", None),
+]
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+@pytest.mark.parametrize("dim", list(ENTITIES))
+def test_totals_match_groupby(raw, boards, dim, filters):
+    keys, _ = ENTITIES[dim]
+    sales, profit, count = boards.totals(dim, *filters)
+    selected = _selected(raw, *filters)
+    expected = selected.groupby(keys)["Sales"].sum()
+    assert count.sum() == len(selected)
+    assert np.count_nonzero(count) == len(expected)
+    np.testing.assert_allclose(np.sort(sales[count > 0]), np.sort(expected.to_numpy()))
+    np.testing.assert_allclose(profit.sum(), selected["Profit"].sum(), atol=1e-6)
+
+
+@pytest.mark.parametrize("metric", ["Sales", "Profit", "Margin"])
+@pytest.mark.parametrize("bottom", [False, True])
+@pytest.mark.parametrize("filters", [FILTERS[0], FILTERS[1], FILTERS[3]])
+def test_rankings_match_sorted_groupby(raw, boards, metric, bottom, filters):
+    for dim in ENTITIES:
+        top = boards.top(dim, metric, 10, *filters, bottom=bottom)
+        values = top[metric] / 100 if metric == "Margin" else top[metric]
+        np.testing.assert_allclose(values, _expected(raw, dim, metric, 10, bottom, filters))
+
+
+def test_city_labels_and_precomputed_rankings(raw, boards):
+    top = boards.top("City", "Sales", 3)
+    expected = raw.groupby(["City", "State"])["Sales"].sum().sort_values(ascending=False).head(3)
+    assert list(top["City"]) == [f"{city}, {state}" for city, state in expected.index]
+    # Past MAX_N the ranking is computed from the partials instead
+    deep = boards.top("Product", "Profit", leaderboards.MAX_N + 5)
+    np.testing.assert_allclose(deep["Profit"].head(10), boards.top("Product", "Profit", 10)["Profit"])
+
+
+def test_saved_boards_are_reused(workdir):
+    first = leaderboards.load_or_build(SOURCE)
+    directory = leaderboards.table_dir_for(SOURCE)
+    assert Leaderboards.load(directory, first.version) is not None
+    assert Leaderboards.load(directory, "another version") is None
+    assert leaderboards.load_or_build(SOURCE).top("Customer").equals(first.top("Customer"))
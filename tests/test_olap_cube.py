@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import olap_cube
+from conftest import write_subset
+from data_loader import dataset_version, load_superstore
+from olap_cube import SalesCube
+
+
+@pytest.fixture(scope="module")
+def cube(raw):
+    return SalesCube.from_frame(raw)
+
+
+def _expected(raw, by, filters=None, start=None, end=None):
+    rows = raw
+    for dim, value in (filters or {}).items():
+        rows = rows[rows[dim] == value]
+    if start:
+        rows = rows[rows["Order Date"] >= start]
+    if end:
+        rows = rows[rows["Order Date"] <= end]
+    return rows.groupby(by)[["Sales", "Profit", "Quantity"]].sum().assign(Count=rows.groupby(by).size())
+
+
+@pytest.mark.parametrize("by, filters", [
+    (["Region"], None),
+    (["Category", "Segment"], {"Region": "West"}),
+    (["Sub-Category"], {"Category": "Furniture", "Segment": "Consumer"}),
+])
+def test_rollup_matches_pandas(raw, cube, by, filters):
+    result = cube.rollup(by, filters).set_index(by)
+    expected = _expected(raw, by, filters)
+    assert list(result.index) == list(expected.index)
+    np.testing.assert_allclose(result[["Sales", "Profit", "Quantity", "Count"]], expected)
+
+
+def test_unknown_filter_value_selects_nothing(cube):
+    totals = cube.totals({"Region": "Nowhere"})
+    assert totals["Count"] == 0 and totals["Sales"] == 0
+
+
+@pytest.mark.parametrize("start, end", [
+    ("2015-01-01", "2016-06-30"),
+    ("2014-07-01", "2017-01-31"),
+    (None, "2015-12-31"),
+])
+def test_whole_month_range_matches_pandas(raw, cube, start, end):
+    months = cube.month_range(start, end)
+    assert months is not None
+    totals = cube.totals({"Category": "Technology"}, months)
+    expected = _expected(raw.assign(All=0), ["All"], {"Category": "Technology"}, start, end).iloc[0]
+    assert totals["Count"] == expected["Count"]
+    assert totals["Sales"] == pytest.approx(expected["Sales"])
+
+
+def test_range_cutting_through_a_month_cannot_use_the_cube(cube):
+    assert cube.month_range("2016-03-15", "2016-09-30") is None
+
+
+def test_merge_of_disjoint_halves_equals_the_whole(raw, cube):
+    half = len(raw) // 2
+    merged = SalesCube.from_frame(raw.iloc[:half]).merge(SalesCube.from_frame(raw.iloc[half:]))
+    by = ["Region", "Category", "Month"]
+    pd.testing.assert_frame_equal(merged.rollup(by), cube.rollup(by))
+
+
+def test_cube_is_kept_per_source_and_versioned(workdir):
+    full = write_subset(workdir / "Superstore.csv", 3000)
+    sub = write_subset(workdir / "sub.csv", 500)
+    full_cube = olap_cube.load_or_build(load_superstore(full), source=full)
+    sub_cube = olap_cube.load_or_build(load_superstore(sub), source=sub)
+    assert olap_cube.cube_path_for(full) != olap_cube.cube_path_for(sub)
+
+    reloaded = olap_cube.load_or_build(load_superstore(full), source=full)
+    assert reloaded.version == dataset_version(full)
+    assert reloaded.totals()["Count"] == full_cube.totals()["Count"] == 3000
+    assert sub_cube.totals()["Count"] == 500
+
+    # New content under the same name: the version changes and the cube is rebuilt
+    write_subset(workdir / "sub.csv", 800)
+    rebuilt = olap_cube.load_or_build(load_superstore(sub), source=sub)
+    assert rebuilt.totals()["Count"] == 800
+    assert rebuilt.version == dataset_version(sub) != sub_cube.version
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from order_metrics import MAX_LEAD_DAYS, OrderTable
+
+
+def _orders(raw):
+    """One row per order from plain pandas, keyed by its first line as ``OrderTable`` does."""
+    lines = raw.assign(Lead=(raw["Ship Date"] - raw["Order Date"]).dt.days)
+    orders = lines.groupby("Order ID", sort=False).agg(
+        **{"Order Date": ("Order Date", "first"), "Ship Mode": ("Ship Mode", "first"),
+           "Region": ("Region", "first"), "Lead": ("Lead", "first"), "Lines": ("Sales", "size"),
+           "Units": ("Quantity", "sum"), "Value": ("Sales", "sum"), "Profit": ("Profit", "sum")}
+    )
+    categories = lines.groupby("Order ID", sort=False)["Category"].agg(set)
+    return orders.assign(Categories=categories)
+
+
+def _distribution(orders):
+    by_mode = orders.groupby("Ship Mode")["Lead"]
+    # Quantiles are the smallest lead time covering the share of orders
+    return pd.DataFrame({
+        "Orders": by_mode.size(),
+        "Mean Days": by_mode.mean(),
+        "P50 Days": by_mode.apply(lambda lead: np.quantile(lead, 0.5, method="inverted_cdf")),
+        "P90 Days": by_mode.apply(lambda lead: np.quantile(lead, 0.9, method="inverted_cdf")),
+        "Max Days": by_mode.max(),
+    })
+
+
+@pytest.mark.parametrize("region, category, start_date, end_date", [
+    ("All", "All", None, None),
+    ("West", "All", "2016-01-01", "2016-12-31"),
+    ("All", "Technology", "2015-06-15", None),
+    ("East", "Furniture", None, "2015-03-31"),
+])
+def test_basket_and_lead_times_match_pandas(raw, region, category, start_date, end_date):
+    table = OrderTable.from_frame(raw)
+    rows = table.select(region, category, start_date, end_date)
+    orders = _orders(raw)
+    keep = np.ones(len(orders), dtype=bool)
+    if region != "All":
+        keep &= orders["Region"] == region
+    if category != "All":
+        keep &= orders["Categories"].map(lambda categories: category in categories)
+    if start_date:
+        keep &= orders["Order Date"] >= start_date
+    if end_date:
+        keep &= orders["Order Date"] <= end_date
+    orders = orders[keep]
+
+    basket = table.basket(rows)
+    assert basket["orders"] == len(orders)
+    assert basket["lines"] == pytest.approx(orders["Lines"].mean())
+    assert basket["units"] == pytest.approx(orders["Units"].mean())
+    assert basket["value"] == pytest.approx(orders["Value"].mean())
+    assert basket["lead_days"] == pytest.approx(orders["Lead"].mean())
+    result = table.lead_time_distribution(rows)
+    expected = _distribution(orders)
+    np.testing.assert_allclose(result.loc[expected.index, expected.columns], expected)
+
+
+def test_ship_date_before_order_date(raw):
+    shifted = raw.copy()
+    early = shifted["Order ID"].isin(shifted["Order ID"].unique()[:3])
+    shifted.loc[early, "Ship Date"] = shifted.loc[early, "Order Date"] - pd.Timedelta(days=2)
+    table = OrderTable.from_frame(shifted)
+    modes, days, counts = table.lead_time_histogram()
+    # Early shipments land in the underflow bin; the window does not move
+    assert days[0] == -1 and days[-1] == MAX_LEAD_DAYS + 1
+    assert counts[:, 0].sum() == 3
+    assert counts.sum() == table.n_orders
+    expected = _distribution(_orders(shifted))
+    result = table.lead_time_distribution()
+    np.testing.assert_allclose(result.loc[expected.index, expected.columns], expected)
+
+
+def test_lead_time_outliers_go_to_the_overflow_bin(raw):
+    baseline = OrderTable.from_frame(raw).lead_time_histogram()
+    shifted = raw.copy()
+    late = shifted["Order ID"] == shifted["Order ID"].iloc[0]
+    shifted.loc[late, "Ship Date"] = shifted.loc[late, "Order Date"] + pd.Timedelta(days=400)
+    table = OrderTable.from_frame(shifted)
+    modes, days, counts = table.lead_time_histogram()
+    np.testing.assert_array_equal(days, baseline[1])
+    assert counts[:, -1].sum() == 1
+    assert counts.sum() == table.n_orders
+    # The distribution is exact, outlier included
+    assert table.lead_time_distribution()["Max Days"].max() == 400
+    expected = _distribution(_orders(shifted))
+    result = table.lead_time_distribution()
+    np.testing.assert_allclose(result.loc[expected.index, expected.columns], expected)
+
+
+def test_lead_time_distribution_of_no_orders(raw):
+    table = OrderTable.from_frame(raw)
+    assert table.lead_time_distribution(np.array([], dtype=np.int64)).empty
+    assert table.lead_time_histogram(np.array([], dtype=np.int64))[2].sum() == 0
@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import SOURCE
+from parallel_aggregation import aggregate_shards, category_table, regional_table, segment_table
+
+
+def test_shards_aggregate_like_the_whole_export(raw, tmp_path):
+    lines = pd.read_csv(SOURCE, encoding="latin1", dtype=str, keep_default_na=False)
+    years = lines["Order Date"].str[-4:]
+    for year in sorted(years.unique()):
+        lines[years == year].to_csv(tmp_path / f"Superstore_{year}.csv", index=False, encoding="latin1")
+
+    cube, moments, stats = aggregate_shards(sorted(map(str, tmp_path.glob("Superstore_*.csv"))), workers=2, chunksize=700)
+    assert stats["shards"] == years.nunique()
+    assert stats["rows"] == len(raw)
+    for table, column in ((regional_table(cube), "Region"), (category_table(cube), "Category")):
+        expected = raw.groupby(column)[["Sales", "Profit"]].sum()
+        np.testing.assert_allclose(table.set_index(column)[["Sales", "Profit"]], expected)
+    segments = segment_table(cube).set_index("Segment")
+    expected = raw.groupby("Segment").agg({"Sales": "sum", "Profit": "sum", "Order ID": "count"})
+    np.testing.assert_allclose(segments, expected)
+    assert moments.correlation().loc["Discount", "Profit"] == pytest.approx(raw["Discount"].corr(raw["Profit"]))
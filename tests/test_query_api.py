@@ -0,0 +1,79 @@
+import json
+
+import numpy as np
+import pytest
+
+from conftest import SOURCE
+from query_api import QueryService
+
+
+@pytest.fixture(scope="module")
+def service(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(tmp_path_factory.mktemp("query"))
+        yield QueryService(SOURCE)
+
+
+def _post(service, query):
+    status, body = service.handle("POST", "/query", json.dumps(query).encode())
+    return status, json.loads(body)
+
+
+@pytest.mark.parametrize("query, expected", [
+    ({"group_by": ["Region"], "filters": {"Category": "Furniture", "Year": 2017}},
+     lambda raw: raw[(raw["Category"] == "Furniture") & (raw["Order Date"].dt.year == 2017)].groupby("Region")),
+    ({"group_by": ["Segment"], "filters": {"Year": ["2015", 2016]}, "measures": ["Sales", "Profit"]},
+     lambda raw: raw[raw["Order Date"].dt.year.isin([2015, 2016])].groupby("Segment")),
+    ({"group_by": ["Ship Mode"], "start_date": "2016-03-15", "end_date": "2016-11-30"},
+     lambda raw: raw[raw["Order Date"].between("2016-03-15", "2016-11-30")].groupby("Ship Mode")),
+])
+def test_query_matches_pandas(raw, service, query, expected):
+    status, response = _post(service, query)
+    assert status == 200
+    group_by = query["group_by"][0]
+    result = {row[group_by]: (row["Sales"], row["Profit"]) for row in response["data"]}
+    sums = expected(raw)[["Sales", "Profit"]].sum()
+    assert sorted(result) == sorted(sums.index)
+    np.testing.assert_allclose([result[label] for label in sums.index], sums.to_numpy())
+
+
+@pytest.mark.parametrize("year", ["x", "2017.0", 2017.5, True, ["2016", "later"]])
+def test_non_integer_year_is_rejected(service, year):
+    status, response = _post(service, {"filters": {"Year": year}})
+    assert status == 400
+    assert "Year" in response["error"]
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        {"group_by": [["Region"]]},
+        {"group_by": [{"Region": 1}]},
+        {"filters": {"Region": [["West"]]}},
+        {"filters": {"Region": {"West": 1}}},
+        {"start_date": [1]},
+        {"end_date": {"year": 2017}},
+    ],
+)
+def test_malformed_query_is_a_400(service, query):
+    status, response = _post(service, query)
+    assert status == 400
+    assert response["error"]
+
+
+def test_unexpected_error_is_a_json_500(service, monkeypatch):
+    def broken(query, selections=None):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(service.engine, "run", broken)
+    status, response = _post(service, {"group_by": ["Ship Mode"], "measures": ["Count"]})
+    assert status == 500
+    assert "boom" in response["error"]
+
+
+def test_cube_and_row_paths_agree_on_a_year(service):
+    query = service.engine.normalize({"group_by": ["Region"], "filters": {"Year": 2016}})
+    cube, source = service.engine.run(query)
+    assert source == "cube"
+    rows = service.engine._from_rows(query, np.flatnonzero(service.engine.select(query)))
+    np.testing.assert_allclose(cube[["Sales", "Profit"]], rows[["Sales", "Profit"]])
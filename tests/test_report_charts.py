@@ -0,0 +1,36 @@
+import json
+
+import pandas as pd
+
+import report_charts
+from report_charts import CACHE_FILE, render_charts
+
+
+def _jobs(scale=1.0):
+    monthly = pd.Series([100.0, 250.0, 175.0], index=["2017-01", "2017-02", "2017-03"]) * scale
+    correlation = pd.DataFrame([[1.0, 0.3], [0.3, 1.0]], index=["Sales", "Profit"], columns=["Sales", "Profit"])
+    return {"monthly_sales_trend": (monthly,), "correlation_heatmap": (correlation,)}
+
+
+def test_unchanged_charts_are_not_rerendered(tmp_path):
+    assert sorted(render_charts(_jobs(), tmp_path, workers=1)) == ["correlation_heatmap", "monthly_sales_trend"]
+    assert (tmp_path / "monthly_sales_trend.png").exists()
+    assert render_charts(_jobs(), tmp_path, workers=1) == []
+
+    cache = json.loads((tmp_path / CACHE_FILE).read_text())
+    assert set(cache) == {"correlation_heatmap", "monthly_sales_trend"}
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_changed_inputs_or_a_deleted_png_are_rerendered(tmp_path):
+    render_charts(_jobs(), tmp_path, workers=1)
+    assert render_charts(_jobs(scale=2.0), tmp_path, workers=1) == ["monthly_sales_trend"]
+    (tmp_path / "correlation_heatmap.png").unlink()
+    assert render_charts(_jobs(scale=2.0), tmp_path, workers=1) == ["correlation_heatmap"]
+
+
+def test_render_version_bump_rerenders_everything(tmp_path, monkeypatch):
+    render_charts(_jobs(), tmp_path, workers=1)
+    monkeypatch.setattr(report_charts, "RENDER_VERSION", report_charts.RENDER_VERSION + 1)
+    assert sorted(render_charts(_jobs(), tmp_path, workers=1)) == ["correlation_heatmap", "monthly_sales_trend"]
+    assert render_charts(_jobs(), tmp_path, workers=1) == []
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from scatter_rendering import discount_profit_traces, stratified_sample
+
+
+@pytest.mark.parametrize("strata, max_points", [
+    # Proportional shares: one stratum dominates, many tiny ones
+    (np.r_[np.zeros(9_000), np.arange(1, 1_001)], 500),
+    # More strata than points
+    (np.arange(5_000), 100),
+    (np.repeat(np.arange(40), 250), 1_000),
+])
+def test_stratified_sample_stays_within_max_points(strata, max_points):
+    rows = stratified_sample(strata, max_points)
+    assert len(rows) <= max_points
+    assert len(np.unique(rows)) == len(rows)
+    if len(np.unique(strata)) <= max_points:
+        assert set(strata[rows]) == set(strata)
+
+
+def test_stratified_sample_is_proportional():
+    strata = np.repeat([0, 1, 2], [6_000, 3_000, 1_000])
+    rows = stratified_sample(strata, 1_000)
+    np.testing.assert_array_equal(np.bincount(strata[rows]), [600, 300, 100])
+
+
+def test_density_counts_line_items(raw):
+    traces = discount_profit_traces(raw["Discount"], raw["Profit"], raw["Sales"], mode="density")
+    heatmap = traces[0]
+    assert heatmap.colorbar.title.text == "Line Items"
+    assert np.nansum(np.asarray(heatmap.z, dtype=np.float64)) == len(raw)
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import sql_store
+from conftest import SOURCE, write_subset
+from sql_store import ALL, ConnectionPool
+from timeseries_store import TimeSeriesStore
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(tmp_path_factory.mktemp("sql"))
+        store = sql_store.load_or_build(SOURCE, pool_size=2)
+        yield store
+        store.close()
+
+
+def _selected(raw, region=ALL, category=ALL, start_date=None, end_date=None):
+    mask = np.ones(len(raw), dtype=bool)
+    if region != ALL:
+        mask &= raw["Region"] == region
+    if category != ALL:
+        mask &= raw["Category"] == category
+    if start_date:
+        mask &= raw["Order Date"] >= start_date
+    if end_date:
+        mask &= raw["Order Date"] <= end_date
+    return raw[mask]
+
+
+@pytest.mark.parametrize("by, filters, start_date, end_date", [
+    (["Region"], None, None, None),
+    (["Segment", "Sub-Category"], {"Region": "West"}, None, None),
+    (["State"], {"Category": "Furniture"}, "2016-01-01", "2016-12-31"),
+    (["Ship Mode", "City"], {"Region": "East", "Category": "Technology"}, "2015-04-10", None),
+    ([], {"Region": "Central"}, None, "2014-12-31"),
+])
+def test_rollup_matches_pandas(raw, store, by, filters, start_date, end_date):
+    filters = filters or {}
+    selected = _selected(raw, filters.get("Region", ALL), filters.get("Category", ALL), start_date, end_date)
+    result = store.rollup(by, filters, start_date, end_date)
+    columns = ["Sales", "Profit", "Quantity"]
+    if by:
+        expected = selected.groupby(by)[columns].sum().assign(Count=selected.groupby(by).size())
+        result = result.set_index(by)
+        assert list(result.index) == list(expected.index)
+        np.testing.assert_allclose(result[columns + ["Count"]], expected)
+    else:
+        np.testing.assert_allclose(result.iloc[0][columns + ["Count"]], [*selected[columns].sum(), len(selected)])
+
+
+@pytest.mark.parametrize("filters", [
+    (ALL, ALL, None, None), ("West", "Furniture", None, None),
+    ("East", ALL, "2016-01-01", "2016-12-31"), (ALL, "Technology", "2015-03-15", "2017-06-20"),
+])
+def test_dashboard_aggregates_match_pandas(raw, store, filters):
+    selected = _selected(raw, *filters)
+    assert store.distinct_orders(*filters) == selected["Order ID"].nunique()
+
+    in_range = _selected(raw, start_date=filters[2], end_date=filters[3])
+    regions, categories, sums, counts = store.cross_sums(filters[2], filters[3])
+    expected = pd.pivot_table(in_range, "Sales", "Region", "Category", aggfunc="sum", fill_value=0)
+    np.testing.assert_allclose(sums["Sales"], expected.reindex(index=regions, columns=categories, fill_value=0))
+    assert counts.sum() == len(in_range)
+
+    labels, values = store.series("M", *filters)
+    expected = selected.groupby(selected["Order Date"].dt.strftime("%Y-%m"))["Profit"].sum()
+    assert list(labels) == list(expected.index)
+    np.testing.assert_allclose(values["Profit"], expected)
+
+
+@pytest.mark.parametrize("freq", ["D", "W", "M", "Q", "Y"])
+def test_series_labels_match_the_timeseries_store(raw, store, freq):
+    filters = ("West", ALL, "2015-02-11", "2016-09-30")
+    labels, values = store.series(freq, *filters)
+    expected_labels, expected = TimeSeriesStore.from_frame(raw).series(freq, *filters)
+    assert list(labels) == list(expected_labels)
+    np.testing.assert_allclose(values["Sales"], expected["Sales"])
+    np.testing.assert_array_equal(values["Count"], expected["Count"])
+
+
+def test_unknown_frequency_is_rejected(store):
+    with pytest.raises(ValueError, match="frequency"):
+        store.series("H")
+
+
+def test_exhausted_pool_times_out(store):
+    pool = ConnectionPool(store.path, size=1, timeout=0.05)
+    with pool.connection():
+        with pytest.raises(TimeoutError):
+            with pool.connection():
+                pass
+    with pool.connection() as connection:
+        assert connection.execute("SELECT count(*) FROM fact_sales").fetchone()[0] > 0
+    pool.close()
+
+
+def test_missing_postal_codes_are_stored_as_null(raw, tmp_path):
+    df = raw.iloc[:200].copy()
+    df["Postal Code"] = df["Postal Code"].astype("float64")
+    df.iloc[:50, df.columns.get_loc("Postal Code")] = np.nan
+    sql_store.build(df, str(tmp_path / "db.sqlite"))
+    store = sql_store.SqlStore(str(tmp_path / "db.sqlite"), pool_size=1)
+    (nulls,), (total,) = store.query(
+        "SELECT sum(g.postal_code IS NULL), count(*) FROM fact_sales f JOIN dim_geography g USING (geography_key)"
+    )
+    store.close()
+    assert (nulls, total) == (50, 200)
+
+
+def test_correlation_matches_pandas(raw, store):
+    assert store.correlation("Discount", "Profit") == pytest.approx(raw["Discount"].corr(raw["Profit"]))
+
+
+def test_database_is_rebuilt_when_the_dataset_changes(workdir):
+    source = write_subset(workdir / "sub.csv", 120)
+    store = sql_store.load_or_build(source, pool_size=1)
+    assert store.rollup()["Count"].iloc[0] == 120
+    store.close()
+    write_subset(source, 150)
+    store = sql_store.load_or_build(source, pool_size=1)
+    assert store.rollup()["Count"].iloc[0] == 150
+    store.close()
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import SOURCE
+from streaming_aggregates import Moments, StreamingAggregator
+
+NUMERIC = ["Sales", "Quantity", "Discount", "Profit"]
+
+
+@pytest.mark.parametrize("splits", [[5000], [1, 2, 3], [999, 4000, 4001, 9000]])
+def test_merged_moments_match_numpy(raw, splits):
+    values = raw[NUMERIC].to_numpy(dtype=np.float64)
+    parts = []
+    for chunk in np.split(values, splits):
+        moments = Moments(NUMERIC)
+        moments.update(chunk)
+        parts.append(moments)
+    merged = Moments(NUMERIC)
+    for part in reversed(parts):
+        merged.merge(part)
+    assert merged.n == len(values)
+    np.testing.assert_allclose(merged.mean, values.mean(axis=0))
+    np.testing.assert_allclose(merged.covariance(), np.cov(values, rowvar=False))
+    np.testing.assert_allclose(merged.correlation(), raw[NUMERIC].corr())
+    np.testing.assert_allclose(merged.linear_fit("Discount", "Profit"), np.polyfit(raw["Discount"], raw["Profit"], 1))
+    restored = Moments.from_dict(merged.to_dict())
+    np.testing.assert_allclose(restored.comoment, merged.comoment)
+
+
+def test_aggregator_matches_pandas(raw):
+    aggregator = StreamingAggregator.from_csv(SOURCE, chunksize=1500)
+    assert aggregator.rows == len(raw)
+    assert aggregator.region_order == list(raw["Region"].unique())
+    assert aggregator.duplicate_rows == raw.duplicated().sum()
+    pd.testing.assert_series_equal(
+        aggregator.null_counts.astype(np.int64), raw.isnull().sum().astype(np.int64), check_names=False
+    )
+    expected = raw.groupby("Segment")["Order ID"].nunique()
+    assert aggregator.unique_orders_by_segment.to_dict() == expected.to_dict()
+    regions = aggregator.cube.rollup(["Region"]).set_index("Region")
+    np.testing.assert_allclose(regions[["Sales", "Profit"]], raw.groupby("Region")[["Sales", "Profit"]].sum())
+    assert len(aggregator.sample) == min(aggregator.sample_size, len(raw))
+
+
+def test_merging_aggregators_of_halves_equals_one_pass(raw):
+    whole = StreamingAggregator()
+    whole.update(raw.copy())
+    first, second = StreamingAggregator(), StreamingAggregator()
+    first.update(raw.iloc[:4000].copy())
+    second.update(raw.iloc[4000:].copy())
+    merged = first.merge(second)
+    assert merged.rows == whole.rows
+    assert merged.duplicate_rows == whole.duplicate_rows
+    assert merged.unique_orders_by_segment.to_dict() == whole.unique_orders_by_segment.to_dict()
+    np.testing.assert_allclose(merged.moments.comoment, whole.moments.comoment)
+    pd.testing.assert_frame_equal(merged.cube.rollup(["Category", "Month"]), whole.cube.rollup(["Category", "Month"]))
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import timeseries_store
+from timeseries_store import ALL, TimeSeriesStore
+
+PERIODS = {"D": "D", "W": "W-SUN", "M": "M", "Q": "Q", "Y": "Y"}
+
+
+@pytest.fixture(scope="module")
+def store(raw):
+    return TimeSeriesStore.from_frame(raw)
+
+
+def _selected(raw, region=ALL, category=ALL, start_date=None, end_date=None):
+    mask = np.ones(len(raw), dtype=bool)
+    if region != ALL:
+        mask &= raw["Region"] == region
+    if category != ALL:
+        mask &= raw["Category"] == category
+    if start_date:
+        mask &= raw["Order Date"] >= start_date
+    if end_date:
+        mask &= raw["Order Date"] <= end_date
+    return raw[mask]
+
+
+@pytest.mark.parametrize("start_date, end_date", [
+    (None, None), ("2015-03-17", "2016-08-02"), ("2017-12-30", None), (None, "2014-01-03"), ("2016-01-01", "2015-01-01"),
+])
+def test_cross_sums_match_pandas(raw, store, start_date, end_date):
+    selected = _selected(raw, start_date=start_date, end_date=end_date)
+    regions, categories, sums, counts = store.cross_sums(start_date, end_date)
+    for measure in ("Sales", "Profit"):
+        expected = pd.pivot_table(selected, measure, "Region", "Category", aggfunc="sum", fill_value=0)
+        expected = expected.reindex(index=regions, columns=categories, fill_value=0)
+        np.testing.assert_allclose(sums[measure], expected, atol=1e-6)
+    assert counts.sum() == len(selected)
+
+
+@pytest.mark.parametrize("filters", [
+    (ALL, ALL, None, None), ("West", ALL, "2016-02-10", None), (ALL, "Furniture", "2015-05-01", "2015-05-31"),
+    ("East", "Technology", "2014-07-04", "2017-03-15"), ("Nowhere", ALL, None, None),
+])
+def test_distinct_orders_match_nunique(raw, store, filters):
+    assert store.exact_orders
+    assert store.distinct_orders(*filters) == _selected(raw, *filters)["Order ID"].nunique()
+
+
+@pytest.mark.parametrize("freq", list(PERIODS))
+@pytest.mark.parametrize("filters", [(ALL, ALL, None, None), ("Central", "Office Supplies", "2015-02-11", "2016-10-20")])
+def test_series_match_resample(raw, store, freq, filters):
+    selected = _selected(raw, *filters)
+    labels, values = store.series(freq, *filters)
+    grouped = selected.groupby(selected["Order Date"].dt.to_period(PERIODS[freq]))
+    expected = grouped["Sales"].sum()
+    np.testing.assert_allclose(values["Sales"], expected.to_numpy())
+    np.testing.assert_array_equal(values["Count"], grouped.size().to_numpy())
+    if freq == "M":
+        assert list(labels) == [str(period) for period in expected.index]
+    elif freq == "W":
+        assert list(labels) == [str(period.start_time.date()) for period in expected.index]
+
+
+def test_saved_store_is_rebuilt_for_another_version(raw, store, tmp_path):
+    path = str(tmp_path / "timeseries.npz")
+    saved = timeseries_store.load_or_build(raw, path, version="v1")
+    assert saved.version == "v1"
+    np.testing.assert_allclose(
+        saved.cross_sums("2016-01-01", "2016-12-31")[2]["Sales"], store.cross_sums("2016-01-01", "2016-12-31")[2]["Sales"]
+    )
+    assert timeseries_store.load_or_build(raw.iloc[:100], path, version="v2").cross_sums()[3].sum() == 100
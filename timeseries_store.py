@@ -0,0 +1,266 @@
+"""Daily time series of Sales / Profit / line items / orders with prefix sums.
+
+For every Region / Category filter combination, "All" included, the store
+keeps cumulative sums over the calendar days between the first and last order
+date: ``(R + 1) x (C + 1)`` prefix arrays per measure. So:
+
+- the total of any date range is ``prefix[hi] - prefix[lo]``, two lookups
+  whatever the number of rows;
+- a daily / weekly / monthly / quarterly / yearly series is the difference of
+  the prefix sums at the period boundaries (precomputed per frequency).
+
+Orders are kept the same way as the number of orders placed each day. They
+cannot be added up across categories (an order spans several), which is why
+every combination has its own array. Every order's lines share one Order
+Date, so orders over a date range are exact sums of daily counts;
+``exact_orders`` records whether the export honours that.
+
+The store is saved next to the columnar cache and rebuilt when the dataset
+version changes (see :func:`load_or_build`).
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_loader import cache_lock
+from instrumentation import instrumented
+
+ALL = "All"
+MEASURES = ["Sales", "Profit"]
+STORE_VERSION = 1
+# Period key of each calendar day, per resampling frequency
+PERIOD_KEYS = {
+    "D": lambda days: days,
+    "W": lambda days: (days.astype(np.int64) + 3) // 7,  # weeks start on Monday
+    "M": lambda days: days.astype("datetime64[M]"),
+    "Q": lambda days: days.astype("datetime64[M]").astype(np.int64) // 3,
+    "Y": lambda days: days.astype("datetime64[Y]"),
+}
+
+
+def _prefix(daily):
+    """Cumulative sums along the last axis with a leading zero."""
+    prefix = np.zeros(daily.shape[:-1] + (daily.shape[-1] + 1,), dtype=daily.dtype)
+    np.cumsum(daily, axis=-1, out=prefix[..., 1:])
+    return prefix
+
+
+def _period_label(freq, day):
+    day = pd.Timestamp(day)
+    if freq == "M":
+        return day.strftime("%Y-%m")
+    if freq == "Q":
+        return f"{day.year}Q{day.quarter}"
+    if freq == "Y":
+        return str(day.year)
+    return day.strftime("%Y-%m-%d")
+
+
+class TimeSeriesStore:
+    def __init__(self, first_day, n_days, labels, prefix, order_prefix, exact_orders, version=None):
+        self.first_day = np.datetime64(first_day, "D")
+        self.n_days = int(n_days)
+        # Sorted Region / Category labels, as in the filter engine
+        self.labels = labels
+        # measure -> (R + 1, C + 1, n_days + 1) prefix sums, index R / C meaning
+        # "All"; "Count" is line items
+        self.prefix = prefix
+        # Same layout, orders placed
+        self.order_prefix = order_prefix
+        self.exact_orders = bool(exact_orders)
+        self.version = version
+        self._day_ns = (
+            self.first_day + np.arange(self.n_days + 1)
+        ).astype("datetime64[ns]")
+        self._periods = {}
+
+    @classmethod
+    @instrumented("timeseries.build")
+    def from_frame(cls, df, date_column="Order Date", distinct_column="Order ID", version=None):
+        days = df[date_column].to_numpy(dtype="datetime64[D]")
+        first_day = days.min()
+        n_days = int((days.max() - first_day).astype(np.int64)) + 1
+        day = (days - first_day).astype(np.int64)
+
+        labels, codes = {}, {}
+        for dim in ("Region", "Category"):
+            dim_codes, uniques = pd.factorize(df[dim], sort=True)
+            codes[dim] = dim_codes.astype(np.int64)
+            labels[dim] = np.asarray(uniques, dtype=str)
+        n_regions, n_categories = len(labels["Region"]), len(labels["Category"])
+        cell = codes["Region"] * n_categories + codes["Category"]
+        shape = (n_regions, n_categories, n_days)
+
+        def with_margins(daily):
+            """(R, C, days) daily sums plus the "All" row, column and corner."""
+            full = np.zeros((n_regions + 1, n_categories + 1, n_days), dtype=daily.dtype)
+            full[:n_regions, :n_categories] = daily
+            full[n_regions, :n_categories] = daily.sum(axis=0)
+            full[:n_regions, n_categories] = daily.sum(axis=1)
+            full[n_regions, n_categories] = daily.sum(axis=(0, 1))
+            return full
+
+        def daily(keys, n_keys, key_day, weights=None):
+            return np.bincount(
+                keys * n_days + key_day, weights=weights, minlength=n_keys * n_days
+            ).reshape(n_keys, n_days)
+
+        prefix = {
+            measure: _prefix(with_margins(
+                daily(cell, n_regions * n_categories, day, df[measure].to_numpy(dtype=np.float64))
+                .reshape(shape)
+            ))
+            for measure in MEASURES
+        }
+        prefix["Count"] = _prefix(with_margins(daily(cell, n_regions * n_categories, day).reshape(shape)))
+
+        # Orders per day for every filter combination: each order is counted
+        # once per (combination, day) it has lines in
+        order, _ = pd.factorize(df[distinct_column])
+        order = order.astype(np.int64)
+        orders = np.zeros((n_regions + 1, n_categories + 1, n_days), dtype=np.int64)
+        for by_region, by_category in ((True, True), (True, False), (False, True), (False, False)):
+            n_r = n_regions if by_region else 1
+            n_c = n_categories if by_category else 1
+            key = (codes["Region"] if by_region else 0) * n_c + (codes["Category"] if by_category else 0)
+            key = np.broadcast_to(key, order.shape)
+            _, first = np.unique((order * (n_r * n_c) + key) * n_days + day, return_index=True)
+            rows = slice(0, n_regions) if by_region else slice(n_regions, n_regions + 1)
+            cols = slice(0, n_categories) if by_category else slice(n_categories, n_categories + 1)
+            orders[rows, cols] = daily(key[first], n_r * n_c, day[first]).reshape(n_r, n_c, n_days)
+        exact = len(np.unique(order * n_days + day)) == len(np.unique(order))
+
+        return cls(first_day, n_days, labels, prefix, _prefix(orders), exact, version)
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        arrays = {f"prefix:{measure}": values for measure, values in self.prefix.items()}
+        arrays.update({f"label:{dim}": values for dim, values in self.labels.items()})
+        arrays["order_prefix"] = self.order_prefix
+        arrays["meta"] = np.array(
+            [STORE_VERSION, self.n_days, int(self.exact_orders)], dtype=np.int64
+        )
+        arrays["first_day"] = np.array(self.first_day)
+        arrays["version"] = np.array(self.version or "")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            store_version, n_days, exact = (int(v) for v in data["meta"])
+            if store_version != STORE_VERSION:
+                return None
+            return cls(
+                data["first_day"],
+                n_days,
+                {key.split(":", 1)[1]: data[key] for key in data.files if key.startswith("label:")},
+                {key.split(":", 1)[1]: data[key] for key in data.files if key.startswith("prefix:")},
+                data["order_prefix"],
+                exact,
+                str(data["version"]) or None,
+            )
+
+    def day_range(self, start_date=None, end_date=None):
+        """``(lo, hi)`` day offsets of the rows ordered within ``[start_date, end_date]``."""
+        lo, hi = 0, self.n_days
+        if start_date:
+            lo = np.searchsorted(
+                self._day_ns[:-1], np.datetime64(pd.Timestamp(start_date), "ns"), side="left"
+            )
+        if end_date:
+            hi = np.searchsorted(
+                self._day_ns[:-1], np.datetime64(pd.Timestamp(end_date), "ns"), side="right"
+            )
+        return int(lo), int(max(hi, lo))
+
+    def _cell(self, region, category):
+        """Index of a filter combination in the prefix arrays; None if a value is unknown."""
+        cell = []
+        for dim, value in (("Region", region), ("Category", category)):
+            labels = self.labels[dim]
+            if value is None or value == ALL:
+                cell.append(len(labels))
+                continue
+            position = int(np.searchsorted(labels, value))
+            if position == len(labels) or labels[position] != value:
+                return None
+            cell.append(position)
+        return tuple(cell)
+
+    def cross_sums(self, start_date=None, end_date=None, measures=MEASURES):
+        """Region x Category totals of a date range, like ``FilterEngine.cross_sums``."""
+        lo, hi = self.day_range(start_date, end_date)
+        grid = (slice(0, len(self.labels["Region"])), slice(0, len(self.labels["Category"])))
+        sums = {m: self.prefix[m][grid][:, :, hi] - self.prefix[m][grid][:, :, lo] for m in measures}
+        counts = self.prefix["Count"][grid][:, :, hi] - self.prefix["Count"][grid][:, :, lo]
+        return self.labels["Region"].astype(object), self.labels["Category"].astype(object), sums, counts
+
+    def distinct_orders(self, region=ALL, category=ALL, start_date=None, end_date=None):
+        """Number of orders placed in the date range within the filters."""
+        cell = self._cell(region, category)
+        if cell is None:
+            return 0
+        lo, hi = self.day_range(start_date, end_date)
+        prefix = self.order_prefix[cell]
+        return int(prefix[hi] - prefix[lo])
+
+    def _periods_of(self, freq):
+        """First day offset and label of every period of ``freq`` in the store."""
+        periods = self._periods.get(freq)
+        if periods is None:
+            days = self.first_day + np.arange(self.n_days)
+            keys = PERIOD_KEYS[freq](days)
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            if freq == "W":
+                # Label a week by its Monday, even the partial first one
+                first_days = days[starts] - (days[starts].astype(np.int64) + 3) % 7
+            else:
+                first_days = days[starts]
+            labels = np.array([_period_label(freq, day) for day in first_days], dtype=object)
+            periods = self._periods[freq] = (starts, labels)
+        return periods
+
+    def series(self, freq="M", region=ALL, category=ALL, start_date=None, end_date=None,
+               measures=MEASURES, drop_empty=True):
+        """Per-period totals: ``(labels, {measure: values, "Count": line items})``.
+
+        ``freq`` is one of ``D``, ``W``, ``M``, ``Q``, ``Y``. Periods cut by
+        the date range only cover its days; with ``drop_empty`` periods without
+        any line item are left out, as a groupby would.
+        """
+        lo, hi = self.day_range(start_date, end_date)
+        cell = self._cell(region, category)
+        if cell is None:
+            lo = hi = 0
+            cell = (0, 0)
+        starts, period_labels = self._periods_of(freq)
+        first = np.searchsorted(starts, lo, side="right") - 1
+        last = np.searchsorted(starts, hi, side="left")
+        edges = np.r_[lo, starts[first + 1:last], hi] if hi > lo else np.array([lo])
+        values = {
+            measure: np.diff(self.prefix[measure][cell][edges]) for measure in (*measures, "Count")
+        }
+        labels = period_labels[first:first + len(edges) - 1]
+        if drop_empty:
+            present = values["Count"] > 0
+            labels = labels[present]
+            values = {measure: v[present] for measure, v in values.items()}
+        return labels, values
+
+
+def load_or_build(df, path, version=None):
+    """Load the store saved at ``path``, rebuilding it when it belongs to another dataset."""
+    store = TimeSeriesStore.load(path) if os.path.exists(path) else None
+    if store is None or store.version != version:
+        with cache_lock(os.path.dirname(path) or "."):
+            store = TimeSeriesStore.load(path) if os.path.exists(path) else None
+            if store is None or store.version != version:
+                store = TimeSeriesStore.from_frame(df, version=version)
+                store.save(path)
+    return store